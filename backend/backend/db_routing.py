@@ -0,0 +1,185 @@
+"""
+読み取りレプリカへの振り分け（DATABASE_REPLICAS を設定したときだけ動く）
+
+- ReplicaRoutingMiddleware がリクエストごとに読み取り先を決め、PrimaryReplicaRouter が ORM の読み取りをそこへ向ける
+  - GET / HEAD / OPTIONS: 使えるレプリカのうち1つ（1リクエストの中では同じレプリカ）
+  - 書き込みのメソッド・書き込んだ直後のユーザー・リクエストの外（管理コマンド、バックグラウンドのスレッド）: プライマリ
+- read-your-writes: 書き込みに成功したユーザーは、STICKY_SECONDS（レプリカの遅延がそれより大きければその遅延）の間、
+  読み取りもプライマリに固定する（Django のキャッシュに記録するので、ワーカー間で共有されるキャッシュが必要。
+  プロセス内のキャッシュ（LocMemCache・DummyCache）のままレプリカを設定すると起動時に ImproperlyConfigured）
+- レプリカの遅延は LAG_CHECK_INTERVAL ごとに測り、MAX_LAG を超えた・接続できないレプリカは使わない
+未ログインの一覧のキャッシュ（posts/response_cache.py）には、レプリカの遅延の分だけ古い内容が入りうる（TTL で消える）
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# このリクエストの読み取り先（None ならプライマリ）
+_read_alias = ContextVar('db_read_alias', default=None)
+
+# プライマリ・レプリカの遅延（秒）。Postgres の物理レプリケーションで、適用待ちの WAL が無ければ 0
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # プライマリとレプリカは同じデータなので、どこから読んだオブジェクト同士でも関連づけてよい
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # レプリカにはレプリケーションで反映される
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaLagMonitor:
+    """レプリカごとの遅延（秒、接続できなければ None）。LAG_CHECK_INTERVAL ごとに測り直す"""
+
+    def __init__(self):
+        self._lags = {}  # alias -> (遅延, 測った時刻)
+        self._lock = threading.Lock()
+
+    def lag(self, alias):
+        with self._lock:
+            entry = self._lags.get(alias)
+        if entry is not None and time.monotonic() - entry[1] < settings.DATABASE_REPLICATION['LAG_CHECK_INTERVAL']:
+            return entry[0]
+        lag = self.measure(alias)
+        with self._lock:
+            self._lags[alias] = (lag, time.monotonic())
+        return lag
+
+    def measure(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(POSTGRES_LAG_SQL)
+                    return float(cursor.fetchone()[0])
+                # 遅延を測れない DB（ローカル確認用の SQLite など）は接続できれば 0 とみなす
+                cursor.execute('SELECT 1')
+                return 0.0
+        except DatabaseError as e:
+            logger.warning("Replica %s is unavailable: %s", alias, e)
+            connection.close()
+            return None
+
+    def available(self):
+        """遅延が MAX_LAG 以内のレプリカ"""
+        max_lag = settings.DATABASE_REPLICATION['MAX_LAG']
+        return [alias for alias in settings.DATABASE_REPLICAS if (lag := self.lag(alias)) is not None and lag <= max_lag]
+
+    def max_lag(self):
+        with self._lock:
+            return max((lag for lag, _ in self._lags.values() if lag is not None), default=0.0)
+
+    def clear(self):
+        with self._lock:
+            self._lags.clear()
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+def _sticky_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def stick_to_primary(user_id):
+    """このユーザーの読み取りを、しばらくプライマリに固定する"""
+    seconds = max(settings.DATABASE_REPLICATION['STICKY_SECONDS'], lag_monitor.max_lag())
+    cache.set(_sticky_key(user_id), True, timeout=math.ceil(seconds))
+
+
+def is_stuck_to_primary(user_id):
+    return cache.get(_sticky_key(user_id)) is not None
+
+
+def _user_id(request):
+    # DRF の認証より前なので、アクセストークンの検証だけ行う（DB は引かない）
+    from rest_framework_simplejwt.exceptions import InvalidToken
+    from rest_framework_simplejwt.settings import api_settings
+    from users.authentication import ClaimsJWTAuthentication
+
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, KeyError):
+        return None
+
+
+def read_alias(request, user_id):
+    """このリクエストの読み取り先（None ならプライマリ）"""
+    if request.method not in SAFE_METHODS:
+        return None
+    if user_id is not None and is_stuck_to_primary(user_id):
+        return None
+    replicas = lag_monitor.available()
+    return random.choice(replicas) if replicas else None
+
+
+def check_shared_cache():
+    """
+    書き込んだユーザーの固定はキャッシュに記録するので、ワーカー間で共有されないキャッシュでは
+    別のワーカーが固定を知らずにレプリカから読み、書いた直後の内容が見えなくなる
+    """
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            "DATABASE_REPLICA_URLS を使うには、ワーカー間で共有されるキャッシュ（CACHE_BACKEND）が必要です"
+            f"（現在: {settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']}）"
+        )
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.DATABASE_REPLICAS:
+            check_shared_cache()
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        user_id = _user_id(request)
+        token = _read_alias.set(read_alias(request, user_id))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and user_id is not None and response.status_code < 400:
+            stick_to_primary(user_id)
+        return response
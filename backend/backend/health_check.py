@@ -1,31 +1,170 @@
 """
 ヘルスチェック用のビュー（改善版）
 ECSやロードバランサーがアプリケーションの状態を確認するために使用
+
+DB 接続・マイグレーション・メモリの確認は重いので、プローブのたびには行わない
+- バックグラウンドのスレッドが HEALTH_CHECK['INTERVAL'] ごとに確認し、結果を時刻つきで保持する
+- プローブはメモリ上の結果を返すだけ（DB を引かない）
+- ?deep=1 を付けるとその場で全ての確認を行う（手動の調査用）
 """
 
 from django.http import JsonResponse
-from django.db import connection
+from django.db import close_old_connections, connection
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.cache import never_cache
 import logging
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        result = cursor.fetchone()
+    if not (result and result[0] == 1):
+        raise RuntimeError('unexpected result')
+    return 'connected'
+
+
+def check_migrations():
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if pending:
+        raise RuntimeError(f'{len(pending)} pending')
+    return 'applied'
+
+
+def check_memory():
+    import psutil
+
+    memory_percent = psutil.virtual_memory().percent
+    if memory_percent > 90:
+        raise RuntimeError(f'HIGH ({memory_percent}%)')
+    return f'{memory_percent}%'
+
+
+CHECKS = {
+    'database': check_database,
+    'migrations': check_migrations,
+    'memory': check_memory,
+}
+
+
+class ProbeResults:
+    """確認結果（name -> {'ok', 'detail', 'checked_at'}）のプロセス内キャッシュ"""
+
+    def __init__(self, checks):
+        self.checks = checks
+        self._results = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def run(self, force=False):
+        """全ての確認を行って結果を更新する（force=False なら適用済みのマイグレーションは確認し直さない）"""
+        for name, check in self.checks.items():
+            with self._lock:
+                previous = self._results.get(name)
+            # 適用済みのマイグレーションは、コードが変わる（再デプロイ）までは未適用に戻らない
+            if name == 'migrations' and not force and previous and previous['ok']:
+                result = dict(previous)
+            else:
+                try:
+                    result = {'ok': True, 'detail': check()}
+                except ImportError:
+                    # psutil がインストールされていない場合は確認しない
+                    continue
+                except Exception as e:
+                    logger.warning(f"Health check '{name}' failed: {e}")
+                    result = {'ok': False, 'detail': str(e)}
+                    if name in ('database', 'migrations'):
+                        # 壊れた接続を使い続けないよう閉じる（次回は接続し直す）
+                        connection.close()
+            result['checked_at'] = time.time()
+            with self._lock:
+                self._results[name] = result
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(result) for name, result in self._results.items()}
+
+    def results(self):
+        """最新の結果（バックグラウンドの確認が始まっていなければ始める）"""
+        conf = settings.HEALTH_CHECK
+        if conf['BACKGROUND']:
+            self._ensure_thread(conf['INTERVAL'])
+        else:
+            with self._lock:
+                checked = [r['checked_at'] for r in self._results.values()]
+            if not checked or time.time() - min(checked) > conf['INTERVAL']:
+                self.run()
+        return self.snapshot()
+
+    def _ensure_thread(self, interval):
+        # gunicorn の preload では fork 前にスレッドを作らないよう、最初のプローブで起動する
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, args=(interval,), name='health-probes', daemon=True)
+                self._thread.start()
+
+    def _loop(self, interval):
+        while True:
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Health check loop failed")
+            # リクエストの外なので、CONN_MAX_AGE を過ぎた接続はここで閉じる（プールなら返す）
+            close_old_connections()
+            time.sleep(interval)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+probes = ProbeResults(CHECKS)
+
+
+def _probe_results(request):
+    """(結果, deep かどうか)。?deep=1 ならその場で確認する"""
+    if request.GET.get('deep') == '1':
+        probes.run(force=True)
+        return probes.snapshot(), True
+    return probes.results(), False
+
+
+def _is_fresh(result):
+    return result is not None and time.time() - result['checked_at'] <= settings.HEALTH_CHECK['STALE_AFTER']
+
+
+def _no_cache(response):
+    # キャッシュ無効化ヘッダー
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response['Pragma'] = 'no-cache'
+    response['Expires'] = '0'
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["GET", "HEAD"])
 @never_cache
 def health_check(request):
     """
     アプリケーションのヘルスチェック
-    - データベース接続確認（オプショナル）
+    - データベース接続確認（オプショナル - バックグラウンドの確認結果を返す）
     - 基本的なアプリケーション状態確認
     - ALB/ECS用に最適化
     """
     start_time = time.time()
-    
+    results, deep = _probe_results(request)
+
     health_status = {
         'status': 'healthy',
         'timestamp': int(time.time()),
@@ -33,87 +172,26 @@ def health_check(request):
         'version': getattr(settings, 'VERSION', '1.0.0'),
         'database': 'unknown',
         'debug': settings.DEBUG,
-        'checks': []
+        'deep': deep,
+        'checks': [],
     }
-    
-    # 1. 基本的なアプリケーション確認（必須）
-    try:
-        # Django の基本動作確認
-        from django.contrib.auth.models import User
-        health_status['checks'].append('django_core: OK')
-        
-        # 設定確認
-        if hasattr(settings, 'ALLOWED_HOSTS'):
-            health_status['checks'].append('settings: OK')
-        
-    except Exception as e:
-        logger.error(f"Django core check failed: {e}")
-        health_status['checks'].append(f'django_core: FAILED - {str(e)}')
-        health_status['status'] = 'unhealthy'
-    
-    # 2. データベース接続確認（オプショナル - エラーでも healthy を維持）
-    db_timeout = 5  # 5秒でタイムアウト
-    try:
-        # タイムアウト付きでデータベース接続確認
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
-            if result and result[0] == 1:
-                health_status['database'] = 'connected'
-                health_status['checks'].append('database_connection: OK')
-            else:
-                health_status['database'] = 'error'
-                health_status['checks'].append('database_connection: FAILED')
-                # データベースエラーでもアプリケーションは healthy とする
-                logger.warning("Database connection failed, but application is still healthy")
-                
-    except Exception as e:
-        logger.warning(f"Database health check failed (non-critical): {e}")
-        health_status['database'] = 'disconnected'
-        health_status['checks'].append(f'database_connection: FAILED - {str(e)}')
-        # データベース接続失敗でも healthy を維持（重要な変更）
-        health_status['checks'].append('note: database failure does not affect app health')
-    
-    # 3. 応答時間確認
-    response_time = round((time.time() - start_time) * 1000, 2)
-    health_status['response_time_ms'] = response_time
-    
-    if response_time > 5000:  # 5秒以上の場合は警告
-        health_status['checks'].append(f'response_time: SLOW ({response_time}ms)')
-    else:
-        health_status['checks'].append(f'response_time: OK ({response_time}ms)')
-    
-    # 4. メモリ使用量確認（オプション）
-    try:
-        import psutil
-        memory_percent = psutil.virtual_memory().percent
-        health_status['memory_usage_percent'] = memory_percent
-        if memory_percent > 90:
-            health_status['checks'].append(f'memory: HIGH ({memory_percent}%)')
-        else:
-            health_status['checks'].append(f'memory: OK ({memory_percent}%)')
-    except ImportError:
-        # psutil がインストールされていない場合は無視
-        pass
-    except Exception as e:
-        logger.debug(f"Memory check failed: {e}")
-    
-    # 5. ステータスコード決定
-    # データベース接続失敗でも、アプリケーション自体が正常なら 200 を返す
-    status_code = 200 if health_status['status'] == 'healthy' else 503
-    
-    # 6. HEADリクエストの場合は空のレスポンス
+
+    # データベース接続失敗でも healthy を維持（プロセスが応答できれば healthy）
+    database = results.get('database')
+    if database is not None:
+        health_status['database'] = 'connected' if database['ok'] else 'disconnected'
+    for name, result in results.items():
+        age = round(time.time() - result['checked_at'], 1)
+        health_status['checks'].append(
+            f"{name}: {'OK' if result['ok'] else 'FAILED'} - {result['detail']} ({age}s ago)"
+        )
+
+    health_status['response_time_ms'] = round((time.time() - start_time) * 1000, 3)
+
+    # HEADリクエストの場合は空のレスポンス
     if request.method == 'HEAD':
-        response = JsonResponse({}, status=status_code)
-    else:
-        response = JsonResponse(health_status, status=status_code)
-    
-    # 7. キャッシュ無効化ヘッダー
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    
-    return response
+        return _no_cache(JsonResponse({}, status=200))
+    return _no_cache(JsonResponse(health_status, status=200))
 
 
 @csrf_exempt
@@ -129,53 +207,37 @@ def simple_health_check(request):
         'service': 'jimotoko-backend',
         'timestamp': int(time.time())
     }
-    
+
     # HEADリクエストの場合は空のレスポンス
     if request.method == 'HEAD':
         response = JsonResponse({}, status=200)
     else:
         response = JsonResponse(response_data, status=200)
-    
-    # キャッシュ無効化
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    
-    return response
+    return _no_cache(response)
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@never_cache
 def ready_check(request):
     """
     準備完了チェック（Kubernetes readiness probe 風）
     データベース接続が必要なサービスの場合に使用
+    確認結果が古い（バックグラウンドの確認が止まっている）場合も ready としない
     """
+    results, deep = _probe_results(request)
     checks = {
         'database': False,
         'migrations': False,
         'ready': False
     }
-    
-    try:
-        # データベース接続確認
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
-            if result and result[0] == 1:
-                checks['database'] = True
-        
-        # マイグレーション状態確認
-        from django.db.migrations.executor import MigrationExecutor
-        executor = MigrationExecutor(connection)
-        if not executor.migration_plan(executor.loader.graph.leaf_nodes()):
-            checks['migrations'] = True
-        
-    except Exception as e:
-        logger.error(f"Ready check failed: {e}")
-    
+    for name in ('database', 'migrations'):
+        result = results.get(name)
+        checks[name] = _is_fresh(result) and result['ok']
+
     # 全てのチェックが成功した場合のみ ready
-    checks['ready'] = all(checks.values())
-    
+    checks['ready'] = checks['database'] and checks['migrations']
+    checks['deep'] = deep
+
     status_code = 200 if checks['ready'] else 503
-    return JsonResponse(checks, status=status_code)
\ No newline at end of file
+    return _no_cache(JsonResponse(checks, status=status_code))
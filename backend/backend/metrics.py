@@ -0,0 +1,356 @@
+"""
+Prometheus 形式のメトリクス（/api/metrics）
+
+- MetricsMiddleware: ルートごとの処理時間・レスポンスサイズ・1リクエストあたりの DB クエリ数と時間
+- observe() / inc(): アプリ側からの記録（逆ジオコーディングの時間・エラー数など）
+- キャッシュのヒット数は response_cache / geocoding の stats() を、DB のコネクションプールの状態は
+  psycopg_pool の get_stats() を書き出し時に読む
+- DB への接続（プールを使う場合はプールからの取り出し）の回数は connection_created で数える
+
+gunicorn のワーカーはプロセスが別なので、各ワーカーは自分の値を METRICS['DIR'] に
+<pid>.json として定期的に書き出し、/api/metrics はディレクトリ内の全ファイルを合算して返す
+（どのワーカーが応答しても、コンテナ全体の値になる）
+終了したワーカーのファイルは archive.json に畳み込むので、カウンタは減らない（ゲージは畳み込まない）
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# name -> (種類, 説明, バケット)
+DEFINITIONS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size by route', SIZE_BUCKETS),
+    'db_queries_per_request': ('histogram', 'DB queries executed per request', COUNT_BUCKETS),
+    'db_query_seconds_per_request': ('histogram', 'Total DB query time per request', LATENCY_BUCKETS),
+    'geocoding_request_duration_seconds': ('histogram', 'Reverse geocoding API call latency', LATENCY_BUCKETS),
+    'geocoding_errors_total': ('counter', 'Reverse geocoding API errors', None),
+    'response_cache_requests_total': ('counter', 'Anonymous list response cache lookups', None),
+    'geocode_cache_lookups_total': ('counter', 'Reverse geocoding cache lookups', None),
+    'db_connections_total': ('counter', 'DB connections opened by Django (checkouts when pooling)', None),
+    'db_pool_connections': ('gauge', 'Pooled DB connections by state (summed over workers)', None),
+    'db_pool_requests_waiting': ('gauge', 'Requests waiting for a pooled DB connection', None),
+    'db_pool_requests_total': ('counter', 'Connection requests served by the DB pool', None),
+    'db_pool_request_wait_seconds_total': ('counter', 'Time spent waiting for a pooled DB connection', None),
+    'db_pool_timeouts_total': ('counter', 'Connection requests that timed out waiting for the DB pool', None),
+    'db_pool_connections_opened_total': ('counter', 'Physical DB connections opened by the pool', None),
+    'db_pool_connections_lost_total': ('counter', 'Pooled DB connections found broken', None),
+}
+
+GAUGES = {name for name, (kind, _, _) in DEFINITIONS.items() if kind == 'gauge'}
+
+ARCHIVE = 'archive.json'
+
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    """
+    プロセス内のメトリクス
+    値は {name: {labels（JSON 文字列）: value}}。ヒストグラムの value は [バケットごとの件数..., 合計, 件数]
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def observe(self, name, value, **labels):
+        buckets = DEFINITIONS[name][2]
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(buckets)] += 1  # +Inf
+            entry[-2] += value
+            entry[-1] += 1
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            values = {name: {key: _copy(value) for key, value in series.items()} for name, series in self._values.items()}
+        # キャッシュのヒット数・プールの状態はモジュール側で数えているので、その時点の値を載せる
+        for name, labels, value in (*_collect_cache_stats(), *_collect_pool_stats()):
+            values.setdefault(name, {})[_label_key(labels)] = value
+        return values
+
+    def flush(self):
+        """このプロセスの値を <pid>.json に書き出す"""
+        directory = settings.METRICS['DIR']
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, f'{os.getpid()}.json'), self.snapshot())
+
+    def start_flusher(self):
+        """
+        FLUSH_INTERVAL ごとに書き出すスレッドを起動する（リクエストのたびにはファイルを書かない）
+        gunicorn の preload では fork 前にスレッドを作らないよう、最初のリクエストで起動する
+        """
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(settings.METRICS['FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush metrics")
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+registry = Registry()
+
+
+def observe(name, value, **labels):
+    if settings.METRICS['ENABLED']:
+        registry.observe(name, value, **labels)
+
+
+def inc(name, amount=1, **labels):
+    if settings.METRICS['ENABLED']:
+        registry.inc(name, amount, **labels)
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _collect_cache_stats():
+    from posts import geocoding, response_cache
+
+    stats = response_cache.stats()
+    for result in ('hits', 'misses', 'bypasses'):
+        yield 'response_cache_requests_total', {'result': result}, stats[result]
+    # 逆ジオコーディングのキャッシュは、一度も使っていないプロセスでは作らない
+    if geocoding._cache is not None:
+        stats = geocoding._cache.stats()
+        for result in ('memory_hits', 'db_hits', 'misses'):
+            yield 'geocode_cache_lookups_total', {'result': result}, stats[result]
+
+
+def _collect_pool_stats():
+    for alias in connections:
+        # .pool はプールを作ってしまうので、作成済みのものだけを見る
+        pool = getattr(connections[alias], '_connection_pools', {}).get(alias)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        for state, key in (('size', 'pool_size'), ('available', 'pool_available'), ('max', 'pool_max')):
+            yield 'db_pool_connections', {'alias': alias, 'state': state}, stats.get(key, 0)
+        yield 'db_pool_requests_waiting', {'alias': alias}, stats.get('requests_waiting', 0)
+        yield 'db_pool_requests_total', {'alias': alias}, stats.get('requests_num', 0)
+        yield 'db_pool_request_wait_seconds_total', {'alias': alias}, stats.get('requests_wait_ms', 0) / 1000
+        yield 'db_pool_timeouts_total', {'alias': alias}, stats.get('requests_errors', 0)
+        yield 'db_pool_connections_opened_total', {'alias': alias}, stats.get('connections_num', 0)
+        yield 'db_pool_connections_lost_total', {'alias': alias}, stats.get('connections_lost', 0)
+
+
+@receiver(connection_created)
+def _count_connection(sender, connection, **kwargs):
+    inc('db_connections_total', alias=connection.alias)
+
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _merge(total, values):
+    for name, series in values.items():
+        target = total.setdefault(name, {})
+        for key, value in series.items():
+            current = target.get(key)
+            if current is None:
+                target[key] = _copy(value)
+            elif isinstance(value, list):
+                target[key] = [a + b for a, b in zip(current, value)]
+            else:
+                target[key] = current + value
+    return total
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def aggregate():
+    """全ワーカーの値を合算する（終了したワーカーのファイルは archive.json に畳み込む）"""
+    registry.flush()
+    directory = settings.METRICS['DIR']
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE)
+        archive = _read_json(archive_path)
+        total = _merge({}, archive)
+        archived = False
+        for filename in os.listdir(directory):
+            pid = filename[:-len('.json')]
+            if not filename.endswith('.json') or not pid.isdigit():
+                continue
+            path, pid = os.path.join(directory, filename), int(pid)
+            values = _read_json(path)
+            if pid != os.getpid() and not _is_alive(pid):
+                # ゲージは終了したワーカーの分を残さない
+                counters = {name: series for name, series in values.items() if name not in GAUGES}
+                _merge(archive, counters)
+                os.remove(path)
+                archived = True
+            _merge(total, values)
+        if archived:
+            _write_json(archive_path, archive)
+    return total
+
+
+def clear_directory(directory):
+    """前回起動時の値を消す（gunicorn の起動時に呼ぶ）"""
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _ratio_lines(name, help_text, counters, hit_labels):
+    hits = sum(value for key, value in counters.items() if dict(json.loads(key)).get('result') in hit_labels)
+    total = sum(counters.values())
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {hits / total if total else 0.0}']
+
+
+def render(values):
+    lines = []
+    for name, (kind, help_text, buckets) in DEFINITIONS.items():
+        series = values.get(name)
+        if not series:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for key, value in sorted(series.items()):
+            pairs = [tuple(pair) for pair in json.loads(key)]
+            if kind in ('counter', 'gauge'):
+                lines.append(f'{name}{_labels(pairs)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), value[:len(buckets) + 1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels([*pairs, ("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {value[-2]}')
+            lines.append(f'{name}_count{_labels(pairs)} {value[-1]}')
+
+    if values.get('response_cache_requests_total'):
+        lines += _ratio_lines('response_cache_hit_ratio', 'Response cache hit ratio (hits / lookups incl. bypasses)',
+                              values['response_cache_requests_total'], {'hits'})
+    if values.get('geocode_cache_lookups_total'):
+        lines += _ratio_lines('geocode_cache_hit_ratio', 'Reverse geocoding cache hit ratio',
+                              values['geocode_cache_lookups_total'], {'memory_hits', 'db_hits'})
+    return '\n'.join(lines) + '\n'
+
+
+class QueryStats:
+    """connection.execute_wrapper 用: クエリ数と合計時間を数える"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS['ENABLED']:
+            return self.get_response(request)
+
+        queries = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = '/' + match.route if match else 'unmatched'
+        registry.observe('http_request_duration_seconds', elapsed,
+                         route=route, method=request.method, status=response.status_code)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', len(response.content), route=route)
+        registry.observe('db_queries_per_request', queries.count, route=route)
+        registry.observe('db_query_seconds_per_request', queries.seconds, route=route)
+        registry.start_flusher()
+        return response
+
+
+def metrics_view(request):
+    """Prometheus のスクレイプ用（METRICS['TOKEN'] を設定した場合は Bearer トークンが必要）"""
+    if not settings.METRICS['ENABLED']:
+        return HttpResponseNotFound()
+    token = settings.METRICS['TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(aggregate()), content_type='text/plain; version=0.0.4; charset=utf-8')
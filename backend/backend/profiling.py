@@ -0,0 +1,129 @@
+"""
+リクエストごとの SQL プロファイラ（開発・ステージング用、QUERY_PROFILER['ENABLED'] のときだけ動く）
+
+- リクエスト中の全 SQL を記録し、リテラルを伏せた「形」ごとにまとめる
+- 同じ形のクエリが N_PLUS_ONE 回以上実行されたら N+1 とみなし、発行元（アプリのコードの行）を示す
+- クエリ数・DB 時間・リクエスト時間がしきい値を超えたリクエストと、遅い SQL をログに出す
+- リクエストヘッダ X-Query-Profile を付けると結果を返す
+  1       : X-Query-Count / X-DB-Time / X-N-Plus-One ヘッダを付ける
+  cprofile: さらにリクエスト全体を cProfile で計測し、PROFILE_DIR に .prof を書き出す（X-Profile-File）
+"""
+
+import cProfile
+import logging
+import os
+import re
+import time
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'IN \((?:(?:%s|\?), )*(?:%s|\?)\)')
+
+
+def normalize(sql):
+    """SQL の「形」（リテラル・IN の要素数を伏せたもの）"""
+    sql = _NUMBER.sub('?', _STRING.sub('?', sql))
+    return ' '.join(_IN_LIST.sub('IN (...)', sql).split())
+
+
+def _caller():
+    # Django・DRF の内部ではなく、このプロジェクトのコードで最後に通った行
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if frame.filename.startswith(base_dir) and frame.filename != __file__ and 'site-packages' not in frame.filename:
+            return f'{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryRecorder:
+    """connection.execute_wrapper 用: SQL の形ごとの回数・時間と、N+1 の発行元を記録する"""
+
+    def __init__(self, n_plus_one):
+        self.n_plus_one = n_plus_one
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.callers = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            shape = normalize(sql)
+            self.shapes[shape] += 1
+            # スタックの取得は重いので、N+1 とみなす回数に達したときだけ行う
+            if self.shapes[shape] == self.n_plus_one:
+                self.callers[shape] = _caller()
+            if elapsed >= settings.QUERY_PROFILER['SLOW_SQL']:
+                self.slow.append((elapsed, sql))
+
+    def n_plus_ones(self):
+        """[(形, 回数, 発行元)]（回数の多い順）"""
+        return [
+            (shape, count, self.callers.get(shape, 'unknown'))
+            for shape, count in self.shapes.most_common() if count >= self.n_plus_one
+        ]
+
+
+class QueryProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = settings.QUERY_PROFILER
+        if not conf['ENABLED']:
+            return self.get_response(request)
+
+        mode = request.headers.get('X-Query-Profile', '').lower()
+        recorder = QueryRecorder(conf['N_PLUS_ONE'])
+        profiler = cProfile.Profile() if mode == 'cprofile' else None
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            if profiler:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        n_plus_ones = recorder.n_plus_ones()
+        self.log(request, response, recorder, n_plus_ones, elapsed, conf)
+        if mode:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-DB-Time'] = f'{recorder.seconds * 1000:.1f}ms'
+            response['X-N-Plus-One'] = str(len(n_plus_ones))
+        if profiler:
+            response['X-Profile-File'] = self.dump(profiler, request, conf['PROFILE_DIR'])
+        return response
+
+    def log(self, request, response, recorder, n_plus_ones, elapsed, conf):
+        for seconds, sql in recorder.slow:
+            logger.warning("Slow query (%.1fms) %s %s: %s", seconds * 1000, request.method, request.path, sql)
+
+        if recorder.count < conf['MAX_QUERIES'] and elapsed < conf['MAX_SECONDS'] and not n_plus_ones:
+            return
+        lines = [
+            f"{request.method} {request.path} -> {response.status_code}: "
+            f"{recorder.count} queries, {recorder.seconds * 1000:.1f}ms in DB, {elapsed * 1000:.1f}ms total"
+        ]
+        for shape, count, caller in n_plus_ones:
+            lines.append(f"  N+1: {count}x at {caller}: {shape[:300]}")
+        logger.warning('\n'.join(lines))
+
+    def dump(self, profiler, request, directory):
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        path = os.path.join(directory, f'{int(time.time() * 1000)}-{request.method}-{name}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        return path
@@ -0,0 +1,31 @@
+"""
+JSON のレンダラー（REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']）
+
+DRF の JSONRenderer と同じ出力（コンパクト・UTF-8・U+2028 / U+2029 はエスケープ）を orjson で作る
+- datetime・Decimal など orjson と DRF で表記が違う型は、DRF のエンコーダに任せる
+- 浮動小数点数の指数表記だけは異なる（1e-05 が 0.00001 になる。座標・距離の範囲では出ない）
+- orjson が無い・インデントの指定がある・orjson で変換できないデータ（文字列以外のキーなど）は DRF の実装で書き出す
+"""
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=encoders.JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JavaScript の文字列リテラルで改行になる文字（DRF と同じ）
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
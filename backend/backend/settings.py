@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # .env ファイルを読み込む
@@ -52,10 +53,21 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # トークンの内容からユーザーを組み立てる（users/authentication.py）
+        'users.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # JSONRenderer と同じ出力を orjson で作る（backend/renderers.py）
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
+# 認証時の無効化（is_active）確認のキャッシュ時間（秒）。無効化してから反映されるまでの最大時間になる
+AUTH_USER_STATUS_TTL = int(os.getenv('AUTH_USER_STATUS_TTL', '60'))
+# 上のキャッシュの最大件数（プロセスごと。超えたら最も長く使われていないユーザーから捨てる）
+AUTH_USER_STATUS_CACHE_SIZE = int(os.getenv('AUTH_USER_STATUS_CACHE_SIZE', '10000'))
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -87,6 +99,9 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',  # 処理時間を全体で計測するため先頭に置く
+    'backend.profiling.QueryProfilerMiddleware',  # QUERY_PROFILER['ENABLED'] のときだけ動く
+    'backend.db_routing.ReplicaRoutingMiddleware',  # DATABASE_REPLICAS があるときだけ動く
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -172,6 +187,41 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB 接続の使い回し（下の DATABASES の全エントリに適用する）
+_asgi_server = os.getenv('SERVER_MODE', 'wsgi') == 'asgi'
+DATABASE_CONNECTIONS = {
+    # 接続を使い回す秒数（0 ならリクエストごとに接続し直す）
+    # ASGI ではリクエストごとにスレッドが変わり、スレッドごとの接続が残り続けるので既定は 0（プールを使う）
+    'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '0' if _asgi_server else '600')),
+    # 使い回す接続を、リクエストで最初に使う前に確認する（切れていれば接続し直す）
+    'HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True').lower() == 'true',
+    # psycopg3 のコネクションプール（PostgreSQL のみ。psycopg_pool が必要）。使う場合 CONN_MAX_AGE は無視する
+    'POOL': os.getenv('DATABASE_POOL', 'False').lower() == 'true',
+    'POOL_MIN_SIZE': int(os.getenv('DATABASE_POOL_MIN_SIZE', '1')),
+    # ワーカープロセスごとの上限。gthread ではスレッド数、ASGI では同時に DB を使うリクエスト数に合わせる
+    'POOL_MAX_SIZE': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10' if _asgi_server else os.getenv('GUNICORN_THREADS', '4'))),
+    'POOL_TIMEOUT': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),  # 空きを待つ秒数（超えるとエラー）
+}
+
+
+def _with_connection_settings(database):
+    if DATABASE_CONNECTIONS['POOL'] and database['ENGINE'] == 'django.db.backends.postgresql':
+        # 接続の保持・確認はプールが行う（Django の持続接続とは併用できない）
+        pool = {
+            'min_size': DATABASE_CONNECTIONS['POOL_MIN_SIZE'],
+            'max_size': DATABASE_CONNECTIONS['POOL_MAX_SIZE'],
+            'timeout': DATABASE_CONNECTIONS['POOL_TIMEOUT'],
+        }
+        return {
+            **database, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': DATABASE_CONNECTIONS['HEALTH_CHECKS'],
+            'OPTIONS': {**database.get('OPTIONS', {}), 'pool': pool},
+        }
+    return {
+        **database, 'CONN_MAX_AGE': DATABASE_CONNECTIONS['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASE_CONNECTIONS['HEALTH_CHECKS'],
+    }
+
+
 # 環境変数からデータベース設定を取得
 DATABASE_URL = os.getenv('DATABASE_URL')
 
@@ -190,6 +240,132 @@ else:
         }
     }
 
+# 読み取り専用レプリカ（カンマ区切りの URL）。設定すると、安全なメソッドのリクエストの読み取りを
+# レプリカに振り分ける（backend/db_routing.py）。書き込みと、書き込んだ直後のユーザーの読み取りはプライマリ
+# 書き込んだ直後のユーザーはキャッシュに記録するので、ワーカー間で共有されるキャッシュ（CACHES）が必要
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+DATABASE_REPLICAS = [f'replica_{number}' for number in range(1, len(DATABASE_REPLICA_URLS) + 1)]
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    for alias, url in zip(DATABASE_REPLICAS, DATABASE_REPLICA_URLS):
+        # テストではプライマリと同じ DB を使う（レプリカ用のテスト DB は作らない）
+        DATABASES[alias] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+DATABASES = {alias: _with_connection_settings(database) for alias, database in DATABASES.items()}
+DATABASE_ROUTERS = ['backend.db_routing.PrimaryReplicaRouter']
+DATABASE_REPLICATION = {
+    # 書き込んだユーザーの読み取りをプライマリに固定する時間（秒）。レプリカの遅延がこれより大きければ遅延の分だけ固定する
+    'STICKY_SECONDS': float(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '5')),
+    # 遅延がこれを超えたレプリカは使わない（秒）
+    'MAX_LAG': float(os.getenv('DATABASE_REPLICA_MAX_LAG', '10')),
+    'LAG_CHECK_INTERVAL': float(os.getenv('DATABASE_REPLICA_LAG_CHECK_INTERVAL', '5')),  # 秒
+}
+
+# 市区町村境界データ（GeoJSON）。存在すれば投稿位置の市区町村をローカルで判定する
+MUNICIPALITY_BOUNDARIES_PATH = os.getenv(
+    'MUNICIPALITY_BOUNDARIES_PATH', str(BASE_DIR / 'posts' / 'data' / 'municipalities.geojson')
+)
+# ローカルで判定できなかった場合に外部ジオコーダを使うか
+MUNICIPALITY_REMOTE_FALLBACK = os.getenv('MUNICIPALITY_REMOTE_FALLBACK', 'True').lower() == 'true'
+
+# 都道府県・市区町村一覧（CSV、users/data に同梱）。存在すれば会員登録時の住所確認を外部APIなしで行う
+ADDRESS_REGISTRY_PATH = os.getenv(
+    'ADDRESS_REGISTRY_PATH', str(BASE_DIR / 'users' / 'data' / 'municipalities.csv')
+)
+
+# 逆ジオコーディング（投稿位置 -> 市区町村）
+REVERSE_GEOCODER = os.getenv('REVERSE_GEOCODER', 'posts.geocoding.GoogleGeocoder')
+ASYNC_REVERSE_GEOCODER = os.getenv('ASYNC_REVERSE_GEOCODER', 'posts.geocoding.AsyncGoogleGeocoder')
+# 負荷試験ではローカルの遅いスタブに向ける（loadtest_asgi コマンド）
+GOOGLE_GEOCODING_URL = os.getenv('GOOGLE_GEOCODING_URL', 'https://maps.googleapis.com/maps/api/geocode/json')
+
+# ASGI（uvicorn ワーカー）で動かすときは一覧・詳細・投稿作成を非同期ビュー（posts/async_views.py）にする
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+GEOCODE_CACHE = {
+    'PRECISION': int(os.getenv('GEOCODE_CACHE_PRECISION', '3')),  # 小数点以下3桁 ≒ 約100m四方のセル
+    'MEMORY_SIZE': int(os.getenv('GEOCODE_CACHE_MEMORY_SIZE', '4096')),  # プロセス内 LRU の最大件数
+    'MEMORY_TTL': int(os.getenv('GEOCODE_CACHE_MEMORY_TTL', '3600')),  # 秒
+    'DB_TTL': int(os.getenv('GEOCODE_CACHE_DB_TTL', str(60 * 60 * 24 * 30))),  # 秒（30日）
+}
+
+# キャッシュ（既定はファイル。同じホストの全ワーカーで共有され、一覧キャッシュの無効化・レプリカの固定が全ワーカーに届く）
+# 複数ホストで共有するなら CACHE_BACKEND / CACHE_LOCATION で Redis 等に切り替える
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'original-product-cache')),
+    }
+}
+if CACHES['default']['BACKEND'].endswith(('LocMemCache', 'FileBasedCache')):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))}
+# テストでは実行ごとに空のキャッシュディレクトリを使う
+TEST_RUNNER = 'backend.test_runner.TestRunner'
+
+# 未ログインの一覧レスポンスのキャッシュ（posts/response_cache.py）
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true',
+    # 書き込み時のバージョン更新で無効化するので、TTL はレプリカの遅延などで古い内容が入ったときに残る上限
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '60')),  # 秒
+}
+
+# いいねの書き込みバッファ（posts/like_buffer.py）。有効にする場合は flush_like_buffer --loop を常駐させる
+LIKE_BUFFER = {
+    'ENABLED': os.getenv('LIKE_BUFFER_ENABLED', 'False').lower() == 'true',
+    'BATCH_SIZE': int(os.getenv('LIKE_BUFFER_BATCH_SIZE', '1000')),
+    'INTERVAL': float(os.getenv('LIKE_BUFFER_INTERVAL', '1.0')),  # 秒
+}
+
+# 市区町村ごとの新着タイムライン（posts/timeline.py）。市区町村ごとに直近 LENGTH 件を保持する
+CITY_TIMELINE = {
+    'LENGTH': int(os.getenv('CITY_TIMELINE_LENGTH', '1000')),
+}
+
+# 市区町村ごとの話題の投稿ランキング（posts/trending.py）。decay_trending_scores --loop を常駐させる
+TRENDING = {
+    'HALF_LIFE_HOURS': float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24')),
+    'LIKE_WEIGHT': 1.0,
+    'COMMENT_WEIGHT': 2.0,
+    'MIN_SCORE': 0.05,  # これ未満に減衰したらランキングから外す
+    'TOP_K': 50,  # 1回に返す件数の上限
+    'DECAY_INTERVAL': float(os.getenv('TRENDING_DECAY_INTERVAL', '600')),  # 秒
+}
+
+# 投稿画像の縮小版（posts/images.py）
+IMAGE_VARIANTS = {
+    'SIZES': {'thumb': 320, 'card': 800, 'full': 1600},  # 長辺の最大ピクセル数
+    'QUALITY': int(os.getenv('IMAGE_VARIANTS_QUALITY', '80')),
+    # False ならリクエスト内で同期的に生成する（テスト・デバッグ用）
+    'ASYNC': os.getenv('IMAGE_VARIANTS_ASYNC', 'True').lower() == 'true',
+    'WORKERS': int(os.getenv('IMAGE_VARIANTS_WORKERS', '2')),  # プロセスごとの生成スレッド数
+}
+
+# メトリクス（backend/metrics.py、/api/metrics）
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True').lower() == 'true',
+    # gunicorn の全ワーカーが値を書き出す共有ディレクトリ（コンテナ内のローカルディスク）
+    'DIR': os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'jimotoko-metrics')),
+    'FLUSH_INTERVAL': float(os.getenv('METRICS_FLUSH_INTERVAL', '1.0')),  # ワーカーごとの書き出し間隔（秒）
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),  # 設定すると Authorization: Bearer <TOKEN> が必要
+}
+
+# リクエストごとの SQL プロファイラ（backend/profiling.py）。開発・ステージングで有効にする
+QUERY_PROFILER = {
+    'ENABLED': os.getenv('QUERY_PROFILER_ENABLED', 'False').lower() == 'true',
+    'N_PLUS_ONE': int(os.getenv('QUERY_PROFILER_N_PLUS_ONE', '5')),  # 同じ形のクエリがこの回数以上なら N+1
+    'MAX_QUERIES': int(os.getenv('QUERY_PROFILER_MAX_QUERIES', '20')),  # これ以上のクエリ数ならログに出す
+    'MAX_SECONDS': float(os.getenv('QUERY_PROFILER_MAX_SECONDS', '0.5')),  # これ以上かかったリクエストもログに出す
+    'SLOW_SQL': float(os.getenv('QUERY_PROFILER_SLOW_SQL', '0.1')),  # 1つの SQL がこの秒数以上ならログに出す
+    'PROFILE_DIR': os.getenv('QUERY_PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'jimotoko-profiles')),
+}
+
+# ヘルスチェック（backend/health_check.py）。DB 接続などの確認はバックグラウンドで行い、結果を返すだけにする
+HEALTH_CHECK = {
+    'INTERVAL': float(os.getenv('HEALTH_CHECK_INTERVAL', '15')),  # 確認の間隔（秒）
+    # この秒数より古い結果は使わない（確認が止まっているとみなして ready を返さない）
+    'STALE_AFTER': float(os.getenv('HEALTH_CHECK_STALE_AFTER', '60')),
+    # False ならバックグラウンドのスレッドを使わず、結果が古くなったリクエストで確認する（テスト用）
+    'BACKGROUND': os.getenv('HEALTH_CHECK_BACKGROUND', 'True').lower() == 'true',
+}
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 AUTHENTICATION_BACKENDS = [
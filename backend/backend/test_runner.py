@@ -0,0 +1,29 @@
+"""
+テストランナー（TEST_RUNNER）
+
+既定のキャッシュはファイル（ホスト内の全プロセスで共有）なので、テストでは実行ごとに空の一時ディレクトリを使う
+（前回の実行・起動中の開発サーバーのエントリを読まないようにする）
+"""
+
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.TemporaryDirectory()
+        self._cache_settings = override_settings(CACHES={
+            alias: {**cache, 'LOCATION': self._cache_dir.name}
+            if cache['BACKEND'].endswith('FileBasedCache') else cache
+            for alias, cache in settings.CACHES.items()
+        })
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        self._cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
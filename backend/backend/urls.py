@@ -18,13 +18,17 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from .health_check import health_check
+from .health_check import health_check, ready_check, simple_health_check
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/posts/', include('posts.urls')),
     path('api/health', health_check),
+    path('api/health/simple', simple_health_check),
+    path('api/health/ready', ready_check),
+    path('api/metrics', metrics_view),
 ]
 
 # 画像アップロード対応
@@ -0,0 +1,83 @@
+# gunicorn.conf.py
+
+"""
+gunicorn の設定（Dockerfile の entrypoint から -c で読み込む）
+- preload_app: アプリの読み込みはマスターで1回だけ行い、ワーカーは fork で起動する
+  （ワーカーごとに Django を import し直さないので、起動とワーカーの再起動が速い）
+- SERVER_MODE=asgi なら uvicorn ワーカー + backend.asgi、それ以外は同期ワーカー（gthread）+ backend.wsgi
+- ワーカー数・スレッド数は環境変数で調整する（既定は CPU 数から決める）
+"""
+
+import multiprocessing
+import os
+import time
+
+_started = time.monotonic()
+_asgi = os.getenv('SERVER_MODE', 'wsgi') == 'asgi'
+
+if _asgi:
+    os.environ.setdefault('ASYNC_VIEWS', 'true')
+
+wsgi_app = 'backend.asgi:application' if _asgi else 'backend.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# ASGI はイベントループで並行処理するのでスレッドは使わない
+worker_class = 'uvicorn.workers.UvicornWorker' if _asgi else 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+threads = 1 if _asgi else int(os.getenv('GUNICORN_THREADS', '4'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# ALB のアイドルタイムアウト（60秒）より長くして、ALB 側から接続を切らせる
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '75'))
+# メモリの断片化・リーク対策で、一定数のリクエストごとにワーカーを入れ替える（一斉に入れ替わらないよう揺らす）
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # 前回起動時のメトリクス（backend/metrics.py）を消す
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+
+    from backend.metrics import clear_directory
+
+    clear_directory(settings.METRICS['DIR'])
+
+
+def when_ready(server):
+    server.log.info("ready in %.2fs (preload=%s, mode=%s)", time.monotonic() - _started, preload_app,
+                    'asgi' if _asgi else 'wsgi')
+
+
+def pre_fork(server, worker):
+    # preload でマスターが DB のコネクションプール（接続とスレッドを持つ）を作っていれば、fork 前に閉じる
+    # （ワーカーはそれぞれ自分のプールを作る）
+    if preload_app:
+        from django.db import connections
+
+        for connection in connections.all(initialized_only=True):
+            if connection.alias in getattr(connection, '_connection_pools', {}):
+                connection.close_pool()
+
+
+def post_fork(server, worker):
+    # マスターで開いた DB 接続をワーカー間で共有しない
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def worker_exit(server, worker):
+    # 最後の書き出し以降の値を残す（他のワーカーが archive.json に畳み込む）
+    from backend.metrics import registry
+
+    try:
+        registry.flush()
+    except Exception:
+        server.log.exception("failed to flush metrics")
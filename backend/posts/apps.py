@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # SQLite はテーブル再作成を伴うマイグレーションで FTS 同期トリガーが消えるため、
+    # migrate のたびに索引・トリガーを作り直す（既存なら何もしない）
+    from django.db import connections
+    from .search import create_search_index
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if 'posts_post' not in connection.introspection.table_names(cursor):
+            return
+        columns = {c.name for c in connection.introspection.get_table_description(cursor, 'posts_post')}
+    if 'search_document' not in columns:
+        return
+    with connection.schema_editor() as schema_editor:
+        create_search_index(schema_editor)
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(ensure_search_index, sender=self)
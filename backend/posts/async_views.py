@@ -0,0 +1,245 @@
+# posts/async_views.py
+
+"""
+ASGI 用の非同期ビュー（settings.ASYNC_VIEWS が True のとき posts/urls.py で差し替える）
+- 投稿一覧・投稿詳細・コメント一覧・投稿作成
+- 認証・権限・ETag・未ログイン一覧のキャッシュは同期ビューと同じ挙動
+  （クエリセット・シリアライザ・ページネーションは同期ビューのものをそのまま使う）
+- 投稿作成は市区町村の判定（外部ジオコーダ）を await で待つので、待ち時間にワーカーを占有しない
+WSGI（同期の gunicorn）では従来の DRF ビューを使う
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from backend.renderers import FastJSONRenderer
+from . import like_buffer, response_cache
+from .conditional import make_etag
+from .geo import is_valid_coordinate
+from .models import Comment, LikeIntent, Post
+from .serializers.post import PostSerializer
+from .views import CommentListView, PostCreateView, PostDetailView, PostListView
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def error_response(exc):
+    response = json_response({'detail': exc.detail}, status=exc.status_code)
+    if isinstance(exc, exceptions.NotAuthenticated):
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+async def _apending_version(user):
+    # like_buffer.pending_version() の非同期版
+    if not like_buffer.is_enabled() or not user.is_authenticated:
+        return None
+    return (await LikeIntent.objects.filter(user=user).aaggregate(last=Max('id')))['last']
+
+
+class AsyncAPIView(View):
+    """
+    DRF の同期ビュー（drf_view_class）の非同期版の土台
+    同期ビューのインスタンスを組み立てて get_queryset() などを使い回す
+    """
+    drf_view_class = None
+    require_authentication = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # DRF の APIView と同じく CSRF の対象外（JWT 認証）
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def drf_request(self, request):
+        return Request(
+            request,
+            parsers=[parser() for parser in self.drf_view_class.parser_classes],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+
+    def drf_view(self, drf_request, *args, **kwargs):
+        view = self.drf_view_class()
+        view.request = drf_request
+        view.args = args
+        view.kwargs = kwargs
+        view.format_kwarg = None
+        view.headers = {}
+        return view
+
+    async def authenticate(self, drf_request):
+        """認証して権限を確認する（失敗時は APIException）"""
+        # トークンからユーザーを組み立てる（無効化確認のキャッシュが切れていれば1クエリ）
+        user = await sync_to_async(lambda: drf_request.user)()
+        if self.require_authentication and not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        return user
+
+    async def conditional_state(self, view, user):
+        """ConditionalGetMixin.conditional_state() の非同期版（None なら ETag なし）"""
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method == 'OPTIONS' or not hasattr(self, request.method.lower()):
+            # 非同期版を用意していないメソッド（編集・削除・OPTIONS）は同期ビューに任せる
+            return await sync_to_async(self.drf_view_class.as_view())(request, *args, **kwargs)
+        drf_request = self.drf_request(request)
+        try:
+            user = await self.authenticate(drf_request)
+            view = self.drf_view(drf_request, *args, **kwargs)
+            return await super().dispatch(request, drf_request, view, user, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+
+    async def conditional_validators(self, request, drf_request, view, user):
+        """ConditionalGetMixin.get_conditional_validators() の非同期版"""
+        state = await self.conditional_state(view, user)
+        if state is None:
+            return None
+        parts, last_modified = state
+        etag = make_etag(request.get_full_path(), user.pk if user.is_authenticated else 'anonymous', *parts)
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    async def conditional(self, request, drf_request, view, user, build):
+        """ETag / Last-Modified を付けて build() の結果を返す（一致すれば 304）"""
+        validators = await self.conditional_validators(request, drf_request, view, user)
+        if validators is None:
+            return await build()
+
+        etag, timestamp = validators
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await build()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class AsyncListView(AsyncAPIView):
+    """一覧（カーソルページネーション）。未ログインならレスポンスキャッシュを使う"""
+
+    async def conditional_validators(self, request, drf_request, view, user):
+        # AnonymousResponseCacheMixin と同じく、未ログインなら ETag もキャッシュする
+        if not response_cache.is_cacheable(drf_request):
+            return await super().conditional_validators(request, drf_request, view, user)
+        key = await sync_to_async(response_cache.validators_key)(view.response_cache_scope(), drf_request)
+        validators = await cache.aget(key)
+        if validators is None:
+            validators = await super().conditional_validators(request, drf_request, view, user)
+            if validators is not None:
+                await sync_to_async(response_cache.store)(key, validators)
+        return validators
+
+    async def get(self, request, drf_request, view, user, *args, **kwargs):
+        if not response_cache.is_cacheable(drf_request):
+            response_cache.record_bypass()
+            return await self.conditional(request, drf_request, view, user, lambda: self.build(drf_request, view))
+
+        async def build():
+            key, data = await sync_to_async(response_cache.get)(view.response_cache_scope(), drf_request)
+            if data is not None:
+                response = json_response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+            data = await self.page_data(drf_request, view)
+            await sync_to_async(response_cache.store)(key, data)
+            response = json_response(data)
+            response['X-Cache'] = 'MISS'
+            return response
+        return await self.conditional(request, drf_request, view, user, build)
+
+    async def build(self, drf_request, view):
+        return json_response(await self.page_data(drf_request, view))
+
+    async def page_data(self, drf_request, view):
+        # CursorPagination とシリアライザは同期 API なので、ページの取得と変換だけスレッドで行う
+        @sync_to_async
+        def paginate():
+            queryset = view.filter_queryset(view.get_queryset())
+            page = view.paginator.paginate_queryset(queryset, drf_request, view)
+            serializer = view.get_serializer(page, many=True)
+            return dict(view.paginator.get_paginated_response(serializer.data).data)
+        return await paginate()
+
+
+class AsyncPostListView(AsyncListView):
+    drf_view_class = PostListView
+
+    async def conditional_state(self, view, user):
+        # PostListView.conditional_state() と同じ
+        last = (await Post.objects.aaggregate(last=Max('updated_at')))['last']
+        version = await sync_to_async(response_cache.get_version)('posts')
+        return (version, last, await _apending_version(user)), last
+
+
+class AsyncCommentListView(AsyncListView):
+    drf_view_class = CommentListView
+
+    async def conditional_state(self, view, user):
+        state = await Comment.objects.filter(post_id=view.kwargs['post_id']).aaggregate(
+            last=Max('updated_at'), count=Count('id'),
+        )
+        return (state['last'], state['count'], await _apending_version(user)), state['last']
+
+
+class AsyncPostDetailView(AsyncAPIView):
+    """投稿詳細の取得のみ（編集・削除は同期ビューに任せる）"""
+    drf_view_class = PostDetailView
+    require_authentication = True
+
+    async def conditional_state(self, view, user):
+        updated_at = await Post.objects.filter(pk=view.kwargs['pk']).values_list('updated_at', flat=True).afirst()
+        if updated_at is None:
+            raise exceptions.NotFound()
+        return (updated_at, await _apending_version(user)), updated_at
+
+    async def get(self, request, drf_request, view, user, *args, **kwargs):
+        async def build():
+            try:
+                post = await view.get_queryset().aget(pk=kwargs['pk'])
+            except Post.DoesNotExist:
+                raise exceptions.NotFound()
+            return json_response(view.get_serializer(post).data)
+        return await self.conditional(request, drf_request, view, user, build)
+
+
+class AsyncPostCreateView(AsyncAPIView):
+    """投稿作成: 市区町村の判定を await で待ってから、保存だけをスレッドで行う"""
+    drf_view_class = PostCreateView
+    require_authentication = True
+
+    async def post(self, request, drf_request, view, user, *args, **kwargs):
+        data = await sync_to_async(lambda: drf_request.data)()
+        context = view.get_serializer_context()
+        try:
+            latitude, longitude = float(data.get('latitude')), float(data.get('longitude'))
+        except (TypeError, ValueError):
+            latitude = longitude = None
+        # 緯度経度の形式・範囲のエラーはシリアライザに任せる
+        if is_valid_coordinate(latitude, longitude):
+            try:
+                context['resolved_city'] = await PostSerializer.aresolve_city(latitude, longitude)
+            except exceptions.ValidationError as exc:
+                return json_response({api_settings.NON_FIELD_ERRORS_KEY: exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(self.create)(view, data, context)
+
+    def create(self, view, data, context):
+        serializer = PostSerializer(data=data, context=context)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        view.perform_create(serializer)
+        return json_response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,141 @@
+# posts/boundaries.py
+
+"""
+市区町村境界ポリゴンによるオフラインの市区町村判定
+- MUNICIPALITY_BOUNDARIES_PATH の GeoJSON（国土数値情報 行政区域データ N03 など）を読み込む
+- ポリゴンの外接矩形をグリッドセルに登録し、点が属するセルの候補だけを内外判定する
+ファイルが無い場合は判定できない（None を返す）ので、呼び出し側は外部ジオコーダにフォールバックする
+"""
+
+import json
+import logging
+import math
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from users.address_registry import city_name
+
+logger = logging.getLogger(__name__)
+
+
+
+def feature_city(properties):
+    """
+    フィーチャーの市区町村名。properties.city が無ければ N03 の属性から決める
+    （政令指定都市は区ではなく市。会員登録の市区町村・Geocoding API と同じ、users/address_registry.city_name）
+    """
+    return properties.get('city') or city_name(properties) or None
+
+
+def _point_in_ring(x, y, ring):
+    # ray casting 法
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+class _Polygon:
+    __slots__ = ('name', 'outer', 'holes', 'bbox')
+
+    def __init__(self, name, rings):
+        self.name = name
+        self.outer = [tuple(p[:2]) for p in rings[0]]
+        self.holes = [[tuple(p[:2]) for p in ring] for ring in rings[1:]]
+        xs = [p[0] for p in self.outer]
+        ys = [p[1] for p in self.outer]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, x, y):
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+        if not _point_in_ring(x, y, self.outer):
+            return False
+        return not any(_point_in_ring(x, y, hole) for hole in self.holes)
+
+
+class MunicipalityIndex:
+    """市区町村ポリゴンのグリッド索引"""
+
+    def __init__(self, features, cell_size=0.05):
+        self.cell_size = cell_size
+        self.grid = {}
+        self.polygons = []
+        for feature in features:
+            properties = feature.get('properties') or {}
+            name = feature_city(properties)
+            geometry = feature.get('geometry') or {}
+            if not name or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+                continue
+            parts = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            for rings in parts:
+                if rings:
+                    self._add(_Polygon(name, rings))
+
+    @classmethod
+    def from_file(cls, path, cell_size=0.05):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('features', []), cell_size=cell_size)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _add(self, polygon):
+        self.polygons.append(polygon)
+        min_x, min_y, max_x, max_y = polygon.bbox
+        (cx1, cy1), (cx2, cy2) = self._cell(min_x, min_y), self._cell(max_x, max_y)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.grid.setdefault((cx, cy), []).append(polygon)
+
+    def resolve(self, latitude, longitude):
+        """緯度経度を含む市区町村名を返す（どのポリゴンにも含まれなければ None）"""
+        for polygon in self.grid.get(self._cell(longitude, latitude), ()):
+            if polygon.contains(longitude, latitude):
+                return polygon.name
+        return None
+
+    def bounds(self):
+        """全ポリゴンの外接矩形 (min_lng, min_lat, max_lng, max_lat)"""
+        boxes = [p.bbox for p in self.polygons]
+        return (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+
+
+_index = None
+_index_path = None  # 読み込み済みのパス（設定が変わったら読み直す）
+_index_lock = threading.Lock()
+
+
+def get_municipality_index():
+    """設定された境界データから索引を作る（プロセスごとに1回、データが無ければ None）"""
+    global _index, _index_path
+    path = settings.MUNICIPALITY_BOUNDARIES_PATH
+    if _index_path != path:
+        with _index_lock:
+            if _index_path != path:
+                _index = None
+                if path and Path(path).exists():
+                    _index = MunicipalityIndex.from_file(path)
+                    logger.info("市区町村境界データを読み込みました: %s (%d polygons)", path, len(_index.polygons))
+                elif path:
+                    logger.info("市区町村境界データが見つかりません: %s", path)
+                _index_path = path
+    return _index
+
+
+def resolve_municipality(latitude, longitude):
+    """ローカルの境界データで市区町村を判定する（判定できなければ None）"""
+    index = get_municipality_index()
+    if index is None:
+        return None
+    return index.resolve(latitude, longitude)
@@ -0,0 +1,121 @@
+# posts/clusters.py
+
+"""
+地図表示用の投稿クラスタ（ズーム段階ごとの事前集計）
+- ズーム段階 tier ごとに、経緯度を一辺 360 / 2^tier / 4 度のグリッドに区切って件数を集計する
+- 投稿の作成・削除・位置変更のたびに該当セル（各 tier に1つ）を増減する
+- 表示範囲の問い合わせは1つの tier の範囲検索だけで済み、セル数には上限がある
+"""
+
+import math
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .geo import is_valid_coordinate
+from .models import Post, PostClusterCell
+
+CLUSTER_ZOOM_TIERS = (4, 6, 8, 10, 12, 14, 16)
+CELLS_PER_TILE = 4
+# 1回の問い合わせで返すセル数の上限（超える場合は粗い tier に切り替える）
+MAX_CLUSTER_CELLS = 1000
+
+
+def cell_size(tier):
+    return 360.0 / (2 ** tier) / CELLS_PER_TILE
+
+
+def cell_of(tier, latitude, longitude):
+    size = cell_size(tier)
+    return math.floor(latitude / size), math.floor(longitude / size)
+
+
+def cell_keys(latitude, longitude):
+    """全 tier について (tier, row, col) を返す"""
+    return [(tier, *cell_of(tier, latitude, longitude)) for tier in CLUSTER_ZOOM_TIERS]
+
+
+def _keys_q(keys):
+    q = Q()
+    for tier, row, col in keys:
+        q |= Q(tier=tier, row=row, col=col)
+    return q
+
+
+def add_post(latitude, longitude):
+    """投稿1件を全 tier のセルに加算する（位置が無い・nan・inf・範囲外なら何もしない）"""
+    if not is_valid_coordinate(latitude, longitude):
+        return
+    keys = cell_keys(latitude, longitude)
+    with transaction.atomic(savepoint=False):
+        # 無いセルを先に作ってから加算する（同時作成でも加算が失われない）
+        PostClusterCell.objects.bulk_create(
+            [PostClusterCell(tier=tier, row=row, col=col) for tier, row, col in keys],
+            ignore_conflicts=True,
+        )
+        PostClusterCell.objects.filter(_keys_q(keys)).update(
+            count=F('count') + 1,
+            lat_sum=F('lat_sum') + latitude,
+            lng_sum=F('lng_sum') + longitude,
+        )
+
+
+def remove_post(latitude, longitude):
+    """投稿1件を全 tier のセルから減算する（0件のセルは残し、問い合わせ時に除外する）"""
+    if not is_valid_coordinate(latitude, longitude):
+        return
+    PostClusterCell.objects.filter(_keys_q(cell_keys(latitude, longitude)), count__gt=0).update(
+        count=F('count') - 1,
+        lat_sum=F('lat_sum') - latitude,
+        lng_sum=F('lng_sum') - longitude,
+    )
+
+
+def tier_for_zoom(zoom):
+    candidates = [tier for tier in CLUSTER_ZOOM_TIERS if tier <= zoom]
+    return candidates[-1] if candidates else CLUSTER_ZOOM_TIERS[0]
+
+
+def clusters_in_bbox(min_lat, min_lng, max_lat, max_lng, zoom):
+    """表示範囲内のクラスタを返す: (tier, [{'lat', 'lng', 'count'}])"""
+    tier = tier_for_zoom(zoom)
+    while True:
+        (row1, col1), (row2, col2) = cell_of(tier, min_lat, min_lng), cell_of(tier, max_lat, max_lng)
+        cells = (row2 - row1 + 1) * (col2 - col1 + 1)
+        if cells <= MAX_CLUSTER_CELLS or tier == CLUSTER_ZOOM_TIERS[0]:
+            break
+        tier = CLUSTER_ZOOM_TIERS[CLUSTER_ZOOM_TIERS.index(tier) - 1]
+
+    rows = (
+        PostClusterCell.objects.filter(
+            tier=tier, row__gte=row1, row__lte=row2, col__gte=col1, col__lte=col2, count__gt=0,
+        )
+        .values_list('count', 'lat_sum', 'lng_sum')[:MAX_CLUSTER_CELLS]
+    )
+    return tier, [
+        {'lat': lat_sum / count, 'lng': lng_sum / count, 'count': count}
+        for count, lat_sum, lng_sum in rows
+    ]
+
+
+def rebuild(batch_size=5000):
+    """全投稿から集計し直す（ずれの補正用）"""
+    totals = {}
+    posts = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list('latitude', 'longitude')
+    for latitude, longitude in posts.iterator(chunk_size=batch_size):
+        if not is_valid_coordinate(latitude, longitude):
+            continue
+        for key in cell_keys(latitude, longitude):
+            count, lat_sum, lng_sum = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = (count + 1, lat_sum + latitude, lng_sum + longitude)
+
+    with transaction.atomic():
+        PostClusterCell.objects.all().delete()
+        PostClusterCell.objects.bulk_create(
+            [
+                PostClusterCell(tier=tier, row=row, col=col, count=count, lat_sum=lat_sum, lng_sum=lng_sum)
+                for (tier, row, col), (count, lat_sum, lng_sum) in totals.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(totals)
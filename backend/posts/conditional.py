@@ -0,0 +1,58 @@
+# posts/conditional.py
+
+"""
+条件付き GET（ETag / Last-Modified -> 304 Not Modified）
+- ETag はレスポンス本文ではなく、更新日時の最大値・件数などの軽いクエリ結果から作る
+- 一致すればシリアライズせずに 304 を返す
+- is_liked などユーザーごとに内容が変わるので、ユーザーID も ETag に含めて Vary: Authorization を付ける
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    GET に ETag / Last-Modified を付け、If-None-Match / If-Modified-Since が一致すれば 304 を返す
+    サブクラスで conditional_state() を定義する
+    """
+
+    def conditional_state(self, request, *args, **kwargs):
+        """
+        (バージョンを表す値のタプル, 最終更新日時) を返す
+        対象が無い場合は None（通常の処理に任せて 404 などを返す）
+        """
+        raise NotImplementedError
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        """(ETag, Last-Modified の UNIX 時刻 or None)。対象が無ければ None"""
+        state = self.conditional_state(request, *args, **kwargs)
+        if state is None:
+            return None
+        parts, last_modified = state
+        user_id = request.user.pk if request.user.is_authenticated else 'anonymous'
+        etag = make_etag(request.get_full_path(), user_id, *parts)
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_conditional_validators(request, *args, **kwargs)
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, timestamp = validators
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Authorization'])
+        return response
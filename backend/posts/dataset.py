@@ -0,0 +1,189 @@
+# posts/dataset.py
+
+"""
+負荷試験・ベンチマーク用の合成データ（generate_dataset / benchmark_api コマンド）
+- ユーザーは市区町村に人口比で割り当て、投稿はその市区町村の中心付近に散らす
+- 投稿数・いいね数・コメント数はパレート分布で偏らせる（一部の投稿・ユーザーに集中する）
+- チャンクごとに組み立てて bulk_create するので、件数が多くてもメモリを使い切らない
+- 非正規化カウンタ（like_count / comment_count）は作成する行数と一致させ、最後にクラスタ集計・市区町村タイムライン・話題のスコアを作り直す
+合成データのユーザー名は USERNAME_PREFIX で始まり、パスワードはすべて PASSWORD
+"""
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from . import clusters, response_cache, timeline, trending
+from .geo import geohash_encode
+from .models import Comment, CommentLike, Post, PostLike
+from .search import build_search_document
+
+USERNAME_PREFIX = 'synthetic-'
+PASSWORD = 'synthetic-password'
+
+# (都道府県, 市区町村, 緯度, 経度, 重み（おおよその人口比）)
+CITIES = [
+    ('東京都', '世田谷区', 35.6464, 139.6532, 9),
+    ('東京都', '練馬区', 35.7356, 139.6517, 7),
+    ('東京都', '大田区', 35.5614, 139.7161, 7),
+    ('東京都', '渋谷区', 35.6640, 139.6982, 2),
+    ('東京都', '新宿区', 35.6938, 139.7034, 3),
+    ('神奈川県', '横浜市', 35.4437, 139.6380, 37),
+    ('大阪府', '大阪市', 34.6937, 135.5023, 27),
+    ('愛知県', '名古屋市', 35.1815, 136.9066, 23),
+    ('北海道', '札幌市', 43.0618, 141.3545, 19),
+    ('福岡県', '福岡市', 33.5902, 130.4017, 16),
+    ('京都府', '京都市', 35.0116, 135.7681, 14),
+    ('宮城県', '仙台市', 38.2682, 140.8694, 11),
+]
+
+WORDS = [
+    'カフェ', 'ランチ', '公園', '桜', '祭り', '新しい', 'パン屋', '駅前', '散歩', 'ラーメン',
+    '図書館', '子育て', 'イベント', '工事', '商店街', '夕焼け', '猫', 'マルシェ', '花火', '紅葉',
+]
+
+# いいね・コメントのチャンク（投稿のチャンクより大きくなるので別に区切る）
+ROW_CHUNK = 5000
+
+
+def _text(rng, words):
+    return ''.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _skewed(rng, mean, limit, alpha=1.5):
+    """平均がおおよそ mean になるパレート分布の整数（上限 limit）"""
+    if mean <= 0:
+        return 0
+    # パレート分布（alpha, 最小値 1）の平均は alpha / (alpha - 1)
+    scale = mean * (alpha - 1) / alpha
+    return min(limit, int(rng.paretovariate(alpha) * scale))
+
+
+@contextmanager
+def _keep_created_at(*models):
+    # auto_now_add があると bulk_create でも現在時刻で上書きされるので、生成中だけ外す
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _bulk_create(model, objs, chunk_size, **kwargs):
+    created = []
+    for start in range(0, len(objs), chunk_size):
+        created += model.objects.bulk_create(objs[start:start + chunk_size], **kwargs)
+    return created
+
+
+def create_users(count, rng, chunk_size=ROW_CHUNK, log=None):
+    """合成ユーザーを count 人追加する（戻り値は synthetic_users() と同じ）"""
+    User = get_user_model()
+    # パスワードのハッシュ計算は遅いので1回だけ行う
+    password = make_password(PASSWORD)
+    start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    weights = [city[4] for city in CITIES]
+    now = timezone.now()
+    for offset in range(0, count, chunk_size):
+        batch = []
+        for i in range(start + offset, start + min(offset + chunk_size, count)):
+            prefecture, city, *_ = rng.choices(CITIES, weights)[0]
+            batch.append(User(
+                username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com', password=password,
+                residence_prefecture=prefecture, residence_city=city, date_joined=now,
+            ))
+        User.objects.bulk_create(batch)
+    if log:
+        log(f"users: +{count}")
+    return synthetic_users()
+
+
+def synthetic_users():
+    """既存の合成ユーザー [(id, ユーザー名, CITIES の index)]"""
+    city_index = {city[1]: i for i, city in enumerate(CITIES)}
+    return [
+        (user_id, username, city_index.get(city, 0))
+        for user_id, username, city in get_user_model().objects.filter(username__startswith=USERNAME_PREFIX)
+        .order_by('id').values_list('id', 'username', 'residence_city')
+    ]
+
+
+def create_posts(count, users, rng, likes_per_post, comments_per_post, chunk_size=2000, days=365, log=None):
+    """
+    投稿を count 件追加する（いいね・コメント・コメントへのいいねも合わせて作る）
+    users: create_users() / synthetic_users() の戻り値
+    """
+    if not users:
+        raise ValueError('合成ユーザーがいません')
+    User = get_user_model()
+    user_ids = [user_id for user_id, _, _ in users]
+    # よく投稿するユーザーに偏らせる
+    activity = [rng.paretovariate(1.2) for _ in users]
+    now = timezone.now()
+    totals = {'posts': 0, 'likes': 0, 'comments': 0, 'comment_likes': 0}
+
+    with _keep_created_at(Post, Comment):
+        for offset in range(0, count, chunk_size):
+            size = min(chunk_size, count - offset)
+            posts = []
+            for user_id, username, city_index in rng.choices(users, activity, k=size):
+                _, city, lat, lng, _ = CITIES[city_index]
+                post = Post(
+                    user=User(id=user_id, username=username),
+                    title=_text(rng, 2), body=_text(rng, 8), city=city,
+                    latitude=rng.gauss(lat, 0.02), longitude=rng.gauss(lng, 0.02),
+                    created_at=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+                    like_count=_skewed(rng, likes_per_post, len(user_ids)),
+                    comment_count=_skewed(rng, comments_per_post, 500),
+                )
+                # bulk_create は save() を通らないので、save() で作る値はここで計算する
+                post.geohash = geohash_encode(post.latitude, post.longitude)
+                post.search_document = build_search_document(post)
+                posts.append(post)
+            posts = Post.objects.bulk_create(posts)
+
+            likes, comments = [], []
+            for post in posts:
+                likes += [PostLike(post_id=post.pk, user_id=u) for u in rng.sample(user_ids, post.like_count)]
+                for _ in range(post.comment_count):
+                    comments.append(Comment(
+                        post_id=post.pk, user_id=rng.choice(user_ids), text=_text(rng, 4),
+                        created_at=min(now, post.created_at + timedelta(seconds=rng.uniform(0, 7 * 86400))),
+                        like_count=_skewed(rng, 1, min(len(user_ids), 50)),
+                    ))
+            _bulk_create(PostLike, likes, ROW_CHUNK)
+            comments = _bulk_create(Comment, comments, ROW_CHUNK)
+            comment_likes = [
+                CommentLike(comment_id=comment.pk, user_id=u)
+                for comment in comments for u in rng.sample(user_ids, comment.like_count)
+            ]
+            _bulk_create(CommentLike, comment_likes, ROW_CHUNK)
+
+            totals['posts'] += len(posts)
+            totals['likes'] += len(likes)
+            totals['comments'] += len(comments)
+            totals['comment_likes'] += len(comment_likes)
+            if log:
+                log(f"posts: {totals['posts']}/{count}")
+
+    # bulk_create はシグナル・クラスタの増減を通らないので、まとめて反映する
+    clusters.rebuild()
+    timeline.rebuild()
+    trending.rebuild()
+    response_cache.bump('posts')
+    return totals
+
+
+def generate(users, posts, likes_per_post=5, comments_per_post=2, seed=0, chunk_size=2000, log=None):
+    """合成ユーザー users 人と投稿 posts 件を追加する"""
+    rng = random.Random(seed)
+    all_users = create_users(users, rng, log=log) if users else synthetic_users()
+    totals = create_posts(posts, all_users, rng, likes_per_post, comments_per_post, chunk_size=chunk_size, log=log)
+    return {'users': users, **totals}
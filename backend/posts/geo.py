@@ -0,0 +1,116 @@
+# posts/geo.py
+
+"""
+位置情報まわりの計算（geohash・距離）
+近傍検索は「geohash のセルで候補を絞る -> haversine で正確な距離を計算」の2段階で行う
+"""
+
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# 保存時の geohash の桁数（9桁 ≒ 約5m四方）
+GEOHASH_PRECISION = 9
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def is_valid_coordinate(latitude, longitude):
+    """緯度 -90〜90・経度 -180〜180 の範囲内か（None・nan・inf は False。nan は比較がすべて偽になる）"""
+    return (
+        latitude is not None and longitude is not None
+        and -90 <= latitude <= 90 and -180 <= longitude <= 180
+    )
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # 偶数ビットは経度
+    while len(chars) < precision:
+        target, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            target[0] = mid
+        else:
+            bits <<= 1
+            target[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """geohash セルの (緯度方向, 経度方向) の大きさ（度）"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+# 1回の近傍検索で範囲検索するセル数の上限
+MAX_COVERING_CELLS = 24
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """半径 radius_km の円の外接矩形 (min_lat, min_lng, max_lat, max_lng)。経度は ±180 を超えることがある"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    return (
+        max(latitude - dlat, -90.0), longitude - dlng,
+        min(latitude + dlat, 90.0), longitude + dlng,
+    )
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=MAX_COVERING_CELLS):
+    """
+    半径 radius_km の円の外接矩形を覆う geohash セル
+    セル数が max_cells 以下になる範囲で、できるだけ細かい桁数を選ぶ
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = cell_size_degrees(precision)
+        rows = range(math.floor(min_lat / cell_lat), math.floor(max_lat / cell_lat) + 1)
+        cols = range(math.floor(min_lng / cell_lng), math.floor(max_lng / cell_lng) + 1)
+        if len(rows) * len(cols) <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    for row in rows:
+        lat = min(max((row + 0.5) * cell_lat, -90.0), 90.0)
+        for col in cols:
+            lng = ((col + 0.5) * cell_lng + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def prefix_upper_bound(prefix):
+    """
+    prefix で始まる geohash がすべて [prefix, 上限) に入る上限値（無ければ None）
+    基数32の文字は数字 -> 英小文字の順なので、どの照合順序でも範囲検索にできる
+    """
+    chars = list(prefix)
+    while chars:
+        index = _BASE32.index(chars[-1])
+        if index + 1 < len(_BASE32):
+            chars[-1] = _BASE32[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,296 @@
+# posts/geocoding.py
+
+"""
+逆ジオコーディング（緯度経度 -> 市区町村）とそのキャッシュ
+- 緯度経度を GEOCODE_CACHE['PRECISION'] 桁で量子化したセル単位でキャッシュする
+- プロセス内 LRU（TTL付き）-> DB（ReverseGeocodeCache）-> 外部API の順に引く
+"""
+
+import asyncio
+import math
+from contextlib import contextmanager
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from backend import metrics
+
+from .models import ReverseGeocodeCache
+
+
+class GeocodingError(Exception):
+    """外部APIへのリクエスト自体が失敗した"""
+
+
+class GeocodingNotFound(Exception):
+    """APIが結果を返さなかった（status が OK 以外）"""
+
+
+def _locality(geocode_result):
+    if geocode_result.get('status') != 'OK':
+        raise GeocodingNotFound(geocode_result.get('status', 'UNKNOWN'))
+
+    # レスポンスから市区町村（locality）を抽出
+    results = geocode_result.get('results', [])
+    if results:
+        for component in results[0].get('address_components', []):
+            if 'locality' in component.get('types', []):
+                return component['long_name']
+    return None
+
+
+@contextmanager
+def _measure(client):
+    # API 呼び出しの時間と、失敗の理由（リクエスト失敗 / status）ごとの件数をメトリクスに記録する
+    started = time.perf_counter()
+    try:
+        yield
+    except GeocodingNotFound as e:
+        metrics.inc('geocoding_errors_total', client=client, reason=str(e))
+        raise
+    except GeocodingError:
+        metrics.inc('geocoding_errors_total', client=client, reason='request')
+        raise
+    finally:
+        metrics.observe('geocoding_request_duration_seconds', time.perf_counter() - started, client=client)
+
+
+class GoogleGeocoder:
+    """Google Geocoding API で緯度経度から市区町村（locality）を取得する"""
+
+    def __init__(self, api_key, timeout=10):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def params(self, latitude, longitude):
+        return {'latlng': f'{latitude},{longitude}', 'key': self.api_key, 'language': 'ja'}
+
+    def reverse(self, latitude, longitude):
+        with _measure('sync'):
+            try:
+                response = self.session.get(
+                    settings.GOOGLE_GEOCODING_URL, params=self.params(latitude, longitude), timeout=self.timeout,
+                )
+                geocode_result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                raise GeocodingError(str(e)) from e
+            return _locality(geocode_result)
+
+
+class AsyncGoogleGeocoder(GoogleGeocoder):
+    """
+    非同期版（ASGI の非同期ビュー用）
+    httpx.AsyncClient はイベントループに紐づくので、ループごとに1つ作って使い回す
+    （ループへの弱参照で持つので、ループが破棄されればクライアントも一緒に解放される）
+    httpx は WSGI では使わないので、読み込みは初回の利用時まで遅らせる（起動時間の短縮）
+    """
+
+    def __init__(self, api_key, timeout=10):
+        super().__init__(api_key, timeout)
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # 終了したがまだ参照の残っているループのクライアントも捨てる
+            for closed in [l for l in self._clients if l.is_closed()]:
+                del self._clients[closed]
+            client = self._clients[loop] = httpx.AsyncClient(timeout=self.timeout)
+        return client
+
+    async def areverse(self, latitude, longitude):
+        import httpx
+
+        with _measure('async'):
+            try:
+                response = await self._client().get(settings.GOOGLE_GEOCODING_URL, params=self.params(latitude, longitude))
+                geocode_result = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise GeocodingError(str(e)) from e
+            return _locality(geocode_result)
+
+
+def cache_cell(latitude, longitude, precision=None):
+    """緯度経度を量子化したセル（整数の組）に変換する"""
+    if precision is None:
+        precision = settings.GEOCODE_CACHE['PRECISION']
+    scale = 10 ** precision
+    return math.floor(latitude * scale), math.floor(longitude * scale)
+
+
+class GeocodeCellCache:
+    """
+    セル単位の逆ジオコーディングキャッシュ
+    ヒット率確認用に memory_hits / db_hits / misses を数える
+    """
+
+    def __init__(self, max_size, ttl, db_ttl, precision):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_ttl = db_ttl
+        self.precision = precision
+        self._entries = OrderedDict()  # cell -> (city, expires_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def resolve(self, latitude, longitude, geocoder):
+        cell = cache_cell(latitude, longitude, self.precision)
+
+        city = self._get_memory(cell)
+        if city is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return city
+
+        city = self._get_db(cell)
+        if city is not None:
+            with self._lock:
+                self.db_hits += 1
+            self._set_memory(cell, city)
+            return city
+
+        with self._lock:
+            self.misses += 1
+        city = geocoder.reverse(latitude, longitude)
+        # 市区町村が取れなかった結果はキャッシュしない
+        if city:
+            self._set_db(cell, city)
+            self._set_memory(cell, city)
+        return city
+
+    async def aresolve(self, latitude, longitude, geocoder):
+        """resolve() の非同期版（プロセス内キャッシュは共有、DB は非同期 ORM、外部APIは await）"""
+        cell = cache_cell(latitude, longitude, self.precision)
+
+        city = self._get_memory(cell)
+        if city is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return city
+
+        city = await self._aget_db(cell)
+        if city is not None:
+            with self._lock:
+                self.db_hits += 1
+            self._set_memory(cell, city)
+            return city
+
+        with self._lock:
+            self.misses += 1
+        city = await geocoder.areverse(latitude, longitude)
+        if city:
+            await ReverseGeocodeCache.objects.aupdate_or_create(
+                lat_cell=cell[0], lng_cell=cell[1], defaults={'city': city},
+            )
+            self._set_memory(cell, city)
+        return city
+
+    def _get_memory(self, cell):
+        with self._lock:
+            entry = self._entries.get(cell)
+            if entry is None:
+                return None
+            city, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[cell]
+                return None
+            self._entries.move_to_end(cell)
+            return city
+
+    def _set_memory(self, cell, city):
+        with self._lock:
+            self._entries[cell] = (city, time.monotonic() + self.ttl)
+            self._entries.move_to_end(cell)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_db(self, cell):
+        fresh_since = timezone.now() - timedelta(seconds=self.db_ttl)
+        return (
+            ReverseGeocodeCache.objects.filter(lat_cell=cell[0], lng_cell=cell[1], updated_at__gte=fresh_since)
+            .values_list('city', flat=True)
+            .first()
+        )
+
+    async def _aget_db(self, cell):
+        fresh_since = timezone.now() - timedelta(seconds=self.db_ttl)
+        return await (
+            ReverseGeocodeCache.objects.filter(lat_cell=cell[0], lng_cell=cell[1], updated_at__gte=fresh_since)
+            .values_list('city', flat=True)
+            .afirst()
+        )
+
+    def _set_db(self, cell, city):
+        ReverseGeocodeCache.objects.update_or_create(lat_cell=cell[0], lng_cell=cell[1], defaults={'city': city})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                conf = settings.GEOCODE_CACHE
+                _cache = GeocodeCellCache(
+                    max_size=conf['MEMORY_SIZE'],
+                    ttl=conf['MEMORY_TTL'],
+                    db_ttl=conf['DB_TTL'],
+                    precision=conf['PRECISION'],
+                )
+    return _cache
+
+
+@lru_cache(maxsize=8)
+def _load_geocoder(path, api_key):
+    # HTTP セッション（コネクション）を使い回すため、インスタンスはプロセス内で共有する
+    return import_string(path)(api_key=api_key)
+
+
+def get_geocoder(api_key):
+    return _load_geocoder(settings.REVERSE_GEOCODER, api_key)
+
+
+def get_async_geocoder(api_key):
+    return _load_geocoder(settings.ASYNC_REVERSE_GEOCODER, api_key)
+
+
+def reverse_geocode_city(latitude, longitude, api_key):
+    """キャッシュ経由で緯度経度から市区町村名を取得する（見つからなければ None）"""
+    return get_cache().resolve(latitude, longitude, get_geocoder(api_key))
+
+
+async def areverse_geocode_city(latitude, longitude, api_key):
+    """reverse_geocode_city() の非同期版"""
+    return await get_cache().aresolve(latitude, longitude, get_async_geocoder(api_key))
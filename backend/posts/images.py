@@ -0,0 +1,162 @@
+# posts/images.py
+
+"""
+投稿画像の縮小版（thumb / card / full × WebP / JPEG）の生成
+- アップロード直後はオリジナルだけを保存してレスポンスを返し、縮小版はコミット後にバックグラウンドのスレッドで作る
+- オリジナルも縮小版も、向きを補正したうえで EXIF（位置情報など）を含めずに保存する
+- 画像を差し替えたときは、新しい縮小版を作ったあと同じジョブで古い縮小版のファイルを消す
+- 生成済みのファイル名は Post.image_variants に記録し、URL はシリアライザで組み立てる
+プロセスが落ちて生成されなかった分は generate_image_variants コマンドで作り直せる
+"""
+
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# 形式ごとの (Pillow の形式名, 拡張子)
+FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_VARIANTS['WORKERS'], thread_name_prefix='image-variants',
+                )
+    return _executor
+
+
+def variant_name(image_name, size, ext):
+    """post_images/foo.png -> post_images/variants/foo_card.webp"""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}_{size}.{ext}')
+
+
+def strip_metadata(upload):
+    """アップロードされた画像を EXIF（位置情報など）を含めずに保存し直す（向きは画素に反映する）"""
+    upload.seek(0)
+    with Image.open(upload) as original:
+        image_format = original.format
+        buffer = BytesIO()
+        if getattr(original, 'is_animated', False):
+            # アニメーションはフレームをそのまま書き直す（EXIF は引き継がれない）
+            original.save(buffer, image_format, save_all=True)
+        else:
+            image = ImageOps.exif_transpose(original)
+            options = {'quality': settings.IMAGE_VARIANTS['QUALITY']} if image_format in ('JPEG', 'WEBP') else {}
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+            image.save(buffer, image_format, icc_profile=original.info.get('icc_profile'), **options)
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def render_variants(source):
+    """画像ファイルから縮小版を作る: {(size, fmt): bytes}"""
+    config = settings.IMAGE_VARIANTS
+    with Image.open(source) as original:
+        # EXIF の向きを画素に反映してから捨てる
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            # 透過は白背景に合成（JPEG は透過を持てない）
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        image = image.convert('RGB')
+
+        rendered = {}
+        for size, max_side in config['SIZES'].items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            for fmt, (pil_format, _) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, quality=config['QUALITY'], optimize=True)
+                rendered[(size, fmt)] = buffer.getvalue()
+    return rendered
+
+
+def generate_variants(post):
+    """post.image の縮小版を保存して image_variants を更新する（画像が無ければ空にする）"""
+    if not post.image:
+        variants = {}
+    else:
+        with post.image.open('rb') as source:
+            rendered = render_variants(source)
+        variants = {}
+        for (size, fmt), content in rendered.items():
+            name = variant_name(post.image.name, size, FORMATS[fmt][1])
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants.setdefault(size, {})[fmt] = default_storage.save(name, ContentFile(content))
+
+    # 生成中に画像が差し替えられていたら上書きしない
+    current = Post.objects.filter(pk=post.pk)
+    if post.image:
+        current = current.filter(image=post.image.name)
+    if current.update(image_variants=variants, updated_at=Now()):
+        # .update() はシグナルを送らないので一覧のキャッシュはここで無効化する
+        response_cache.bump('posts')
+    post.image_variants = variants
+    return variants
+
+
+def delete_variant_files(variants, keep=None):
+    """image_variants に記録された縮小版のファイルを消す（keep に含まれるものは残す）"""
+    kept = {name for files in (keep or {}).values() for name in files.values()}
+    for files in (variants or {}).values():
+        for name in files.values():
+            if name not in kept and default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def _generate(post_id, stale_variants=None):
+    variants = None
+    try:
+        post = Post.objects.filter(pk=post_id).only('id', 'image').first()
+        if post is not None:
+            variants = generate_variants(post)
+    except Exception:
+        logger.exception("画像の縮小版を生成できませんでした: Post#%s", post_id)
+    try:
+        # 差し替え前の縮小版（新しい縮小版と同名のものは残す）
+        delete_variant_files(stale_variants, keep=variants)
+    except Exception:
+        logger.exception("古い縮小版を削除できませんでした: Post#%s", post_id)
+
+
+def _generate_in_thread(post_id, stale_variants=None):
+    try:
+        _generate(post_id, stale_variants)
+    finally:
+        # ワーカースレッドごとの接続を残さない
+        connection.close()
+
+
+def schedule_variants(post, stale_variants=None):
+    """トランザクションのコミット後に縮小版の生成（と差し替え前の縮小版の削除）を予約する"""
+    if not post.image and not stale_variants:
+        return
+    post_id = post.pk
+    if settings.IMAGE_VARIANTS['ASYNC']:
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_thread, post_id, stale_variants))
+    else:
+        transaction.on_commit(lambda: _generate(post_id, stale_variants))
@@ -0,0 +1,138 @@
+# posts/like_buffer.py
+
+"""
+いいねの書き込みバッファ（LIKE_BUFFER['ENABLED'] のときだけ使う）
+- トグルは LikeIntent に「いいね / 取り消し」の意図を1行追加するだけ（対象の行はロックしない）
+- flush_like_buffer コマンドがまとめて PostLike / CommentLike に反映し、like_count を数え直す
+- 反映前でも自分の一覧・詳細には未反映の意図が反映される（models._with_like_info）
+反映は冪等（作成は ignore_conflicts、件数は実テーブルから数え直す）なので、同じ意図を二重に処理しても壊れない
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from . import response_cache, trending
+from .models import Comment, CommentLike, LikeIntent, Post, PostLike
+
+# kind -> (対象モデル, いいねモデル, 外部キー名)
+TARGETS = {
+    'post': (Post, PostLike, 'post'),
+    'comment': (Comment, CommentLike, 'comment'),
+}
+# 取り消しを1回の DELETE でまとめる対象の数
+UNLIKE_CHUNK = 100
+
+
+def is_enabled():
+    return settings.LIKE_BUFFER['ENABLED']
+
+
+def current_state(kind, object_id, user):
+    """未反映の意図を含めた「いいね済みか」"""
+    pending = (
+        LikeIntent.objects.filter(kind=kind, object_id=object_id, user=user)
+        .order_by('-id')
+        .values_list('liked', flat=True)
+        .first()
+    )
+    if pending is not None:
+        return pending
+    _, like_model, fk_name = TARGETS[kind]
+    return like_model.objects.filter(**{f'{fk_name}_id': object_id}, user=user).exists()
+
+
+def record(kind, object_id, user, liked):
+    LikeIntent.objects.create(kind=kind, object_id=object_id, user=user, liked=liked)
+
+
+def pending_version(user):
+    """
+    条件付き GET の ETag 用: 自分の未反映の意図の最新 ID
+    バッファが無効・未ログインなら None（クエリしない）
+    """
+    if not is_enabled() or not user.is_authenticated:
+        return None
+    return LikeIntent.objects.filter(user=user).aggregate(last=Max('id'))['last']
+
+
+def flush(batch_size=None):
+    """
+    古い順に最大 batch_size 件の意図を反映する
+    戻り値: 処理した意図の件数
+    """
+    batch_size = batch_size or settings.LIKE_BUFFER['BATCH_SIZE']
+    intents = list(
+        LikeIntent.objects.order_by('id').values_list('id', 'kind', 'object_id', 'user_id', 'liked')[:batch_size]
+    )
+    if not intents:
+        return 0
+
+    # 同じユーザー・対象への意図は最後のものだけ有効
+    final = {}
+    for _, kind, object_id, user_id, liked in intents:
+        final[(kind, object_id, user_id)] = liked
+
+    with transaction.atomic():
+        for kind, (model, like_model, fk_name) in TARGETS.items():
+            entries = [(object_id, user_id, liked) for (k, object_id, user_id), liked in final.items() if k == kind]
+            if entries:
+                _apply(model, like_model, fk_name, entries, batch_size)
+        LikeIntent.objects.filter(id__in=[intent[0] for intent in intents]).delete()
+    return len(intents)
+
+
+def _apply(model, like_model, fk_name, entries, batch_size):
+    # 削除済みの投稿・コメントへの意図は捨てる
+    existing = dict(
+        model.objects.filter(pk__in={object_id for object_id, _, _ in entries}).values_list('pk', 'like_count')
+    )
+    entries = [entry for entry in entries if entry[0] in existing]
+    if not entries:
+        return
+
+    like_model.objects.bulk_create(
+        [like_model(**{f'{fk_name}_id': object_id}, user_id=user_id) for object_id, user_id, liked in entries if liked],
+        ignore_conflicts=True,
+        batch_size=batch_size,
+    )
+    # 取り消しは対象ごとに user_id__in でまとめ、UNLIKE_CHUNK 件の対象ずつ削除する
+    # （OR を1本につなげると SQLite の式の深さの上限を超える。シグナルは送らず、キャッシュは最後にまとめて無効化する）
+    unlikes = {}
+    for object_id, user_id, liked in entries:
+        if not liked:
+            unlikes.setdefault(object_id, []).append(user_id)
+    groups = list(unlikes.items())
+    for start in range(0, len(groups), UNLIKE_CHUNK):
+        condition = Q()
+        for object_id, user_ids in groups[start:start + UNLIKE_CHUNK]:
+            condition |= Q(**{f'{fk_name}_id': object_id}, user_id__in=user_ids)
+        queryset = like_model.objects.filter(condition)
+        queryset._raw_delete(queryset.db)
+
+    # 件数は差分ではなく実テーブルから数え直す（二重処理・取りこぼしでもずれない）
+    affected = {object_id for object_id, _, _ in entries}
+    counts = dict(
+        like_model.objects.filter(**{f'{fk_name}_id__in': affected})
+        .values_list(f'{fk_name}_id')
+        .annotate(c=Count('pk'))
+        .order_by()
+    )
+    now = timezone.now()
+    objs = [model(pk=object_id, like_count=counts.get(object_id, 0), updated_at=now) for object_id in affected]
+    fields = ['like_count', 'updated_at']
+    if model is Post:
+        # 話題の投稿のスコアは、反映前からの件数の増減分だけ加減算する
+        for obj in objs:
+            for name, value in trending.change('like', obj.like_count - existing[obj.pk]).items():
+                setattr(obj, name, value)
+        fields += ['hot_score', 'hot_score_at']
+    model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+    # bulk_create / bulk_update はシグナルを送らないので一覧のキャッシュはここで無効化する
+    if model is Post:
+        response_cache.bump('posts')
+    else:
+        post_ids = set(Comment.objects.filter(pk__in=affected).values_list('post_id', flat=True))
+        response_cache.bump(*(response_cache.comments_scope(post_id) for post_id in post_ids))
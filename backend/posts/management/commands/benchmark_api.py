@@ -0,0 +1,166 @@
+# posts/management/commands/benchmark_api.py
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.metrics import QueryStats
+from posts import dataset
+from posts.models import Post
+from users.authentication import ClaimsRefreshToken
+
+DEFAULT_OUTPUT = os.path.join(settings.BASE_DIR, 'benchmarks', 'api-results.jsonl')
+
+
+class Command(BaseCommand):
+    help = (
+        "合成データの件数を段階的に増やしながら主要な API（一覧・検索・市区町村の新着・話題・詳細・コメント一覧・いいね・ログイン）の"
+        "応答時間とクエリ数を計測し、結果を JSON Lines で記録する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='計測する投稿数（カンマ区切り、昇順に増やす）')
+        parser.add_argument('--users', type=int, default=1000, help='合成ユーザー数（足りない分だけ追加する）')
+        parser.add_argument('--repeat', type=int, default=20, help='エンドポイントごとの計測回数')
+        parser.add_argument('--output', default=DEFAULT_OUTPUT, help='結果を追記するファイル（空文字で記録しない）')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--force', action='store_true', help='DEBUG=False の環境でも実行する')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG=False の環境では実行しません（本番 DB に合成データを入れないため。--force で実行できます）")
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError("--sizes は投稿数をカンマ区切りで指定してください")
+
+        rng = random.Random(options['seed'])
+        users = dataset.synthetic_users()
+        if len(users) < options['users']:
+            users = dataset.create_users(options['users'] - len(users), rng, log=self.stdout.write)
+        previous = self.load_previous(options['output'])
+
+        for size in sizes:
+            existing = Post.objects.filter(user__username__startswith=dataset.USERNAME_PREFIX).count()
+            if existing < size:
+                dataset.create_posts(size - existing, users, rng, likes_per_post=5, comments_per_post=2)
+            record = {
+                'timestamp': timezone.now().isoformat(),
+                'git': self.git_revision(),
+                'database': connection.vendor,
+                'posts': max(size, existing),
+                'users': len(users),
+                'repeat': options['repeat'],
+                'results': self.measure(users, options['repeat']),
+            }
+            self.report(record, previous.get((record['database'], record['posts'])))
+            if options['output']:
+                os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+                with open(options['output'], 'a') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if options['output']:
+            self.stdout.write(f"結果を {options['output']} に追記しました")
+
+    def measure(self, users, repeat):
+        """{エンドポイント名: {p50_ms, p95_ms, mean_ms, queries}}"""
+        _, username, _ = users[0]
+        user = get_user_model().objects.get(username=username)
+        anonymous = APIClient(SERVER_NAME='localhost')
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+
+        synthetic = Post.objects.filter(user__username__startswith=dataset.USERNAME_PREFIX)
+        popular = synthetic.order_by('-like_count', '-id').values_list('id', flat=True).first()
+        discussed = synthetic.order_by('-comment_count', '-id').values_list('id', flat=True).first()
+        if popular is None:
+            raise CommandError("合成データの投稿がありません")
+        like_url = reverse('post-like-toggle', args=[popular])
+
+        # (名前, クライアント, メソッド, URL, データ, 想定するステータス)
+        # 未ログインの一覧はレスポンスキャッシュに当たる（2回目以降）ので、ログイン時の一覧と分けて計測する
+        endpoints = [
+            ('list_anonymous', anonymous, 'get', reverse('post-list'), None, 200),
+            ('list', client, 'get', reverse('post-list'), None, 200),
+            ('search', client, 'get', reverse('post-list'), {'q': dataset.WORDS[0]}, 200),
+            ('city_timeline', client, 'get', reverse('post-city-timeline'), None, 200),
+            ('trending', client, 'get', reverse('post-trending'), None, 200),
+            ('detail', client, 'get', reverse('post-detail', args=[popular]), None, 200),
+            ('comment_list', client, 'get', reverse('comment-list', args=[discussed]), None, 200),
+            # 2回ずつ押して元の状態に戻す
+            ('like_toggle', client, 'post', like_url, {}, 200),
+            ('login', anonymous, 'post', reverse('login'), {'username': username, 'password': dataset.PASSWORD}, 200),
+        ]
+        results = {}
+        for name, api_client, method, url, data, expected in endpoints:
+            iterations = repeat * 2 if name == 'like_toggle' else repeat
+            timings = []
+            # 1回目は接続・キャッシュの準備が入るので計測しない
+            for i in range(iterations + 1):
+                # CaptureQueriesContext はリクエスト開始時の reset_queries で数がずれるので使わない
+                queries = QueryStats()
+                with connection.execute_wrapper(queries):
+                    started = time.perf_counter()
+                    response = getattr(api_client, method)(url, data)
+                    elapsed = time.perf_counter() - started
+                if response.status_code != expected:
+                    raise CommandError(f"{name}: {method.upper()} {url} -> {response.status_code}")
+                if i:
+                    timings.append(elapsed * 1000)
+            if name == 'like_toggle':
+                # 準備の1回分だけ状態が変わっているので戻す
+                api_client.post(url, {})
+            timings.sort()
+            results[name] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+                'mean_ms': round(statistics.fmean(timings), 2),
+                'queries': queries.count,
+            }
+        return results
+
+    def report(self, record, previous):
+        self.stdout.write(f"\nposts: {record['posts']}  users: {record['users']}  ({record['database']})")
+        self.stdout.write(f"{'endpoint':>16} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'queries':>8}  vs previous p50")
+        for name, result in record['results'].items():
+            delta = ''
+            if previous and name in previous['results'] and previous['results'][name]['p50_ms']:
+                before = previous['results'][name]['p50_ms']
+                delta = f"{(result['p50_ms'] - before) / before * 100:+.0f}% ({previous['git'] or '?'})"
+            self.stdout.write(
+                f"{name:>16} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['mean_ms']:9.2f} "
+                f"{result['queries']:8d}  {delta}"
+            )
+
+    def load_previous(self, path):
+        """(DB の種類, 投稿数) ごとの直前の記録"""
+        previous = {}
+        if not path or not os.path.exists(path):
+            return previous
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                previous[(record.get('database'), record.get('posts'))] = record
+        return previous
+
+    def git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
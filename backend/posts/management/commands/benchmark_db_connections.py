@@ -0,0 +1,130 @@
+# posts/management/commands/benchmark_db_connections.py
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users.authentication import ClaimsRefreshToken
+from .loadtest_asgi import free_port, percentile
+
+# モードごとの環境変数（DATABASE_CONNECTIONS の設定）
+MODES = {
+    'per-request': {'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': 'false'},
+    'persistent': {'DATABASE_CONN_MAX_AGE': '600', 'DATABASE_CONN_HEALTH_CHECKS': 'true', 'DATABASE_POOL': 'false'},
+    'pool': {'DATABASE_POOL': 'true', 'DATABASE_CONN_HEALTH_CHECKS': 'true'},
+}
+# 接続を開いた回数として読むメトリクス（プールではプールが開いた物理接続の数）
+CONNECTION_METRICS = {
+    'per-request': 'db_connections_total', 'persistent': 'db_connections_total',
+    'pool': 'db_pool_connections_opened_total',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "DB 接続の持ち方（リクエストごとに接続 / 持続接続 / コネクションプール）ごとに gunicorn を起動し、"
+        "ログイン済みの一覧のレイテンシと、DB への接続を開いた回数を比較する（PostgreSQL が必要）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--requests', type=int, default=500, help='モードごとのリクエスト数')
+        parser.add_argument('--warmup', type=int, default=20, help='計測前に送るリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn のワーカー数')
+        parser.add_argument('--threads', type=int, default=4, help='ワーカーごとのスレッド数（プールの上限にもなる）')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError("PostgreSQL（DATABASE_URL）で実行してください（SQLite は接続のコストが比較になりません）")
+        user, _ = get_user_model().objects.update_or_create(
+            username='dbbench',
+            defaults={'email': 'dbbench@example.com', 'residence_prefecture': '東京都', 'residence_city': '渋谷区'},
+        )
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+        self.stdout.write(f"requests: {options['requests']}  concurrency: {options['concurrency']}  "
+                          f"workers: {options['workers']} x {options['threads']} threads")
+        self.stdout.write(f"{'':>12} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'req/s':>7} {'connections':>12}")
+        for mode in options['modes']:
+            port = free_port()
+            with tempfile.TemporaryDirectory() as metrics_dir:
+                server = self.start_server(mode, port, metrics_dir, options)
+                try:
+                    seconds, latencies = asyncio.run(self.run(f'http://127.0.0.1:{port}', token, options))
+                    # 各ワーカーがメトリクスを書き出すのを待つ
+                    time.sleep(1)
+                    connections = self.scrape(f'http://127.0.0.1:{port}', CONNECTION_METRICS[mode])
+                finally:
+                    server.terminate()
+                    server.wait()
+            self.stdout.write(
+                f"{mode:>12} {statistics.median(latencies) * 1000:8.2f} {percentile(latencies, 0.95) * 1000:8.2f} "
+                f"{statistics.mean(latencies) * 1000:8.2f} {len(latencies) / seconds:7.1f} {connections:12.0f}"
+            )
+
+    def start_server(self, mode, port, metrics_dir, options):
+        env = {
+            **os.environ,
+            **MODES[mode],
+            'SERVER_MODE': 'wsgi',
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'WEB_CONCURRENCY': str(options['workers']),
+            'GUNICORN_THREADS': str(options['threads']),
+            'METRICS_ENABLED': 'true',
+            'METRICS_DIR': metrics_dir,
+            'METRICS_FLUSH_INTERVAL': '0.2',
+        }
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning',
+             '--access-logfile', '/dev/null'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f'http://127.0.0.1:{port}/api/health', timeout=1).status_code == 200:
+                    return server
+            except httpx.HTTPError:
+                pass
+            if server.poll() is not None:
+                break
+            time.sleep(0.1)
+        server.terminate()
+        raise CommandError(f"{mode}: gunicorn を起動できませんでした")
+
+    async def run(self, base_url, token, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        headers = {'Authorization': f'Bearer {token}'}
+        latencies = []
+
+        async def one(client, record):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get('/api/posts/list/', headers=headers)
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f"GET /api/posts/list/ -> {response.status_code} {response.text[:200]}")
+            if record:
+                latencies.append(elapsed)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await asyncio.gather(*(one(client, False) for _ in range(options['warmup'])))
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, True) for _ in range(options['requests'])))
+            return time.perf_counter() - started, latencies
+
+    def scrape(self, base_url, name):
+        token = settings.METRICS['TOKEN']
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        body = httpx.get(f'{base_url}/api/metrics', headers=headers, timeout=10).text
+        return sum(float(line.rsplit(' ', 1)[1]) for line in body.splitlines() if line.startswith(f'{name}{{'))
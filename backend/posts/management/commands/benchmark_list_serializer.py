@@ -0,0 +1,94 @@
+# posts/management/commands/benchmark_list_serializer.py
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from backend.renderers import FastJSONRenderer
+from posts.models import Post
+from posts.serializers.post import PostSerializer
+from posts.serializers.rows import PostRowSerializer
+
+STAGES = ('fetch', 'serialize', 'render')
+
+
+class Command(BaseCommand):
+    help = (
+        "投稿一覧の変換（取得 → シリアライズ → JSON）の速さを、PostSerializer + JSONRenderer と "
+        "PostRowSerializer + FastJSONRenderer（?fields= あり・なし）で比較する（行/秒）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='1回に変換する行数（一覧の1ページ分）')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--fields', default='id,title,image_variants,city,user.username,created_at,like_count,is_liked',
+                            help='?fields= の比較に使う項目（カードの表示に必要な分）')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(posts__isnull=False).first()
+        if user is None:
+            raise CommandError("投稿がありません（generate_dataset で作成できます）")
+        full = self.request(user, {})
+        sparse = self.request(user, {'fields': options['fields']})
+        limit = options['rows']
+
+        def current(request):
+            posts = list(Post.objects.with_like_info(user).order_by('-created_at', '-id')[:limit])
+            return posts, lambda: PostSerializer(posts, many=True, context={'request': request}).data, JSONRenderer()
+
+        def fast(request):
+            queryset = Post.objects.with_like_info(user).order_by('-created_at', '-id')
+            rows = list(PostRowSerializer.rows(queryset, request)[:limit])
+            return rows, lambda: PostRowSerializer(rows, many=True, context={'request': request}).data, FastJSONRenderer()
+
+        variants = {
+            'PostSerializer': lambda: current(full),
+            'PostRowSerializer': lambda: fast(full),
+            'PostRowSerializer ?fields=': lambda: fast(sparse),
+        }
+        self.check_compatible(variants)
+
+        self.stdout.write(f"rows: {limit}  repeat: {options['repeat']}  fields: {options['fields']}")
+        self.stdout.write(f"{'':>26} " + ' '.join(f'{stage + " rows/s":>17}' for stage in (*STAGES, 'total')))
+        baseline = None
+        for label, variant in variants.items():
+            seconds = dict.fromkeys(STAGES, 0.0)
+            count = 0
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                rows, serialize, renderer = variant()
+                fetched = time.perf_counter()
+                data = serialize()
+                serialized = time.perf_counter()
+                renderer.render(data)
+                rendered = time.perf_counter()
+                seconds['fetch'] += fetched - started
+                seconds['serialize'] += serialized - fetched
+                seconds['render'] += rendered - serialized
+                count += len(rows)
+            total = sum(seconds.values())
+            baseline = baseline or total
+            self.stdout.write(
+                f"{label:>26} " + ' '.join(f'{count / seconds[stage]:17,.0f}' for stage in STAGES)
+                + f" {count / total:17,.0f}  (x{baseline / total:.1f})"
+            )
+
+    def request(self, user, params):
+        request = Request(RequestFactory().get('/api/posts/list/', params, SERVER_NAME='localhost'))
+        request.user = user
+        return request
+
+    def check_compatible(self, variants):
+        # ?fields= が無ければ、同じバイト列になること
+        _, serialize, _ = variants['PostSerializer']()
+        expected = JSONRenderer().render(serialize())
+        _, serialize, renderer = variants['PostRowSerializer']()
+        data = serialize()
+        if JSONRenderer().render(data) != expected:
+            raise CommandError("PostRowSerializer の出力が PostSerializer と一致しません")
+        if renderer.render(data) != expected:
+            raise CommandError("FastJSONRenderer の出力が JSONRenderer と一致しません")
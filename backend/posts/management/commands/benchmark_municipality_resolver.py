@@ -0,0 +1,43 @@
+# posts/management/commands/benchmark_municipality_resolver.py
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.boundaries import MunicipalityIndex, get_municipality_index
+
+
+class Command(BaseCommand):
+    help = "市区町村境界データによる点の内外判定のスループットを計測する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=100000, help='判定するランダムな点の数')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--file', help='境界データ（省略時は MUNICIPALITY_BOUNDARIES_PATH）')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = MunicipalityIndex.from_file(options['file']) if options['file'] else get_municipality_index()
+        if index is None or not index.polygons:
+            raise CommandError("市区町村境界データがありません（posts/data/README.md 参照）")
+        load_seconds = time.perf_counter() - started
+
+        # 全ポリゴンの外接矩形内に一様に点を打つ
+        rng = random.Random(options['seed'])
+        min_lng, min_lat, max_lng, max_lat = index.bounds()
+        points = [
+            (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+            for _ in range(options['points'])
+        ]
+
+        started = time.perf_counter()
+        matched = sum(1 for lat, lng in points if index.resolve(lat, lng) is not None)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"polygons: {len(index.polygons)}  grid cells: {len(index.grid)}  load: {load_seconds:.2f}s")
+        self.stdout.write(f"points: {len(points)}  matched: {matched} ({matched / len(points):.1%})")
+        self.stdout.write(
+            f"throughput: {len(points) / elapsed:,.0f} points/s  "
+            f"mean: {elapsed / len(points) * 1e6:.1f} µs/point"
+        )
@@ -0,0 +1,77 @@
+# posts/management/commands/benchmark_nearby.py
+
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.geo import geohash_encode, haversine_km
+from posts.models import Post
+
+# 東京23区周辺
+AREA = (35.50, 139.55, 35.85, 139.95)  # min_lat, min_lng, max_lat, max_lng
+
+
+class Command(BaseCommand):
+    help = "近くの投稿検索（geohash セル + haversine）と全件走査の速度を比較する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', type=int, default=0, help='計測前にダミー投稿をこの件数だけ作成する')
+        parser.add_argument('--queries', type=int, default=200, help='検索回数')
+        parser.add_argument('--radius', type=float, default=1.0, help='検索半径（km）')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['create']:
+            self.create_posts(options['create'], rng)
+
+        total = Post.objects.exclude(geohash='').count()
+        if not total:
+            raise CommandError("位置情報つきの投稿がありません（--create で作成できます）")
+
+        radius = options['radius']
+        centers = [(rng.uniform(AREA[0], AREA[2]), rng.uniform(AREA[1], AREA[3])) for _ in range(options['queries'])]
+
+        indexed_seconds, indexed_hits = self.run(centers, lambda lat, lng: self.indexed(lat, lng, radius))
+        naive_seconds, naive_hits = self.run(centers, lambda lat, lng: self.naive(lat, lng, radius))
+        if indexed_hits != naive_hits:
+            raise CommandError(f"結果が一致しません: indexed={indexed_hits} naive={naive_hits}")
+
+        self.stdout.write(f"posts: {total}  queries: {len(centers)}  radius: {radius}km  hits: {indexed_hits}")
+        for label, seconds in (('geohash', indexed_seconds), ('full scan', naive_seconds)):
+            self.stdout.write(f"{label:>10}: {seconds / len(centers) * 1000:8.2f} ms/query")
+        self.stdout.write(f"speedup: {naive_seconds / indexed_seconds:.1f}x")
+
+    def run(self, centers, query):
+        started = time.perf_counter()
+        hits = sum(len(query(lat, lng)) for lat, lng in centers)
+        return time.perf_counter() - started, hits
+
+    def indexed(self, lat, lng, radius):
+        candidates = Post.objects.near(lat, lng, radius).values_list('id', 'latitude', 'longitude')
+        return [pid for pid, plat, plng in candidates if haversine_km(lat, lng, plat, plng) <= radius]
+
+    def naive(self, lat, lng, radius):
+        candidates = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            'id', 'latitude', 'longitude'
+        )
+        return [pid for pid, plat, plng in candidates if haversine_km(lat, lng, plat, plng) <= radius]
+
+    def create_posts(self, count, rng, batch_size=5000):
+        user, _ = get_user_model().objects.get_or_create(
+            username='benchmark',
+            defaults={'email': 'benchmark@example.com', 'residence_prefecture': '東京都', 'residence_city': '渋谷区'},
+        )
+        for start in range(0, count, batch_size):
+            batch = []
+            for _ in range(min(batch_size, count - start)):
+                lat, lng = rng.uniform(AREA[0], AREA[2]), rng.uniform(AREA[1], AREA[3])
+                # bulk_create は save() を通らないので geohash はここで計算する
+                batch.append(Post(
+                    user=user, title='benchmark', body='', city=user.residence_city,
+                    latitude=lat, longitude=lng, geohash=geohash_encode(lat, lng),
+                ))
+            Post.objects.bulk_create(batch)
+        self.stdout.write(f"{count} 件のダミー投稿を作成しました")
@@ -0,0 +1,142 @@
+# posts/management/commands/benchmark_replica_routing.py
+
+import random
+import sqlite3
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from backend.db_routing import lag_monitor
+from backend.metrics import QueryStats
+from posts import dataset
+from posts.models import Post
+from users.authentication import ClaimsRefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        "読み取りレプリカへの振り分け（backend/db_routing.py）の有無で、同じ負荷（読み取り中心、一部いいね）を流し、"
+        "プライマリに届くクエリ数を比較する。書き込んだユーザーが直後に自分の書き込みを読めるかも確認する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='1回の計測で送る操作の数')
+        parser.add_argument('--write-ratio', type=float, default=0.1, help='操作のうちいいね（書き込み）の割合')
+        parser.add_argument('--copy', action='store_true',
+                            help='計測前にプライマリの SQLite をレプリカにコピーする（ローカル確認用、以後は同期しない）')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--force', action='store_true', help='DEBUG=False の環境でも実行する')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG=False の環境では実行しません（いいねを書き込むため。--force で実行できます）")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                "レプリカが設定されていません。例: DATABASE_URL=sqlite:////tmp/primary.sqlite3 "
+                "DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3 python manage.py benchmark_replica_routing --copy"
+            )
+        if options['copy']:
+            self.copy_to_replicas()
+
+        users = dataset.synthetic_users()
+        post_ids = list(
+            Post.objects.filter(user__username__startswith=dataset.USERNAME_PREFIX)
+            .order_by('-created_at').values_list('id', flat=True)[:200]
+        )
+        if not users or not post_ids:
+            raise CommandError("合成データがありません（generate_dataset で作成できます）")
+
+        # 同じ操作の列を両方の計測に流す
+        rng = random.Random(options['seed'])
+        operations = [
+            ('write' if rng.random() < options['write_ratio'] else 'read', rng.choice(users)[1], rng.choice(post_ids),
+             rng.random())
+            for _ in range(options['requests'])
+        ]
+        results = {}
+        with override_settings(DATABASE_REPLICAS=[]):
+            results['primary only'] = self.run(operations)
+        lag_monitor.clear()
+        results['replica routing'] = self.run(operations)
+
+        self.stdout.write(f"{'':>16} {'primary':>9} {'replicas':>9} {'primary %':>10} {'seconds':>8} {'stale reads':>12}")
+        for label, result in results.items():
+            total = result['primary'] + result['replicas']
+            self.stdout.write(
+                f"{label:>16} {result['primary']:9d} {result['replicas']:9d} "
+                f"{result['primary'] / total * 100 if total else 0:9.1f}% {result['seconds']:8.2f} {result['stale']:12d}"
+            )
+        before, after = results['primary only']['primary'], results['replica routing']['primary']
+        if before:
+            self.stdout.write(f"primary queries: {before} -> {after} ({(after - before) / before * 100:+.0f}%)")
+        if results['replica routing']['stale']:
+            raise CommandError("書き込んだユーザーが自分の書き込みを読めませんでした（STICKY_SECONDS を確認してください）")
+
+    def copy_to_replicas(self):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in settings.DATABASE_REPLICAS):
+            raise CommandError("--copy は SQLite のときだけ使えます")
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+        self.stdout.write(f"プライマリを {', '.join(settings.DATABASE_REPLICAS)} にコピーしました")
+
+    def run(self, operations):
+        aliases = [DEFAULT_DB_ALIAS, *settings.DATABASES.keys() - {DEFAULT_DB_ALIAS}]
+        stats = {alias: QueryStats() for alias in aliases}
+        clients = {}
+        stale = 0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(stats[alias]))
+            for kind, username, post_id, choice in operations:
+                client = clients.get(username)
+                if client is None:
+                    client = clients[username] = self.client_for(username)
+                if kind == 'write':
+                    # いいね → 自分で確認 → 取り消し → 自分で確認（データは元に戻る）
+                    for expected in (True, False):
+                        self.ensure_ok(client.post(reverse('post-like-toggle', args=[post_id])))
+                        response = self.ensure_ok(client.get(reverse('post-detail', args=[post_id])))
+                        stale += response.data['is_liked'] != expected
+                elif choice < 0.4:
+                    self.ensure_ok(APIClient(SERVER_NAME='localhost').get(reverse('post-list')))
+                elif choice < 0.6:
+                    self.ensure_ok(client.get(reverse('post-list')))
+                elif choice < 0.7:
+                    self.ensure_ok(client.get(reverse('post-list'), {'q': dataset.WORDS[post_id % len(dataset.WORDS)]}))
+                elif choice < 0.8:
+                    self.ensure_ok(client.get(reverse('post-city-timeline')))
+                elif choice < 0.9:
+                    self.ensure_ok(client.get(reverse('post-detail', args=[post_id])))
+                else:
+                    self.ensure_ok(client.get(reverse('comment-list', args=[post_id])))
+        replicas = sum(stats[alias].count for alias in aliases if alias != DEFAULT_DB_ALIAS)
+        return {
+            'primary': stats[DEFAULT_DB_ALIAS].count, 'replicas': replicas,
+            'seconds': time.perf_counter() - started, 'stale': stale,
+        }
+
+    def client_for(self, username):
+        client = APIClient(SERVER_NAME='localhost')
+        user = get_user_model().objects.get(username=username)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+        return client
+
+    def ensure_ok(self, response):
+        if response.status_code >= 400:
+            raise CommandError(f"{response.request['REQUEST_METHOD']} {response.request['PATH_INFO']} -> {response.status_code}")
+        return response
@@ -0,0 +1,28 @@
+# posts/management/commands/decay_trending_scores.py
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = "話題の投稿のスコア（Post.hot_score）を現在の時刻まで減衰させる（定期実行用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='常駐して一定間隔で減衰させ続ける（ワーカー用）')
+        parser.add_argument('--interval', type=float, default=settings.TRENDING['DECAY_INTERVAL'], help='実行間隔（秒）')
+        parser.add_argument('--rebuild', action='store_true', help='いいね数・コメント数から全投稿のスコアを計算し直す')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(f"{trending.rebuild()} 件のスコアを計算し直しました")
+        while True:
+            # スコアは一覧のレスポンスに含まれないので、キャッシュの無効化は要らない
+            updated = trending.decay()
+            self.stdout.write(f"{updated} 件のスコアを減衰させました")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# posts/management/commands/flush_like_buffer.py
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import like_buffer
+
+
+class Command(BaseCommand):
+    help = "いいねのバッファ（LikeIntent）を PostLike / CommentLike にまとめて反映する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.LIKE_BUFFER['BATCH_SIZE'])
+        parser.add_argument('--loop', action='store_true', help='常駐して反映し続ける（ワーカー用）')
+        parser.add_argument('--interval', type=float, default=settings.LIKE_BUFFER['INTERVAL'],
+                            help='バッファが空のときの待ち時間（秒）')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            total = 0
+            # 溜まっている分はバッチごとに続けて反映する
+            while processed := like_buffer.flush(batch_size):
+                total += processed
+            if total:
+                self.stdout.write(f"{total} 件のいいねを反映しました")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+# posts/management/commands/generate_dataset.py
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import dataset
+
+
+class Command(BaseCommand):
+    help = "負荷試験・ベンチマーク用の合成データ（ユーザー・投稿・コメント・いいね）を bulk_create で追加する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='追加するユーザー数')
+        parser.add_argument('--posts', type=int, default=10000, help='追加する投稿数')
+        parser.add_argument('--likes-per-post', type=float, default=5, help='投稿あたりのいいね数の平均')
+        parser.add_argument('--comments-per-post', type=float, default=2, help='投稿あたりのコメント数の平均')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='1回の bulk_create で作る投稿数')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--force', action='store_true', help='DEBUG=False の環境でも実行する')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG=False の環境では実行しません（本番 DB に合成データを入れないため。--force で実行できます）")
+
+        started = time.perf_counter()
+        try:
+            totals = dataset.generate(
+                options['users'], options['posts'],
+                likes_per_post=options['likes_per_post'], comments_per_post=options['comments_per_post'],
+                seed=options['seed'], chunk_size=options['chunk_size'], log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"users: +{totals['users']}  posts: +{totals['posts']}  comments: +{totals['comments']}  "
+            f"likes: +{totals['likes']}  comment likes: +{totals['comment_likes']}  ({elapsed:.1f}s)"
+        )
@@ -0,0 +1,27 @@
+# posts/management/commands/generate_image_variants.py
+
+from django.core.management.base import BaseCommand
+
+from posts.images import generate_variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "投稿画像の縮小版を生成する（既定では未生成の投稿のみ）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='生成済みの投稿も作り直す')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image')
+        if not options['all']:
+            posts = posts.filter(image_variants={})
+        done = failed = 0
+        for post in posts.iterator():
+            try:
+                generate_variants(post)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Post#{post.id}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"{done} 件生成しました（失敗 {failed} 件）"))
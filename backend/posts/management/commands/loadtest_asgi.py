@@ -0,0 +1,173 @@
+# posts/management/commands/loadtest_asgi.py
+
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post, ReverseGeocodeCache
+from users.authentication import ClaimsRefreshToken
+
+CITY = '負荷試験市'
+TITLE = 'loadtest'
+MODES = {
+    'wsgi': ['backend.wsgi:application'],
+    'asgi': ['-k', 'uvicorn.workers.UvicornWorker', 'backend.asgi:application'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def slow_geocoder(delay):
+    """delay 秒待ってから常に CITY を返す Geocoding API のスタブ"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps({
+                'status': 'OK',
+                'results': [{'address_components': [{'long_name': CITY, 'types': ['locality']}]}],
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Command(BaseCommand):
+    help = "WSGI と ASGI（非同期ビュー）の処理能力を、遅いジオコーダのスタブを相手に比較する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--requests', type=int, default=200, help='モードごとのリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--delay', type=float, default=0.3, help='ジオコーダのスタブの応答時間（秒）')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn のワーカー数')
+        parser.add_argument('--write-ratio', type=float, default=0.5, help='投稿作成の割合（残りは一覧の取得）')
+
+    def handle(self, *args, **options):
+        if not settings.MUNICIPALITY_REMOTE_FALLBACK:
+            raise CommandError("MUNICIPALITY_REMOTE_FALLBACK が無効だとジオコーダを使いません")
+        if settings.DATABASES['default']['ENGINE'].endswith('sqlite3'):
+            self.stderr.write("⚠️ SQLite は同時書き込みでロックされます。比較は PostgreSQL（DATABASE_URL）で行ってください")
+        user, _ = get_user_model().objects.update_or_create(
+            username='loadtest',
+            defaults={'email': 'loadtest@example.com', 'residence_prefecture': '東京都', 'residence_city': CITY},
+        )
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+        stub = slow_geocoder(options['delay'])
+        self.stdout.write(f"geocoder stub: {options['delay'] * 1000:.0f} ms/request  "
+                          f"requests: {options['requests']}  concurrency: {options['concurrency']}")
+        try:
+            for index, mode in enumerate(options['modes']):
+                port = free_port()
+                server = self.start_server(mode, port, stub.server_address[1], options['workers'])
+                try:
+                    results = asyncio.run(self.run(f'http://127.0.0.1:{port}', token, index, options))
+                finally:
+                    server.terminate()
+                    server.wait()
+                self.report(mode, *results)
+        finally:
+            stub.shutdown()
+            Post.objects.filter(user=user, title=TITLE).delete()
+            ReverseGeocodeCache.objects.filter(city=CITY).delete()
+
+    def start_server(self, mode, port, stub_port, workers):
+        env = {
+            **os.environ,
+            'ASYNC_VIEWS': 'true' if mode == 'asgi' else 'false',
+            'GOOGLE_GEOCODING_URL': f'http://127.0.0.1:{stub_port}/',
+            'GOOGLE_GEOCODING_API_KEY': 'loadtest',
+            # 境界データを使わず、毎回ジオコーダを引かせる
+            'MUNICIPALITY_BOUNDARIES_PATH': '',
+            'IMAGE_VARIANTS_ASYNC': 'True',
+        }
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+             '--log-level', 'warning', *MODES[mode]],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f'http://127.0.0.1:{port}/api/posts/list/', timeout=1)
+                return server
+            except httpx.HTTPError:
+                if server.poll() is not None:
+                    break
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"{mode} サーバーを起動できませんでした")
+
+    async def run(self, base_url, token, mode_index, options):
+        total, write_every = options['requests'], max(1, round(1 / options['write_ratio'])) if options['write_ratio'] else 0
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = {'create': [], 'list': []}
+        errors = []
+
+        async def one(client, i):
+            is_write = write_every and i % write_every == 0
+            async with semaphore:
+                started = time.perf_counter()
+                if is_write:
+                    # セルが重ならないよう座標をずらす（キャッシュに当たらず毎回ジオコーダを引く）
+                    lat, lng = 35.0 + mode_index + i * 0.002, 139.0
+                    response = await client.post('/api/posts/', headers={'Authorization': f'Bearer {token}'}, data={
+                        'title': TITLE, 'body': TITLE, 'latitude': f'{lat:.6f}', 'longitude': f'{lng:.6f}',
+                    })
+                    expected = 201
+                else:
+                    response = await client.get('/api/posts/list/', headers={'Authorization': f'Bearer {token}'})
+                    expected = 200
+                elapsed = time.perf_counter() - started
+            if response.status_code != expected:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+            latencies['create' if is_write else 'list'].append(elapsed)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(client, i) for i in range(total)))
+            return time.perf_counter() - started, latencies, errors
+
+    def report(self, mode, seconds, latencies, errors):
+        count = sum(len(values) for values in latencies.values())
+        self.stdout.write(f"{mode}: {count / seconds:7.1f} req/s  errors: {len(errors)}")
+        if errors:
+            self.stdout.write(f"  first error: {errors[0]}")
+        for kind, values in latencies.items():
+            if values:
+                self.stdout.write(
+                    f"  {kind:>6}: p50 {statistics.median(values) * 1000:7.1f} ms  "
+                    f"p95 {percentile(values, 0.95) * 1000:7.1f} ms  ({len(values)} requests)"
+                )
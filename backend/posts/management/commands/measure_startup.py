@@ -0,0 +1,89 @@
+# posts/management/commands/measure_startup.py
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .loadtest_asgi import free_port
+
+# アプリの読み込みで import されるモジュール（WSGI の起動時と同じ範囲）
+IMPORT_PROBE = (
+    "import django; django.setup(); "
+    "import backend.wsgi, backend.urls"
+)
+
+
+class Command(BaseCommand):
+    help = "gunicorn（gunicorn.conf.py）の起動からヘルスチェックが初めて 200 を返すまでの時間と、import の内訳を計測する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--no-preload', action='store_true', help='比較用: ワーカーごとにアプリを読み込む')
+        parser.add_argument('--imports', type=int, default=15, help='読み込みに時間のかかるモジュールを上位この件数だけ表示する')
+
+    def handle(self, *args, **options):
+        seconds = [self.time_to_healthy(options) for _ in range(options['runs'])]
+        preload = 'off' if options['no_preload'] else 'on'
+        self.stdout.write(
+            f"{options['mode']} (workers: {options['workers']}, preload: {preload}): "
+            f"time to first healthy response  median {statistics.median(seconds):.2f}s  "
+            f"max {max(seconds):.2f}s  ({len(seconds)} runs)"
+        )
+        if options['imports']:
+            self.report_imports(options['imports'])
+
+    def time_to_healthy(self, options):
+        port = free_port()
+        env = {
+            **os.environ,
+            'SERVER_MODE': options['mode'],
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'WEB_CONCURRENCY': str(options['workers']),
+            'GUNICORN_PRELOAD': 'false' if options['no_preload'] else 'true',
+        }
+        started = time.monotonic()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            while time.monotonic() - started < 60:
+                try:
+                    if httpx.get(f'http://127.0.0.1:{port}/api/health', timeout=1).status_code == 200:
+                        return time.monotonic() - started
+                except httpx.HTTPError:
+                    pass
+                if server.poll() is not None:
+                    break
+                time.sleep(0.02)
+        finally:
+            server.terminate()
+            server.wait()
+        raise CommandError("gunicorn がヘルスチェックに応答しませんでした")
+
+    def report_imports(self, limit):
+        # python -X importtime の累積時間（子モジュールを含む）で並べる
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_PROBE],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')},
+        )
+        rows = []
+        for line in result.stderr.splitlines():
+            match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+            if match:
+                rows.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+        total = sum(cumulative for cumulative, depth, _ in rows if depth == 0)
+        self.stdout.write(f"imports (cumulative, top {limit}):")
+        for cumulative, depth, module in sorted(rows, reverse=True)[:limit]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {'  ' * depth}{module}")
+        self.stdout.write(f"  total: {total / 1000:.1f} ms")
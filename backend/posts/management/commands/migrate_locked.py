@@ -0,0 +1,49 @@
+# posts/management/commands/migrate_locked.py
+
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# pg_advisory_lock のキー（アプリ内で一意な任意の整数）
+LOCK_ID = 7_316_001
+
+
+class Command(BaseCommand):
+    help = (
+        "ロックを取ってから migrate を実行する（デプロイ時の単発タスク用）"
+        "。複数のタスクが同時に起動しても、マイグレーションは1つずつ実行される"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=300, help='ロック待ちの上限（秒）')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if connection.vendor != 'postgresql':
+            # SQLite（開発環境）はプロセスが1つなのでロックしない
+            call_command('migrate', interactive=False, verbosity=options['verbosity'])
+            return
+
+        self.acquire(options['timeout'])
+        try:
+            waited = time.monotonic() - started
+            if waited >= 1:
+                self.stdout.write(f"ロックを {waited:.1f} 秒待ちました（先に実行されたマイグレーションは適用済みです）")
+            call_command('migrate', interactive=False, verbosity=options['verbosity'])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [LOCK_ID])
+        self.stdout.write(f"migrate: {time.monotonic() - started:.1f}s")
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [LOCK_ID])
+                if cursor.fetchone()[0]:
+                    return
+                if time.monotonic() > deadline:
+                    raise CommandError(f"{timeout:.0f} 秒待ってもマイグレーションのロックを取得できませんでした")
+                time.sleep(1)
@@ -0,0 +1,16 @@
+# posts/management/commands/rebuild_city_timelines.py
+
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "市区町村ごとの新着タイムライン（CityTimelineEntry）を全投稿から作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        entries = timeline.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{entries} 件をタイムラインに登録しました"))
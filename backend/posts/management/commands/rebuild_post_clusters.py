@@ -0,0 +1,16 @@
+# posts/management/commands/rebuild_post_clusters.py
+
+from django.core.management.base import BaseCommand
+
+from posts import clusters
+
+
+class Command(BaseCommand):
+    help = "地図用の投稿クラスタ集計（PostClusterCell）を全投稿から作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cells = clusters.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{cells} セルを集計しました"))
@@ -0,0 +1,86 @@
+# posts/management/commands/reconcile_counters.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from posts import response_cache
+from posts.models import Post, Comment, PostLike, CommentLike
+
+
+class Command(BaseCommand):
+    help = "Post / Comment の非正規化カウンタ（like_count, comment_count）を実テーブルから再計算して補正する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='1バッチで処理する行数')
+        parser.add_argument('--dry-run', action='store_true', help='ずれを報告するだけで更新しない')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # (モデル, カウンタ名, 集計元モデル, 集計元の外部キー名)
+        targets = [
+            (Post, 'like_count', PostLike, 'post'),
+            (Post, 'comment_count', Comment, 'post'),
+            (Comment, 'like_count', CommentLike, 'comment'),
+        ]
+        total_fixed = 0
+        for model, field, source, fk_name in targets:
+            scanned, drifted = self.reconcile(model, field, source, fk_name, batch_size, dry_run)
+            total_fixed += drifted
+            self.stdout.write(
+                f"{model.__name__}.{field}: {scanned} 件を確認、{drifted} 件のずれ"
+                + ("（dry-run のため未更新）" if dry_run and drifted else "")
+            )
+
+        if total_fixed and not dry_run:
+            # bulk_update はシグナルを送らないので、一覧のキャッシュはここで無効化する
+            response_cache.bump('posts')
+            for post_id in Comment.objects.values_list('post_id', flat=True).distinct():
+                response_cache.bump(response_cache.comments_scope(post_id))
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"dry-run: {total_fixed} 件のずれを検出しました"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{total_fixed} 件のカウンタを補正しました"))
+
+    def reconcile(self, model, field, source, fk_name, batch_size, dry_run):
+        scanned = drifted = 0
+        last_pk = 0
+        while True:
+            # 主キー順にキーセットで走査（OFFSET を使わない）
+            batch = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', field)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            scanned += len(batch)
+
+            actual = dict(
+                source.objects.filter(**{f'{fk_name}_id__in': [pk for pk, _ in batch]})
+                .values_list(f'{fk_name}_id')
+                .annotate(c=Count('pk'))
+                .order_by()
+            )
+            stale = [(pk, stored, actual.get(pk, 0)) for pk, stored in batch if stored != actual.get(pk, 0)]
+            drifted += len(stale)
+            for pk, stored, count in stale[:10]:
+                self.stdout.write(f"  {model.__name__}#{pk} {field}: {stored} -> {count}")
+            if stale and not dry_run:
+                # 書き込みは同じ UPDATE の中で数え直した値にする（集計後に入った F() での増減を上書きしない）
+                count = (
+                    source.objects.filter(**{fk_name: OuterRef('pk')})
+                    .order_by()
+                    .values(fk_name)
+                    .annotate(c=Count('pk'))
+                    .values('c')
+                )
+                model.objects.filter(pk__in=[pk for pk, _, _ in stale]).update(
+                    **{field: Coalesce(Subquery(count), 0)}, updated_at=timezone.now(),
+                )
+        return scanned, drifted
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+from posts.search import build_search_document, create_search_index, drop_search_index
+
+
+def backfill_search_document(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.select_related('user').iterator(chunk_size=1000):
+        post.search_document = build_search_document(post)
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['search_document'])
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor)
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(forwards, backwards),
+    ]
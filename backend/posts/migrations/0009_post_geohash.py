@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 21:09
+
+from django.db import migrations, models
+
+from posts.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    posts = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    for post in posts.iterator(chunk_size=1000):
+        post.geohash = geohash_encode(post.latitude, post.longitude)
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_reversegeocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
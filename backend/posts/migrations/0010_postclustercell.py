@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+from posts.clusters import cell_keys
+
+
+def backfill_clusters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostClusterCell = apps.get_model('posts', 'PostClusterCell')
+    totals = {}
+    posts = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list('latitude', 'longitude')
+    for latitude, longitude in posts.iterator(chunk_size=5000):
+        for key in cell_keys(latitude, longitude):
+            count, lat_sum, lng_sum = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = (count + 1, lat_sum + latitude, lng_sum + longitude)
+    PostClusterCell.objects.bulk_create(
+        [
+            PostClusterCell(tier=tier, row=row, col=col, count=count, lat_sum=lat_sum, lng_sum=lng_sum)
+            for (tier, row, col), (count, lat_sum, lng_sum) in totals.items()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostClusterCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tier', models.PositiveSmallIntegerField()),
+                ('row', models.IntegerField()),
+                ('col', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lng_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('tier', 'row', 'col')},
+            },
+        ),
+        migrations.RunPython(backfill_clusters, migrations.RunPython.noop),
+    ]
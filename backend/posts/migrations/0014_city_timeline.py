@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-17 21:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    CityTimelineEntry = apps.get_model('posts', 'CityTimelineEntry')
+    length = settings.CITY_TIMELINE['LENGTH']
+    for city in list(Post.objects.exclude(city='').order_by().values_list('city', flat=True).distinct()):
+        recent = list(
+            Post.objects.filter(city=city).order_by('-created_at', '-id').values_list('id', 'created_at')[:length]
+        )
+        CityTimelineEntry.objects.bulk_create(
+            [CityTimelineEntry(city=city, post_id=post_id, created_at=created_at)
+             for post_id, created_at in reversed(recent)],
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_likeintent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityTimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city', '-created_at', '-id'], name='post_city_created_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='citytimelineentry',
+            name='post',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entry', to='posts.post'),
+        ),
+        migrations.AddIndex(
+            model_name='citytimelineentry',
+            index=models.Index(fields=['city', '-created_at', '-id'], name='timeline_city_created_id_idx'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
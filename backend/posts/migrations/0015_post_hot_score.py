@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-17 21:59
+
+import time
+
+from django.db import migrations, models
+from django.db.models import Q
+
+from posts.trending import initial_score
+
+
+def backfill_hot_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    now = time.time()
+    posts = []
+    engaged = Post.objects.filter(Q(like_count__gt=0) | Q(comment_count__gt=0)).only(
+        'id', 'created_at', 'like_count', 'comment_count',
+    )
+    for post in engaged.iterator(chunk_size=5000):
+        post.hot_score = initial_score(post.like_count, post.comment_count, post.created_at, now)
+        post.hot_score_at = now
+        posts.append(post)
+    Post.objects.bulk_update(posts, ['hot_score', 'hot_score_at'], batch_size=5000)
+    # いいね・コメントの無い投稿もスコア 0 の時点を現在にする（hot_score_at = 0 のままだと減衰の指数が極端に小さくなる）
+    Post.objects.filter(like_count=0, comment_count=0).update(hot_score_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_city_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hot_score_at',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['city', '-hot_score', '-id'], name='post_city_hot_score_id_idx'),
+        ),
+        migrations.RunPython(backfill_hot_scores, migrations.RunPython.noop),
+    ]
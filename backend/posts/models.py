@@ -1,7 +1,80 @@
 # posts/models.py
 
+import math
+import time
+
 from django.db import models
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When
 from django.conf import settings
+from .geo import bounding_box, covering_cells, geohash_encode, prefix_upper_bound
+from .search import build_search_document
+
+
+def _with_like_info(queryset, like_model, fk_name, user):
+    """
+    「自分がいいね済みか」を1クエリでまとめて取得する
+    （いいね数は like_count カラムに非正規化済み）
+    いいねのバッファ（posts/like_buffer.py）が有効なら、未反映の自分のいいね・取り消しも反映する
+    """
+    if user is None or not user.is_authenticated:
+        return queryset.select_related('user').annotate(is_liked=Value(False), pending_like_delta=Value(0))
+
+    liked_row = Exists(like_model.objects.filter(**{fk_name: OuterRef('pk')}, user=user))
+    if not settings.LIKE_BUFFER['ENABLED']:
+        return queryset.select_related('user').annotate(is_liked=liked_row, pending_like_delta=Value(0))
+
+    # 未反映の意図のうち最新のもの（無ければ NULL）
+    pending = Subquery(
+        LikeIntent.objects.filter(kind=fk_name, object_id=OuterRef('pk'), user=user)
+        .order_by('-id')
+        .values('liked')[:1]
+    )
+    return queryset.select_related('user').annotate(liked_row=liked_row, pending_like=pending).annotate(
+        is_liked=Case(
+            When(pending_like__isnull=False, then='pending_like'),
+            default='liked_row',
+            output_field=models.BooleanField(),
+        ),
+        pending_like_delta=Case(
+            When(pending_like=True, liked_row=False, then=Value(1)),
+            When(pending_like=False, liked_row=True, then=Value(-1)),
+            default=Value(0),
+        ),
+    )
+
+
+class PostQuerySet(models.QuerySet):
+    def with_like_info(self, user):
+        return _with_like_info(self, PostLike, 'post', user)
+
+    def near(self, latitude, longitude, radius_km):
+        """
+        中心から radius_km 以内の候補を geohash のセル（前方一致の範囲検索）で絞り込む
+        正確な距離での絞り込み・並べ替えは呼び出し側で行う
+        """
+        cells = Q()
+        for cell in covering_cells(latitude, longitude, radius_km):
+            # geohash__startswith と同じだが、どのDBでも B-tree インデックスの範囲検索になる
+            upper = prefix_upper_bound(cell)
+            cells |= Q(geohash__gte=cell, geohash__lt=upper) if upper else Q(geohash__gte=cell)
+        # セルは外接矩形より広いので、矩形の外の行は SQL で落とす（経度が ±180 をまたぐときは緯度だけ）
+        min_lat, min_lng, max_lat, max_lng = bounding_box(latitude, longitude, radius_km)
+        box = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+        if -180 <= min_lng and max_lng <= 180:
+            box &= Q(longitude__gte=min_lng, longitude__lte=max_lng)
+        return self.filter(cells, box)
+
+    def nearest_first(self, latitude, longitude):
+        """中心からの近似距離（正距円筒図法での距離の2乗）の近い順。候補を上限件数で切るときに使う"""
+        dlat = F('latitude') - latitude
+        dlng = (F('longitude') - longitude) * math.cos(math.radians(latitude))
+        return self.alias(approx_distance=dlat * dlat + dlng * dlng).order_by('approx_distance')
+
+
+class CommentQuerySet(models.QuerySet):
+    def with_like_info(self, user):
+        return _with_like_info(self, CommentLike, 'comment', user)
+
 
 class Post(models.Model):
     user = models.ForeignKey(
@@ -12,19 +85,70 @@ class Post(models.Model):
     title = models.CharField(max_length=255)
     body = models.TextField()
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)  # ✅ 画像追加
+    # 画像の縮小版 {size: {format: ファイル名}}（アップロード後にバックグラウンドで生成、posts/images.py 参照）
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     city = models.CharField(max_length=255)  # ✅ 投稿対象の市区町村追加
     created_at = models.DateTimeField(auto_now_add=True)
+    # 条件付き GET（ETag / Last-Modified）用。F() でカウンタを更新する箇所でも Now() で更新する
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # 近傍検索用（latitude / longitude から保存時に計算、posts/geo.py 参照）
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # 非正規化カウンタ（いいね・コメント時に F() で更新、reconcile_counters で補正）
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # n-gram 化した検索用ドキュメント（保存時に更新、posts/search.py 参照）
+    search_document = models.TextField(default='', editable=False)
+    # 話題の投稿ランキング用の減衰スコアと、その値の時点（UNIX 時刻、posts/trending.py）
+    hot_score = models.FloatField(default=0, editable=False)
+    hot_score_at = models.FloatField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # カーソルページネーション用（一覧・自分の投稿一覧）
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_id_idx'),
+            # 市区町村ごとの新着（タイムラインに無い古い投稿の読み出し）
+            models.Index(fields=['city', '-created_at', '-id'], name='post_city_created_id_idx'),
+            # 市区町村ごとの話題の投稿（スコアの高い順）
+            models.Index(fields=['city', '-hot_score', '-id'], name='post_city_hot_score_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.search_document = build_search_document(self)
+        if self._state.adding and not self.hot_score_at:
+            # スコア 0 の時点を作成時刻にする（0 のままだと減衰の指数が極端に小さくなる）
+            self.hot_score_at = time.time()
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash_encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_document', 'geohash'}
+        super().save(*args, **kwargs)
+
 class Comment(models.Model):
     post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # 条件付き GET 用
+    like_count = models.PositiveIntegerField(default=0)  # 非正規化カウンタ
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 投稿ごとのコメント一覧のカーソルページネーション用
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.text[:20]}"
@@ -41,4 +165,74 @@ class CommentLike(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
     class Meta:
-        unique_together = ('comment', 'user')
\ No newline at end of file
+        unique_together = ('comment', 'user')
+
+
+class LikeIntent(models.Model):
+    """
+    いいね・取り消しの書き込みバッファ（LIKE_BUFFER['ENABLED'] のとき）
+    flush_like_buffer コマンドが PostLike / CommentLike にまとめて反映して削除する
+    """
+    KIND_CHOICES = [('post', 'post'), ('comment', 'comment')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()  # Post / Comment の ID（削除済みなら反映時に捨てる）
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    liked = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # 自分の未反映の意図の参照用（一覧の is_liked・トグル）
+            models.Index(fields=['user', 'kind', 'object_id', '-id'], name='likeintent_user_object_idx'),
+        ]
+
+
+class ReverseGeocodeCache(models.Model):
+    """
+    逆ジオコーディング結果のキャッシュ（緯度経度を量子化したセル単位）
+    posts/geocoding.py 参照
+    """
+    lat_cell = models.IntegerField()
+    lng_cell = models.IntegerField()
+    city = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('lat_cell', 'lng_cell')
+
+    def __str__(self):
+        return f"({self.lat_cell}, {self.lng_cell}) {self.city}"
+
+
+
+class PostClusterCell(models.Model):
+    """
+    地図表示用の投稿件数の事前集計（ズーム段階 tier ごとのグリッドセル）
+    posts/clusters.py 参照
+    """
+    tier = models.PositiveSmallIntegerField()
+    row = models.IntegerField()
+    col = models.IntegerField()
+    count = models.IntegerField(default=0)
+    # 代表位置（重心）計算用の緯度・経度の合計
+    lat_sum = models.FloatField(default=0)
+    lng_sum = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('tier', 'row', 'col')
+
+
+class CityTimelineEntry(models.Model):
+    """
+    市区町村ごとの新着投稿のタイムライン（投稿作成時に書き込み、直近 CITY_TIMELINE['LENGTH'] 件を残す）
+    posts/timeline.py 参照
+    """
+    city = models.CharField(max_length=255)
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='timeline_entry')
+    created_at = models.DateTimeField()  # Post.created_at の複製（並び順用）
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', '-created_at', '-id'], name='timeline_city_created_id_idx'),
+        ]
@@ -0,0 +1,22 @@
+# posts/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    (created_at, id) をキーにしたカーソルページネーション
+    OFFSET を使わないため、何ページ目でも同じコストで取得できる
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # 同一時刻の投稿は id で順序を確定させる
+    ordering = ('-created_at', '-id')
+
+
+class SearchRankCursorPagination(CreatedAtCursorPagination):
+    """
+    検索結果用：関連度（search_rank）の高い順に返すカーソルページネーション
+    """
+    ordering = ('-search_rank', '-id')
@@ -0,0 +1,147 @@
+# posts/response_cache.py
+
+"""
+未ログインの一覧レスポンス（投稿一覧・コメント一覧）のキャッシュ
+- 未ログインなら is_liked は常に False で、同じ URL なら誰が見ても同じレスポンスになる
+- キャッシュキーにはリソースごとのバージョン番号を含める
+  書き込み時（posts/signals.py）にバージョンを上げるので、古いエントリは参照されなくなる
+- スコープ: 'posts'（投稿一覧・検索）、'comments:<post_id>'（投稿ごとのコメント一覧）
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypasses': 0}
+
+
+def _version_key(scope):
+    return f'response-cache:version:{scope}'
+
+
+def _initial_version():
+    # バージョンキーが追い出されても、過去の番号に戻らないよう時刻から始める
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    version = cache.get(_version_key(scope))
+    if version is None:
+        version = _initial_version()
+        if not cache.add(_version_key(scope), version, timeout=None):
+            version = cache.get(_version_key(scope), version)
+    return version
+
+
+def _bump(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            # 未作成（または追い出し済み）
+            cache.set(_version_key(scope), _initial_version(), timeout=None)
+
+
+def bump(*scopes):
+    """
+    スコープのキャッシュを無効化する
+    書き込み直後と、コミット後にもう一度上げる（コミット前の古い内容を読んだリクエストが
+    新しいバージョンで保存してしまうのを防ぐ）
+    """
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def _entry_key(scope, request):
+    path = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+    return f'response-cache:{scope}:{get_version(scope)}:{path}'
+
+
+def validators_key(scope, request):
+    return _entry_key(scope, request) + ':validators'
+
+
+def _record(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def is_cacheable(request):
+    return settings.RESPONSE_CACHE['ENABLED'] and request.method == 'GET' and not request.user.is_authenticated
+
+
+def get(scope, request):
+    """(キー, キャッシュ済みのデータ or None)"""
+    key = _entry_key(scope, request)
+    data = cache.get(key)
+    _record('misses' if data is None else 'hits')
+    return key, data
+
+
+def store(key, data):
+    cache.set(key, data, timeout=settings.RESPONSE_CACHE['TIMEOUT'])
+
+
+def record_bypass():
+    _record('bypasses')
+
+
+def stats():
+    with _stats_lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {**_stats, 'hit_rate': _stats['hits'] / lookups if lookups else 0.0}
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+class AnonymousResponseCacheMixin:
+    """
+    ListAPIView 用: 未ログインの GET をキャッシュから返す
+    サブクラスで response_cache_scope() を定義する
+    ConditionalGetMixin と併用する場合はこちらを先に継承する（ETag もキャッシュし、304 の判定でも DB を引かない）
+    """
+
+    def response_cache_scope(self):
+        raise NotImplementedError
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().get_conditional_validators(request, *args, **kwargs)
+        key = validators_key(self.response_cache_scope(), request)
+        validators = cache.get(key)
+        if validators is None:
+            validators = super().get_conditional_validators(request, *args, **kwargs)
+            if validators is not None:
+                store(key, validators)
+        return validators
+
+    def list(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            record_bypass()
+            return super().list(request, *args, **kwargs)
+
+        key, data = get(self.response_cache_scope(), request)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            store(key, dict(response.data))
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,157 @@
+# posts/search.py
+
+"""
+投稿検索エンジン
+- 投稿ごとに n-gram 化した検索用ドキュメント（Post.search_document）を保存時に作成
+- PostgreSQL: to_tsvector('simple', search_document) の GIN インデックス
+- SQLite（開発環境）: FTS5 仮想テーブル posts_post_fts
+日本語は単語区切りがないため、文字 bigram で分かち書きしてから索引する
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'posts_post_fts'
+
+# 英数字・かな・漢字などの「文字」の連続を1つのまとまりとして扱う
+_WORD_RE = re.compile(r'\w+')
+
+
+def ngram_tokens(text):
+    """
+    文字 bigram に分解する（各まとまりの末尾1文字も unigram として含める）
+    例: '渋谷区' -> ['渋谷', '谷区', '区']
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        word = word.replace('_', '')
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        if word:
+            tokens.append(word[-1])
+    return tokens
+
+
+def build_search_document(post):
+    """タイトル・本文・市区町村・投稿者名から検索用ドキュメントを作る"""
+    username = post.user.username if post.user_id else ''
+    parts = [post.title, post.body, post.city, username]
+    return ' '.join(token for part in parts for token in ngram_tokens(part))
+
+
+def _query_tokens(query):
+    # 検索語側は末尾の unigram を除いた bigram で AND 検索する
+    # （1文字だけの語は前方一致で検索する）
+    tokens = []
+    for word in _WORD_RE.findall(unicodedata.normalize('NFKC', query).lower()):
+        word = word.replace('_', '')
+        if len(word) == 1:
+            tokens.append((word, True))
+        else:
+            tokens.extend((word[i:i + 2], False) for i in range(len(word) - 1))
+    return list(dict.fromkeys(tokens))
+
+
+def _postgres_tsquery(tokens):
+    return ' & '.join(
+        "'{}'{}".format(token.replace("'", "''"), ':*' if prefix else '')
+        for token, prefix in tokens
+    )
+
+
+def _fts5_query(tokens):
+    return ' '.join(
+        '"{}"{}'.format(token.replace('"', '""'), '*' if prefix else '')
+        for token, prefix in tokens
+    )
+
+
+def search_posts(queryset, query):
+    """
+    検索語に一致する投稿に絞り込み、関連度を search_rank として annotate する
+    （search_rank は大きいほど関連度が高い）
+    """
+    tokens = _query_tokens(query)
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = _postgres_tsquery(tokens)
+        return queryset.annotate(
+            search_rank=RawSQL(
+                "ts_rank(to_tsvector('simple', \"posts_post\".\"search_document\"), to_tsquery('simple', %s))",
+                (tsquery,),
+                output_field=FloatField(),
+            )
+        ).alias(
+            search_match=RawSQL(
+                "to_tsvector('simple', \"posts_post\".\"search_document\") @@ to_tsquery('simple', %s)",
+                (tsquery,),
+                output_field=BooleanField(),
+            )
+        ).filter(search_match=True)
+
+    if vendor == 'sqlite':
+        match = _fts5_query(tokens)
+        # bm25() は小さいほど関連度が高いので符号を反転する
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = \"posts_post\".\"id\"",
+                (match,),
+                output_field=FloatField(),
+            )
+        ).filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)))
+
+    # その他のDBでは索引なしで search_document を部分一致検索する
+    for token, _ in tokens:
+        queryset = queryset.filter(search_document__contains=token)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+# マイグレーション・post_migrate から呼ぶ索引の作成・削除
+
+def create_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS posts_post_search_gin ON posts_post "
+            "USING GIN (to_tsvector('simple', search_document))"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "search_document, content='posts_post', content_rowid='id', tokenize='unicode61')"
+        )
+        # 外部コンテンツテーブルの同期用トリガー
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON posts_post BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON posts_post BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+            f"VALUES ('delete', old.id, old.search_document); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON posts_post BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) "
+            f"VALUES ('delete', old.id, old.search_document); "
+            f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END"
+        )
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS posts_post_search_gin")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
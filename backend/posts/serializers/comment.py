@@ -2,19 +2,23 @@ from rest_framework import serializers
 from ..models import Comment
 
 class CommentSerializer(serializers.ModelSerializer):
-    like_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
+    like_count = serializers.SerializerMethodField()
     user = serializers.StringRelatedField(read_only=True)  # ユーザー名表示用
 
     class Meta:
         model = Comment
         fields = ['id', 'post', 'user', 'text', 'created_at', 'like_count', 'is_liked']
-        read_only_fields = ['id', 'user', 'created_at', 'post']
+        read_only_fields = ['id', 'user', 'created_at', 'post', 'like_count']
 
     def get_like_count(self, obj):
-        return obj.likes.count()
+        # いいねのバッファ有効時は、自分の未反映のいいね・取り消しを加味する
+        return obj.like_count + getattr(obj, 'pending_like_delta', 0)
 
     def get_is_liked(self, obj):
+        # 一覧・詳細ビューでは with_like_info() で annotate 済み
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         user = self.context.get('request').user
         if user.is_authenticated:
             return obj.likes.filter(user=user).exists()
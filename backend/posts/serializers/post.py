@@ -1,25 +1,58 @@
 # posts/serializers.py
 
+import math
 import os
-import requests
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from ..boundaries import resolve_municipality
+from ..images import strip_metadata
+from ..geocoding import GeocodingError, GeocodingNotFound, areverse_geocode_city, reverse_geocode_city
 from ..models import Post
 from users.serializers.user import UserSerializer
-from dotenv import load_dotenv
 
-load_dotenv()
+
+def image_variant_urls(image_variants, request):
+    # {size: {format: URL}}（生成前は空）。URL は image と同じく絶対URLにする
+    variants = {}
+    for size, files in (image_variants or {}).items():
+        variants[size] = {}
+        for fmt, name in files.items():
+            url = default_storage.url(name)
+            variants[size][fmt] = request.build_absolute_uri(url) if request else url
+    return variants
+
+
+class CoordinateField(serializers.FloatField):
+    """緯度・経度（nan・inf は範囲の検証を素通りするので、ここで弾く）"""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not math.isfinite(value):
+            self.fail('invalid')
+        return value
+
 
 class PostSerializer(serializers.ModelSerializer):
 
-    like_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
+    like_count = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     user = UserSerializer(read_only=True)
     city = serializers.CharField(read_only=True)
+    # 範囲外・nan・inf は市区町村の判定（ジオコーダ・セルの計算）より前に弾く
+    latitude = CoordinateField(min_value=-90, max_value=90, required=False, allow_null=True)
+    longitude = CoordinateField(min_value=-180, max_value=180, required=False, allow_null=True)
 
     class Meta:
         model = Post
-        fields = ['id', 'title', 'body', 'image', 'city', 'user', 'latitude', 'longitude', 'created_at', 'like_count', 'is_liked']
-        read_only_fields = ['id', 'created_at', 'user', 'city']
+        fields = ['id', 'title', 'body', 'image', 'image_variants', 'city', 'user', 'latitude', 'longitude', 'created_at', 'like_count', 'comment_count', 'is_liked']
+        read_only_fields = ['id', 'created_at', 'user', 'city', 'like_count', 'comment_count']
+
+    def validate_image(self, value):
+        # 公開されるオリジナルにも位置情報（EXIF）を残さない
+        return strip_metadata(value) if value else value
 
     def validate(self, attrs):
         latitude = attrs.get('latitude')
@@ -29,72 +62,120 @@ class PostSerializer(serializers.ModelSerializer):
         if not latitude or not longitude:
             raise serializers.ValidationError("位置情報（緯度・経度）が必要です。")
 
+        if 'resolved_city' in self.context:
+            # 非同期ビューで解決済み（aresolve_city）
+            city = self.context['resolved_city']
+        else:
+            city = self.resolve_city(latitude, longitude)
+        if city is None:
+            # 開発環境でバリデーションをスキップした場合
+            attrs['city'] = user.residence_city
+            return attrs
+
+        # ログインユーザーの登録市区町村と比較
+        if user.residence_city != city:
+            raise serializers.ValidationError(
+                f"登録市区町村（{user.residence_city}）と、投稿位置の市区町村（{city}）が一致していません。"
+            )
+
+        # 市区町村情報を保存
+        attrs['city'] = city
+            
+        return attrs
+
+    @classmethod
+    def resolve_city(cls, latitude, longitude):
+        """投稿位置の市区町村（開発環境でスキップした場合は None）"""
+        # まずローカルの境界データで判定（データが無い・範囲外なら外部ジオコーダへ）
+        city = cls._resolve_locally(latitude, longitude)
+        if city is None:
+            api_key = cls._geocoding_api_key(latitude, longitude)
+            if api_key is None:
+                return None
+            with cls._geocoding_errors():
+                city = reverse_geocode_city(latitude, longitude, api_key)
+            cls._check_found(city, latitude, longitude)
+        return city
+
+    @classmethod
+    async def aresolve_city(cls, latitude, longitude):
+        """resolve_city() の非同期版（外部ジオコーダの待ち時間にワーカーを占有しない）"""
+        city = cls._resolve_locally(latitude, longitude)
+        if city is None:
+            api_key = cls._geocoding_api_key(latitude, longitude)
+            if api_key is None:
+                return None
+            with cls._geocoding_errors():
+                city = await areverse_geocode_city(latitude, longitude, api_key)
+            cls._check_found(city, latitude, longitude)
+        return city
+
+    @staticmethod
+    def _resolve_locally(latitude, longitude):
+        city = resolve_municipality(latitude, longitude)
+        if city is None and not settings.MUNICIPALITY_REMOTE_FALLBACK:
+            raise serializers.ValidationError("市区町村情報を特定できませんでした。")
+        return city
+
+    @staticmethod
+    def _geocoding_api_key(latitude, longitude):
         # Google Geocoding APIキーを取得
         api_key = os.getenv('GOOGLE_GEOCODING_API_KEY')
         
         # 開発環境では位置情報バリデーションをスキップ
         if os.getenv('DEBUG', 'False').lower() == 'true' and (not api_key or api_key == 'your-google-api-key-here'):
             print(f"⚠️ 開発環境: 位置情報バリデーションをスキップしました (緯度: {latitude}, 経度: {longitude})")
-            # 開発環境では登録市区町村をそのまま使用
-            attrs['city'] = user.residence_city
-            return attrs
+            return None
             
         if not api_key or api_key == 'your-google-api-key-here':
             raise serializers.ValidationError("本番環境では有効なGoogle Geocoding API keyが必要です。")
+        return api_key
 
-        # Google Geocoding APIを叩く
-        geocode_url = (
-            f"https://maps.googleapis.com/maps/api/geocode/json"
-            f"?latlng={latitude},{longitude}&key={api_key}&language=ja"
-        )
-        
+    @staticmethod
+    @contextmanager
+    def _geocoding_errors():
+        # 逆ジオコーディング（セル単位のキャッシュ経由、ミス時のみ Google Geocoding API を叩く）のエラーを変換する
         try:
-            response = requests.get(geocode_url, timeout=10)
-            geocode_result = response.json()
-
-            if geocode_result.get('status') != 'OK':
-                print(f"⚠️ Geocoding API エラー: {geocode_result.get('status', 'UNKNOWN')}")
-                raise serializers.ValidationError("位置情報から市区町村を取得できませんでした。")
-
-            # レスポンスから市区町村（locality）を抽出
-            city = None
-            results = geocode_result.get('results', [])
-            if results:
-                for component in results[0].get('address_components', []):
-                    if 'locality' in component.get('types', []):
-                        city = component['long_name']
-                        break
-
-            if not city:
-                print(f"⚠️ 市区町村情報が見つかりませんでした。レスポンス: {results[0] if results else 'No results'}")
-                raise serializers.ValidationError("市区町村情報を特定できませんでした。")
-
-            # ログインユーザーの登録市区町村と比較
-            if user.residence_city != city:
-                raise serializers.ValidationError(
-                    f"登録市区町村（{user.residence_city}）と、投稿位置の市区町村（{city}）が一致していません。"
-                )
-
-            # 市区町村情報を保存
-            attrs['city'] = city
-            
-        except requests.RequestException as e:
+            yield
+        except GeocodingNotFound as e:
+            print(f"⚠️ Geocoding API エラー: {e}")
+            raise serializers.ValidationError("位置情報から市区町村を取得できませんでした。")
+        except GeocodingError as e:
             print(f"⚠️ Geocoding API リクエストエラー: {e}")
             raise serializers.ValidationError("位置情報の検証中にエラーが発生しました。")
-            
-        return attrs
-    
+
+    @staticmethod
+    def _check_found(city, latitude, longitude):
+        if not city:
+            print(f"⚠️ 市区町村情報が見つかりませんでした。(緯度: {latitude}, 経度: {longitude})")
+            raise serializers.ValidationError("市区町村情報を特定できませんでした。")
+
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
     
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj.image_variants, self.context.get('request'))
+
     def get_like_count(self, obj):
-        return obj.likes.count()
+        # いいねのバッファ有効時は、自分の未反映のいいね・取り消しを加味する
+        return obj.like_count + getattr(obj, 'pending_like_delta', 0)
 
     def get_is_liked(self, obj):
+        # 一覧・詳細ビューでは with_like_info() で annotate 済み
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         user = self.context.get('request').user
         if user.is_authenticated:
             return obj.likes.filter(user=user).exists()
         return False
     
 
+
+
+
+class NearbyPostSerializer(PostSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['distance_km']
@@ -0,0 +1,88 @@
+# posts/serializers/rows.py
+
+from functools import cached_property
+
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .post import NearbyPostSerializer, PostSerializer, image_variant_urls
+from users.serializers.user import UserSerializer
+
+_created_at = serializers.DateTimeField()
+
+
+class PostRowSerializer(serializers.BaseSerializer):
+    """
+    一覧用の読み取り専用シリアライザ
+    - rows() で作る .values() の行（with_like_info() の注釈を含む）を、PostSerializer と同じ形の dict にする
+      モデル・ネストした UserSerializer のインスタンスを作らず、項目の定義も行ごとにはたどらない
+    - ?fields=id,title,user.username で返す項目を絞れる（user だけなら投稿者の全項目）。読む列もその分だけになる
+    - ?fields= が無ければ、項目・順序・値とも PostSerializer(many=True) と同じ
+    """
+    FIELDS = tuple(PostSerializer.Meta.fields)
+    USER_FIELDS = tuple(UserSerializer.Meta.fields)
+    # 項目 -> 読む列（無ければ項目名と同じ列）
+    COLUMNS = {'user': (), 'like_count': ('like_count', 'pending_like_delta')}
+
+    @classmethod
+    def requested_fields(cls, request):
+        """?fields= の (投稿の項目, 投稿者の項目)。どちらも定義の順序"""
+        value = request.query_params.get('fields') if request is not None else None
+        if not value:
+            return cls.FIELDS, cls.USER_FIELDS
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        user_names = set(cls.USER_FIELDS) if 'user' in names else set()
+        user_names |= {name.split('.', 1)[1] for name in names if name.startswith('user.')}
+        names = {name for name in names if not name.startswith('user.')} | ({'user'} if user_names else set())
+        unknown = (names - set(cls.FIELDS)) | {f'user.{name}' for name in user_names - set(cls.USER_FIELDS)}
+        if unknown:
+            raise serializers.ValidationError({'fields': f"不明な項目です: {', '.join(sorted(unknown))}"})
+        return (
+            tuple(name for name in cls.FIELDS if name in names),
+            tuple(name for name in cls.USER_FIELDS if name in user_names),
+        )
+
+    @classmethod
+    def rows(cls, queryset, request, ordering=()):
+        """
+        queryset（with_like_info() 済み）を、返す項目に必要な列だけの .values() にする
+        ordering: ページネーションの並び順（検索の search_rank など、queryset の並び順と違う場合がある）
+        """
+        fields, user_fields = cls.requested_fields(request)
+        # id と並び順の列はページネーション（カーソルの位置）・並べ替えに使う
+        columns = {'id', *(name.lstrip('-') for name in (*queryset.query.order_by, *ordering))}
+        for name in fields:
+            columns.update(cls.COLUMNS.get(name, (name,)))
+        columns.update(f'user__{name}' for name in user_fields)
+        return queryset.values(*sorted(columns))
+
+    @cached_property
+    def selected_fields(self):
+        return self.requested_fields(self.context.get('request'))
+
+    def to_representation(self, row):
+        request = self.context.get('request')
+        fields, user_fields = self.selected_fields
+        data = {}
+        for name in fields:
+            if name == 'user':
+                data['user'] = {field: row[f'user__{field}'] for field in user_fields}
+            elif name == 'image':
+                # DRF の ImageField と同じ（未設定なら None、リクエストがあれば絶対URL）
+                url = default_storage.url(row['image']) if row['image'] else None
+                data['image'] = request.build_absolute_uri(url) if url and request else url
+            elif name == 'image_variants':
+                data['image_variants'] = image_variant_urls(row['image_variants'], request)
+            elif name == 'created_at':
+                data['created_at'] = _created_at.to_representation(row['created_at'])
+            elif name == 'like_count':
+                data['like_count'] = row['like_count'] + row['pending_like_delta']
+            else:
+                data[name] = row[name]
+        return data
+
+
+class NearbyPostRowSerializer(PostRowSerializer):
+    """NearbyPostSerializer の一覧用（distance_km はビューで行に入れる）"""
+    FIELDS = tuple(NearbyPostSerializer.Meta.fields)
+    COLUMNS = {**PostRowSerializer.COLUMNS, 'distance_km': ()}
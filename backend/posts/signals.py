@@ -0,0 +1,35 @@
+# posts/signals.py
+
+"""
+書き込み時に一覧レスポンスのキャッシュ（posts/response_cache.py）を無効化する
+- 投稿一覧: 投稿・いいね・コメント（comment_count が一覧に含まれる）の変更
+- コメント一覧: その投稿のコメント・コメントへのいいねの変更
+F() による .update() ではシグナルが飛ばないため、カウンタ更新は対になるモデルの保存・削除で拾う
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import response_cache
+from .models import Comment, CommentLike, Post, PostLike
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=PostLike)
+def invalidate_post_list(sender, instance, **kwargs):
+    response_cache.bump('posts')
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_list(sender, instance, **kwargs):
+    response_cache.bump('posts', response_cache.comments_scope(instance.post_id))
+
+
+@receiver([post_save, post_delete], sender=CommentLike)
+def invalidate_comment_like(sender, instance, **kwargs):
+    try:
+        post_id = instance.comment.post_id
+    except Comment.DoesNotExist:
+        # コメントごと削除された場合（コメント側のシグナルで無効化済み）
+        return
+    response_cache.bump(response_cache.comments_scope(post_id))
@@ -1,3 +1,1746 @@
-from django.test import TestCase
+import asyncio
+import gc
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from PIL import Image
+
+from backend import db_routing, health_check, metrics, profiling
+from backend import settings as backend_settings
+from backend.db_routing import ReplicaRoutingMiddleware
+from backend.profiling import QueryProfilerMiddleware
+from backend.renderers import FastJSONRenderer
+from users.authentication import ClaimsRefreshToken
+from users.models import CustomUser
+from users.serializers.user import UserSerializer
+from . import boundaries, clusters, dataset, geocoding, images, like_buffer, response_cache, trending
+from .async_views import AsyncCommentListView, AsyncPostCreateView, AsyncPostDetailView, AsyncPostListView
+from .models import (
+    CityTimelineEntry, Comment, CommentLike, LikeIntent, Post, PostClusterCell, PostLike, ReverseGeocodeCache,
+)
+from .serializers.post import PostSerializer
+from .views import NearbyPostListView
+
+
+class PostTestMixin:
+    @staticmethod
+    def create_user(username='taro', city='渋谷区'):
+        return CustomUser.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='password123',
+            residence_prefecture='東京都',
+            residence_city=city,
+        )
+
+    @staticmethod
+    def create_post(user, title='テスト投稿', **kwargs):
+        kwargs.setdefault('body', '本文')
+        kwargs.setdefault('city', user.residence_city)
+        return Post.objects.create(user=user, title=title, **kwargs)
+
+    def authenticate(self, client, user):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            '\n'.join(q['sql'] for q in ctx.captured_queries),
+        )
+
+
+class CursorPaginationTests(PostTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.posts = [self.create_post(self.user, title=f'投稿{i}') for i in range(25)]
+
+    def collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_post_list_walks_all_pages_without_duplicates(self):
+        ids = self.collect_ids(reverse('post-list') + '?page_size=7')
+        # 同一 created_at が混ざっていても id で順序が確定する
+        expected = [p.id for p in sorted(self.posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+        self.assertEqual(ids, expected)
+
+    def test_post_list_first_page_has_next_cursor(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_comment_list_is_paginated(self):
+        post = self.posts[0]
+        for i in range(3):
+            Comment.objects.create(post=post, user=self.user, text=f'コメント{i}')
+        response = self.client.get(reverse('comment-list', args=[post.id]) + '?page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(self.collect_ids(response.data['next'])), 1)
+
+
+# 位置情報の検証を開発モードでスキップさせる
+DEV_GEOCODING_ENV = {'DEBUG': 'true', 'GOOGLE_GEOCODING_API_KEY': 'your-google-api-key-here'}
+
+
+class QueryBudgetTests(PostTestMixin, TestCase):
+    """
+    posts/urls.py の各エンドポイントのクエリ数上限
+    件数を増やしてもクエリ数が増えない（N+1 がない）ことを確認する
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako')
+        for i in range(10):
+            post = cls.create_post(cls.other if i % 2 else cls.user, title=f'投稿{i}',
+                                   latitude=35.658 + i * 0.001, longitude=139.7016)
+            PostLike.objects.create(post=post, user=cls.other)
+            comment = Comment.objects.create(post=post, user=cls.other, text='コメント')
+            CommentLike.objects.create(comment=comment, user=cls.user)
+        cls.post = post
+        cls.own_post = cls.create_post(cls.user)
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.user, text='自分のコメント')
+        for _ in range(10):
+            Comment.objects.create(post=cls.post, user=cls.other, text='コメント')
+        call_command('reconcile_counters', stdout=StringIO())
+        # ORM で作った投稿をタイムライン・話題のスコア・地図のクラスタに反映する
+        call_command('rebuild_city_timelines', stdout=StringIO())
+        call_command('decay_trending_scores', '--rebuild', stdout=StringIO())
+        call_command('rebuild_post_clusters', stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def test_post_list(self):
+        # 認証1 + 一覧1
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any(p['is_liked'] is False and p['like_count'] == 1 for p in response.data['results']))
+
+    def test_post_list_anonymous(self):
+        with self.assertMaxQueries(2):
+            response = APIClient().get(reverse('post-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_search(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-list'), {'q': '投稿'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_my_post_list(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('my-post-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_nearby(self):
+        # geohash のセルで候補の座標1 + 近い順の上位の本体1
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-nearby'), {'lat': 35.66, 'lng': 139.7016, 'radius': 5})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_city_timeline(self):
+        # タイムライン1 + 投稿1
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-city-timeline'), {'page_size': 5})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_city_timeline_last_page(self):
+        # タイムラインの末尾にかかるページは投稿から読み直す: タイムライン1 + 投稿1
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-city-timeline'))
+        self.assertEqual(len(response.data['results']), 11)
+
+    def test_trending(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('post-trending'))
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_clusters(self):
+        with self.assertMaxQueries(1):
+            response = APIClient().get(reverse('post-clusters'), {'bbox': '139.6,35.6,139.8,35.7', 'zoom': 16})
+        self.assertEqual(sum(cluster['count'] for cluster in response.data['clusters']), 10)
+
+    def test_post_detail(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual(response.data['like_count'], 1)
+
+    def test_post_update(self):
+        with self.assertMaxQueries(6), mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            response = self.client.patch(
+                reverse('post-detail', args=[self.own_post.id]),
+                {'title': '更新', 'latitude': 35.6, 'longitude': 139.7},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_delete(self):
+        # 市区町村タイムラインの行も CASCADE で消える
+        with self.assertMaxQueries(7):
+            response = self.client.delete(reverse('post-detail', args=[self.own_post.id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_post_create(self):
+        # 市区町村タイムラインへの追加と刈り込みで +2
+        with self.assertMaxQueries(9), mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            response = self.client.post(
+                reverse('post-create'),
+                {'title': '新規', 'body': '本文', 'latitude': 35.6, 'longitude': 139.7},
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_comment_list(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('comment-list', args=[self.post.id]))
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_comment_create(self):
+        with self.assertMaxQueries(5):
+            response = self.client.post(reverse('comment-create', args=[self.post.id]), {'text': 'やあ'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_comment_detail(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('comment-detail', args=[self.comment.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_update(self):
+        with self.assertMaxQueries(2):
+            response = self.client.patch(reverse('comment-detail', args=[self.comment.id]), {'text': '編集'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_delete(self):
+        with self.assertMaxQueries(7):
+            response = self.client.delete(reverse('comment-detail', args=[self.comment.id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_post_like_toggle(self):
+        with self.assertMaxQueries(8):
+            response = self.client.post(reverse('post-like-toggle', args=[self.post.id]))
+        self.assertEqual(response.data['status'], 'liked')
+
+    def test_comment_like_toggle(self):
+        with self.assertMaxQueries(8):
+            response = self.client.post(reverse('comment-like-toggle', args=[self.comment.id]))
+        self.assertEqual(response.data['status'], 'liked')
+
+
+class CounterTests(PostTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.authenticate(self.client, self.user)
+        self.post = self.create_post(self.user)
+
+    def test_post_like_toggle_updates_counter(self):
+        url = reverse('post-like-toggle', args=[self.post.id])
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_create_and_delete_update_counter(self):
+        response = self.client.post(reverse('comment-create', args=[self.post.id]), {'text': 'やあ'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.client.delete(reverse('comment-detail', args=[response.data['id']]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_comment_like_toggle_updates_counter(self):
+        comment = Comment.objects.create(post=self.post, user=self.user, text='コメント')
+        self.client.post(reverse('comment-like-toggle', args=[comment.id]))
+        comment.refresh_from_db()
+        self.assertEqual(comment.like_count, 1)
+
+    def test_reconcile_counters_fixes_drift(self):
+        other = self.create_user('hanako')
+        PostLike.objects.create(post=self.post, user=other)
+        Comment.objects.create(post=self.post, user=other, text='コメント')
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn(f'Post#{self.post.id} like_count: 0 -> 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+        call_command('reconcile_counters', '--batch-size', '1', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+
+    def test_reconcile_counters_keeps_concurrent_increments(self):
+        PostLike.objects.create(post=self.post, user=self.create_user('hanako'))
+        jiro = self.create_user('jiro')
+
+        class ConcurrentLike(StringIO):
+            # ずれを報告する（集計の後・書き込みの前）ときに、別のリクエストのいいねが入る
+            def write(out, text):
+                if 'like_count' in text and not PostLike.objects.filter(user=jiro).exists():
+                    PostLike.objects.create(post=self.post, user=jiro)
+                    Post.objects.filter(pk=self.post.pk).update(like_count=F('like_count') + 1)
+                return super().write(text)
+
+        call_command('reconcile_counters', stdout=ConcurrentLike())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+class SearchTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako', city='新宿区')
+        cls.cafe = cls.create_post(cls.user, title='渋谷のカフェ', body='駅前に新しいカフェができました')
+        cls.park = cls.create_post(cls.other, title='公園', body='新宿御苑で花見')
+        cls.many = cls.create_post(cls.other, title='カフェ巡り', body='カフェ、カフェ、またカフェ')
+
+    def search(self, q):
+        response = APIClient().get(reverse('post-list'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.data['results']]
+
+    def test_matches_japanese_substring(self):
+        self.assertEqual(set(self.search('カフェ')), {self.cafe.id, self.many.id})
+        self.assertEqual(self.search('御苑'), [self.park.id])
+
+    def test_matches_city_and_username(self):
+        self.assertEqual(self.search('渋谷区'), [self.cafe.id])
+        self.assertEqual(set(self.search('HANAKO')), {self.park.id, self.many.id})
+
+    def test_single_character_query(self):
+        self.assertEqual(self.search('花'), [self.park.id])
+
+    def test_ranks_by_relevance(self):
+        self.assertEqual(self.search('カフェ')[0], self.many.id)
+
+    def test_document_is_updated_on_save(self):
+        self.park.title = '桜の名所'
+        self.park.save(update_fields=['title'])
+        self.assertEqual(self.search('名所'), [self.park.id])
+
+    def test_deleted_posts_are_not_returned(self):
+        self.park.delete()
+        self.assertEqual(self.search('御苑'), [])
+
+    def test_query_without_words_returns_nothing(self):
+        self.assertEqual(self.search('!!'), [])
+
+    def test_search_follows_next_cursor(self):
+        client = APIClient()
+        response = client.get(reverse('post-list'), {'q': 'カフェ', 'page_size': 1})
+        ids = [p['id'] for p in response.data['results']]
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            self.assertEqual(response.status_code, 200)
+            ids += [p['id'] for p in response.data['results']]
+        self.assertEqual(ids, [self.many.id, self.cafe.id])
+
+
+class StubGeocoder:
+    """テスト用のローカル逆ジオコーダ（経度 139.70 未満を渋谷区とみなす）"""
+    calls = []
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def reverse(self, latitude, longitude):
+        StubGeocoder.calls.append((latitude, longitude))
+        if latitude < 0:
+            raise geocoding.GeocodingNotFound('ZERO_RESULTS')
+        return '渋谷区' if longitude < 139.70 else '新宿区'
+
+
+@override_settings(REVERSE_GEOCODER='posts.tests.StubGeocoder', MUNICIPALITY_BOUNDARIES_PATH='')
+@mock.patch.dict('os.environ', {'DEBUG': 'false', 'GOOGLE_GEOCODING_API_KEY': 'test-key'})
+class ReverseGeocodeCacheTests(PostTestMixin, TestCase):
+    def setUp(self):
+        StubGeocoder.calls = []
+        geocoding._cache = None
+        self.addCleanup(setattr, geocoding, '_cache', None)
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.authenticate(self.client, self.user)
+
+    def create(self, latitude, longitude):
+        return self.client.post(
+            reverse('post-create'),
+            {'title': '新規', 'body': '本文', 'latitude': latitude, 'longitude': longitude},
+        )
+
+    def test_repeat_location_skips_geocoder(self):
+        self.assertEqual(self.create(35.6581, 139.6980).status_code, 201)
+        # 同じセル内の別の地点
+        self.assertEqual(self.create(35.6584, 139.6983).status_code, 201)
+        self.assertEqual(len(StubGeocoder.calls), 1)
+        stats = geocoding.get_cache().stats()
+        self.assertEqual((stats['misses'], stats['memory_hits']), (1, 1))
+
+    def test_invalid_coordinates_are_rejected_before_geocoding(self):
+        for latitude, longitude in (('nan', 139.6980), ('inf', 139.6980), (35.6581, '-inf'), (95, 139.6980), (35.6581, 181)):
+            with self.subTest(latitude=latitude, longitude=longitude):
+                self.assertEqual(self.create(latitude, longitude).status_code, 400)
+        self.assertEqual(StubGeocoder.calls, [])
+
+    def test_db_cache_is_shared_across_processes(self):
+        self.create(35.6581, 139.6980)
+        # 別プロセス相当：プロセス内キャッシュを捨てても DB から引ける
+        geocoding.get_cache().clear()
+        self.create(35.6581, 139.6980)
+        self.assertEqual(len(StubGeocoder.calls), 1)
+        self.assertEqual(geocoding.get_cache().stats()['db_hits'], 1)
+        self.assertEqual(ReverseGeocodeCache.objects.get().city, '渋谷区')
+
+    def test_city_mismatch_is_rejected(self):
+        response = self.create(35.6900, 139.7000)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('新宿区', str(response.data))
+
+    def test_geocoder_errors_are_not_cached(self):
+        self.assertEqual(self.create(-1.0, 139.0).status_code, 400)
+        self.assertEqual(self.create(-1.0, 139.0).status_code, 400)
+        self.assertEqual(len(StubGeocoder.calls), 2)
+        self.assertFalse(ReverseGeocodeCache.objects.exists())
+
+    def test_async_clients_are_released_with_their_loop(self):
+        geocoder = geocoding.AsyncGoogleGeocoder('key')
+
+        async def clients():
+            # 同じループの中では使い回す
+            return geocoder._client(), geocoder._client()
+
+        for _ in range(3):
+            first, second = asyncio.run(clients())
+            self.assertIs(first, second)
+        del first, second
+        gc.collect()
+        # 終了したループのクライアントは残らない
+        self.assertEqual(len(geocoder._clients), 0)
+
+
+def square(lng, lat, size):
+    return [[lng, lat], [lng + size, lat], [lng + size, lat + size], [lng, lat + size], [lng, lat]]
+
+
+# 渋谷区（中央に穴あり）と、その東隣の新宿区（MultiPolygon）
+BOUNDARY_FEATURES = [
+    {
+        'type': 'Feature',
+        'properties': {'N03_004': '渋谷区'},
+        'geometry': {'type': 'Polygon', 'coordinates': [square(139.60, 35.60, 0.10), square(139.64, 35.64, 0.02)]},
+    },
+    {
+        'type': 'Feature',
+        'properties': {'city': '新宿区'},
+        'geometry': {'type': 'MultiPolygon', 'coordinates': [[square(139.70, 35.60, 0.10)], [square(140.00, 35.00, 0.01)]]},
+    },
+    # 政令指定都市の区（N03 のまま）。会員登録の市区町村と同じく市名で判定する
+    {
+        'type': 'Feature',
+        'properties': {'N03_001': '神奈川県', 'N03_003': '横浜市', 'N03_004': '中区'},
+        'geometry': {'type': 'Polygon', 'coordinates': [square(139.60, 35.40, 0.05)]},
+    },
+]
+
+
+class MunicipalityIndexTests(TestCase):
+    def setUp(self):
+        self.index = boundaries.MunicipalityIndex(BOUNDARY_FEATURES, cell_size=0.03)
+
+    def test_resolves_points(self):
+        self.assertEqual(self.index.resolve(35.61, 139.61), '渋谷区')
+        self.assertEqual(self.index.resolve(35.69, 139.79), '新宿区')
+        self.assertEqual(self.index.resolve(35.005, 140.005), '新宿区')
+
+    def test_designated_city_ward_resolves_to_city(self):
+        self.assertEqual(self.index.resolve(35.42, 139.62), '横浜市')
+
+    def test_holes_and_outside_points(self):
+        self.assertIsNone(self.index.resolve(35.65, 139.65))
+        self.assertIsNone(self.index.resolve(34.00, 139.00))
+
+
+@mock.patch.dict('os.environ', {'DEBUG': 'false', 'GOOGLE_GEOCODING_API_KEY': 'test-key'})
+@override_settings(REVERSE_GEOCODER='posts.tests.StubGeocoder')
+class LocalMunicipalityValidationTests(PostTestMixin, TestCase):
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.geojson', delete=False, encoding='utf-8')
+        json.dump({'type': 'FeatureCollection', 'features': BOUNDARY_FEATURES}, tmp)
+        tmp.close()
+        self.path = tmp.name
+        self.addCleanup(os.unlink, tmp.name)
+        StubGeocoder.calls = []
+        geocoding._cache = None
+        self.addCleanup(setattr, geocoding, '_cache', None)
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.authenticate(self.client, self.user)
+
+    def create(self, latitude, longitude):
+        return self.client.post(
+            reverse('post-create'),
+            {'title': '新規', 'body': '本文', 'latitude': latitude, 'longitude': longitude},
+        )
+
+    def test_local_boundaries_skip_remote_geocoder(self):
+        with self.settings(MUNICIPALITY_BOUNDARIES_PATH=self.path):
+            self.assertEqual(self.create(35.61, 139.61).status_code, 201)
+            self.assertEqual(self.create(35.61, 139.71).status_code, 400)
+        self.assertEqual(StubGeocoder.calls, [])
+
+    def test_designated_city_resident_can_post(self):
+        self.user = self.create_user('hanako', city='横浜市')
+        self.authenticate(self.client, self.user)
+        with self.settings(MUNICIPALITY_BOUNDARIES_PATH=self.path):
+            self.assertEqual(self.create(35.42, 139.62).status_code, 201)
+        self.assertEqual(StubGeocoder.calls, [])
+
+    def test_points_outside_boundaries_fall_back_to_remote(self):
+        with self.settings(MUNICIPALITY_BOUNDARIES_PATH=self.path):
+            self.assertEqual(self.create(35.10, 139.10).status_code, 201)
+        self.assertEqual(len(StubGeocoder.calls), 1)
+
+    def test_fallback_can_be_disabled(self):
+        with self.settings(MUNICIPALITY_BOUNDARIES_PATH=self.path, MUNICIPALITY_REMOTE_FALLBACK=False):
+            self.assertEqual(self.create(35.10, 139.10).status_code, 400)
+        self.assertEqual(StubGeocoder.calls, [])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_municipality_resolver', '--points', '200', '--file', self.path, stdout=out)
+        self.assertIn('points/s', out.getvalue())
+
+
+class NearbyPostTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        # 渋谷駅（基準点）から約0.3km, 約0.8km, 約3.5km
+        cls.near = cls.create_post(cls.user, title='近い', latitude=35.6608, longitude=139.7030)
+        cls.middle = cls.create_post(cls.user, title='中間', latitude=35.6640, longitude=139.7070)
+        cls.far = cls.create_post(cls.user, title='遠い', latitude=35.6896, longitude=139.7006)
+        cls.create_post(cls.user, title='位置なし')
+
+    def nearby(self, **params):
+        params.setdefault('lat', 35.6580)
+        params.setdefault('lng', 139.7016)
+        return APIClient().get(reverse('post-nearby'), params)
+
+    def test_orders_by_distance_within_radius(self):
+        response = self.nearby(radius=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.near.id, self.middle.id])
+        self.assertLess(response.data['results'][0]['distance_km'], response.data['results'][1]['distance_km'])
+
+    def test_larger_radius_and_limit(self):
+        response = self.nearby(radius=5)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.near.id, self.middle.id, self.far.id])
+        response = self.nearby(radius=5, limit=1)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.near.id])
+
+    def test_candidates_are_boxed_and_capped(self):
+        # 外接矩形の外（約3.5km）は SQL で落ちる
+        ids = set(Post.objects.near(35.6580, 139.7016, 1).values_list('id', flat=True))
+        self.assertEqual(ids, {self.near.id, self.middle.id})
+        # 候補は近い順に上限件数まで
+        with mock.patch.object(NearbyPostListView, 'max_candidates', 2):
+            response = self.nearby(radius=5)
+        self.assertEqual([p['id'] for p in response.data['results']], [self.near.id, self.middle.id])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.nearby(lat='').status_code, 400)
+        self.assertEqual(self.nearby(lat='abc').status_code, 400)
+        self.assertEqual(self.nearby(radius=500).status_code, 400)
+        for limit in ('nan', 'inf', '1.5', 'abc'):
+            self.assertEqual(self.nearby(limit=limit).status_code, 400)
+        self.assertEqual(self.nearby(lat='nan').status_code, 400)
+        self.assertEqual(self.nearby(radius='inf').status_code, 400)
+
+    def test_geohash_is_updated_on_save(self):
+        self.far.latitude, self.far.longitude = 35.6581, 139.7017
+        self.far.save()
+        self.assertEqual(self.nearby(radius=0.1).data['results'][0]['id'], self.far.id)
+
+    def test_benchmark_matches_full_scan(self):
+        out = StringIO()
+        call_command('benchmark_nearby', '--create', '200', '--queries', '5', '--radius', '3', stdout=out)
+        self.assertIn('speedup', out.getvalue())
+
+
+class PostClusterTests(PostTestMixin, TestCase):
+    # 東京周辺の表示範囲（min_lng,min_lat,max_lng,max_lat）
+    BBOX = '139.5,35.5,140.0,35.9'
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def create_via_api(self, latitude, longitude):
+        with mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            response = self.client.post(
+                reverse('post-create'),
+                {'title': '新規', 'body': '本文', 'latitude': latitude, 'longitude': longitude},
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def clusters(self, zoom, bbox=BBOX):
+        response = APIClient().get(reverse('post-clusters'), {'bbox': bbox, 'zoom': zoom})
+        self.assertEqual(response.status_code, 200)
+        return response.data['clusters']
+
+    def test_create_and_delete_update_cells(self):
+        first = self.create_via_api(35.6580, 139.7016)
+        self.create_via_api(35.6600, 139.7000)
+        [cluster] = self.clusters(zoom=10)
+        self.assertEqual(cluster['count'], 2)
+        self.assertAlmostEqual(cluster['lat'], 35.6590)
+        self.assertAlmostEqual(cluster['lng'], 139.7008)
+
+        self.client.delete(reverse('post-detail', args=[first]))
+        [cluster] = self.clusters(zoom=10)
+        self.assertEqual(cluster['count'], 1)
+        self.assertAlmostEqual(cluster['lat'], 35.6600)
+
+    def test_position_change_moves_post(self):
+        post_id = self.create_via_api(35.6580, 139.7016)
+        with mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            self.client.patch(
+                reverse('post-detail', args=[post_id]), {'latitude': 35.8, 'longitude': 139.9}, format='json',
+            )
+        [cluster] = self.clusters(zoom=16)
+        self.assertAlmostEqual(cluster['lat'], 35.8)
+        self.assertEqual(self.clusters(zoom=16, bbox='139.69,35.65,139.71,35.67'), [])
+
+    def test_non_finite_coordinates_are_rejected(self):
+        post_id = self.create_via_api(35.6580, 139.7016)
+        with mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            for value in ('nan', 'inf', '-inf'):
+                response = self.client.post(
+                    reverse('post-create'), {'title': '新規', 'body': '本文', 'latitude': value, 'longitude': 139.7},
+                )
+                self.assertEqual(response.status_code, 400)
+                response = self.client.patch(
+                    reverse('post-detail', args=[post_id]), {'latitude': 35.6, 'longitude': value},
+                )
+                self.assertEqual(response.status_code, 400)
+        # セルの計算まで届いても、加減算しない
+        clusters.add_post(float('nan'), 139.7)
+        clusters.remove_post(35.6580, float('inf'))
+        [cluster] = self.clusters(zoom=16)
+        self.assertEqual(cluster['count'], 1)
+
+    def test_finer_zoom_splits_clusters(self):
+        self.create_via_api(35.6580, 139.7016)
+        self.create_via_api(35.6896, 139.7006)
+        self.assertEqual([c['count'] for c in self.clusters(zoom=4)], [2])
+        self.assertEqual(sorted(c['count'] for c in self.clusters(zoom=14)), [1, 1])
+
+    def test_wide_bbox_falls_back_to_coarser_tier(self):
+        response = APIClient().get(reverse('post-clusters'), {'bbox': '-180,-85,180,85', 'zoom': 16})
+        self.assertLess(response.data['tier'], 16)
+
+    def test_invalid_parameters(self):
+        url = reverse('post-clusters')
+        self.assertEqual(APIClient().get(url, {'zoom': 10}).status_code, 400)
+        self.assertEqual(APIClient().get(url, {'bbox': '1,2,3', 'zoom': 10}).status_code, 400)
+        self.assertEqual(APIClient().get(url, {'bbox': '140,35,139,36', 'zoom': 10}).status_code, 400)
+        self.assertEqual(APIClient().get(url, {'bbox': self.BBOX, 'zoom': 'x'}).status_code, 400)
+        for bbox in ('0,0,inf,inf', 'nan,0,1,1', '-inf,-inf,0,0', '0,0,181,1', '0,-91,1,1'):
+            self.assertEqual(APIClient().get(url, {'bbox': bbox, 'zoom': 10}).status_code, 400, bbox)
+
+    def test_rebuild_command_fixes_drift(self):
+        self.create_via_api(35.6580, 139.7016)
+        # ORM で直接作った投稿はクラスタに反映されない
+        self.create_post(self.user, latitude=35.6600, longitude=139.7000)
+        self.assertEqual(self.clusters(zoom=10)[0]['count'], 1)
+        call_command('rebuild_post_clusters', stdout=StringIO())
+        self.assertEqual(self.clusters(zoom=10)[0]['count'], 2)
+        self.assertEqual(
+            sum(PostClusterCell.objects.values_list('count', flat=True)), 2 * len(clusters.CLUSTER_ZOOM_TIERS),
+        )
+
+
+def jpeg_with_exif(size=(2000, 1000)):
+    # 位置情報（GPS）と向き（90度回転）を持つ JPEG
+    image = Image.new('RGB', size, (200, 100, 50))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {1: 'N', 2: (35.0, 39.0, 29.0)}
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class CityTimelineTests(PostTestMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def create_via_api(self, title):
+        with mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            response = self.client.post(
+                reverse('post-create'), {'title': title, 'body': '本文', 'latitude': 35.6580, 'longitude': 139.7016},
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def timeline(self, client=None, **params):
+        response = (client or self.client).get(reverse('post-city-timeline'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def titles(self, response):
+        return [post['title'] for post in response.data['results']]
+
+    def test_feed_defaults_to_residence_city(self):
+        self.create_via_api('1')
+        self.create_via_api('2')
+        self.create_post(self.create_user('jiro', city='新宿区'), title='新宿')
+        self.assertEqual(self.titles(self.timeline()), ['2', '1'])
+        self.assertEqual(self.titles(self.timeline(APIClient(), city='新宿区')), ['新宿'])
+        self.assertEqual(APIClient().get(reverse('post-city-timeline')).status_code, 400)
+
+    def test_feed_is_read_from_timeline(self):
+        for i in range(3):
+            self.create_via_api(str(i))
+        post_id = self.create_via_api('4')
+        # タイムラインの範囲読み1回と、投稿の主キー取得1回
+        with self.assertMaxQueries(2):
+            response = self.timeline(page_size=2)
+        self.assertEqual(self.titles(response), ['4', '2'])
+        self.assertIsNotNone(response.data['next'])
+
+        self.client.delete(reverse('post-detail', args=[post_id]))
+        self.assertFalse(CityTimelineEntry.objects.filter(post_id=post_id).exists())
+        self.assertEqual(self.titles(self.timeline(page_size=2)), ['2', '1'])
+
+    @override_settings(CITY_TIMELINE={'LENGTH': 3})
+    def test_pages_past_the_timeline_read_posts(self):
+        for i in range(7):
+            self.create_via_api(str(i))
+        self.assertEqual(CityTimelineEntry.objects.count(), 3)
+
+        titles, response = [], self.timeline(page_size=2)
+        while True:
+            titles += self.titles(response)
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titles, ['6', '5', '4', '3', '2', '1', '0'])
+        # 古い側から戻っても抜けがない
+        response = self.client.get(self.client.get(response.data['previous']).data['previous'])
+        self.assertEqual(self.titles(response), ['4', '3'])
+
+    def test_rebuild(self):
+        self.create_post(self.user, title='古い')
+        self.create_via_api('新しい')
+        CityTimelineEntry.objects.all().delete()
+        call_command('rebuild_city_timelines', stdout=StringIO())
+        self.assertEqual(self.titles(self.timeline()), ['新しい', '古い'])
+        self.assertEqual(CityTimelineEntry.objects.count(), 2)
+
+
+class TrendingTests(PostTestMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.other = self.create_user('hanako')
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+        self.quiet = self.create_post(self.other, title='静か')
+        self.busy = self.create_post(self.other, title='にぎやか')
+
+    def like(self, post, client=None):
+        response = (client or self.client).post(reverse('post-like-toggle', args=[post.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def comment(self, post):
+        response = self.client.post(reverse('comment-create', args=[post.id]), {'text': 'いいね'})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def trending(self, **params):
+        response = APIClient().get(reverse('post-trending'), {'city': '渋谷区', **params})
+        self.assertEqual(response.status_code, 200)
+        return [post['title'] for post in response.data['results']]
+
+    def score(self, post):
+        post.refresh_from_db()
+        return post.hot_score
+
+    def test_likes_and_comments_update_ranking(self):
+        self.like(self.quiet)
+        self.like(self.busy)
+        self.comment(self.busy)
+        self.create_post(self.create_user('jiro', city='新宿区'), title='新宿')
+        # スコアは書き込み時に更新済みなので、ランキングは1クエリ
+        with self.assertMaxQueries(1):
+            self.assertEqual(self.trending(), ['にぎやか', '静か'])
+        self.assertAlmostEqual(self.score(self.busy), 3.0, places=3)
+        self.assertEqual(self.trending(limit=1), ['にぎやか'])
+
+    def test_withdrawals_subtract_their_weight(self):
+        self.like(self.busy)
+        self.like(self.busy)  # 取り消し
+        self.assertAlmostEqual(self.score(self.busy), 0.0)
+        self.assertEqual(self.trending(), [])
+
+        comment_id = self.comment(self.busy)
+        self.client.delete(reverse('comment-detail', args=[comment_id]))
+        self.assertAlmostEqual(self.score(self.busy), 0.0, places=3)
+
+    def test_decay_halves_scores_every_half_life(self):
+        self.like(self.busy)
+        self.comment(self.quiet)
+        half_life = settings.TRENDING['HALF_LIFE_HOURS'] * 3600
+        with mock.patch('posts.trending.time.time', return_value=time.time() + half_life):
+            call_command('decay_trending_scores', stdout=StringIO())
+            self.assertAlmostEqual(self.score(self.busy), 0.5, places=3)
+            # 減衰した既存のスコアに、現在の重みで加算される
+            self.like(self.busy, self.authenticated(self.other))
+        self.assertAlmostEqual(self.score(self.busy), 1.5, places=3)
+        self.assertEqual(self.trending(), ['にぎやか', '静か'])
+
+        with mock.patch('posts.trending.time.time', return_value=time.time() + half_life * 10):
+            call_command('decay_trending_scores', stdout=StringIO())
+        self.assertEqual(self.trending(), [])
+
+    def test_buffered_likes_update_scores(self):
+        with override_settings(LIKE_BUFFER={**settings.LIKE_BUFFER, 'ENABLED': True}):
+            self.like(self.busy)
+            self.like(self.quiet, self.authenticated(self.other))
+            self.like(self.busy, self.authenticated(self.other))
+            call_command('flush_like_buffer', stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.busy), 2.0, places=3)
+        self.assertAlmostEqual(self.score(self.quiet), 1.0, places=3)
+
+    def test_exponent_is_bounded_for_unscored_posts(self):
+        # 移行前の投稿・bulk_create で作った投稿は hot_score_at が 0 のことがある
+        self.assertGreater(self.quiet.hot_score_at, 0)
+        Post.objects.filter(pk=self.quiet.pk).update(hot_score_at=0)
+        exponent = Post.objects.annotate(exponent=trending._exponent(time.time())).get(pk=self.quiet.pk).exponent
+        self.assertEqual(exponent, trending.MIN_EXPONENT)
+        self.like(self.quiet)
+        self.assertAlmostEqual(self.score(self.quiet), 1.0, places=3)
+
+    def test_rebuild_from_counters(self):
+        self.like(self.busy)
+        Post.objects.update(hot_score=0)
+        call_command('decay_trending_scores', '--rebuild', stdout=StringIO())
+        self.assertEqual(self.trending(), ['にぎやか'])
+
+    def authenticated(self, user):
+        client = APIClient()
+        self.authenticate(client, user)
+        return client
+
+
+class ImageVariantTests(PostTestMixin, TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.enterContext(mock.patch.dict('os.environ', DEV_GEOCODING_ENV))
+        self.user = self.create_user()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def upload(self):
+        return self.client.post(reverse('post-create'), {
+            'title': '写真', 'body': '本文', 'latitude': 35.6, 'longitude': 139.7, 'image': jpeg_with_exif(),
+        })
+
+    @override_settings(IMAGE_VARIANTS={**settings.IMAGE_VARIANTS, 'ASYNC': False})
+    def test_variants_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload()
+        # レスポンス時点では未生成
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['image_variants'], {})
+
+        for callback in callbacks:
+            callback()
+        variants = self.client.get(reverse('post-detail', args=[response.data['id']])).data['image_variants']
+        self.assertEqual(set(variants), {'thumb', 'card', 'full'})
+        self.assertTrue(variants['card']['webp'].startswith('http://testserver/media/post_images/variants/'))
+
+        post = Post.objects.get(pk=response.data['id'])
+        with Image.open(os.path.join(settings.MEDIA_ROOT, post.image_variants['thumb']['jpeg'])) as thumb:
+            # 向きを反映した縦長で、EXIF は残っていない
+            self.assertEqual(thumb.size, (160, 320))
+            self.assertEqual(len(thumb.getexif()), 0)
+        with Image.open(os.path.join(settings.MEDIA_ROOT, post.image_variants['full']['webp'])) as full:
+            self.assertEqual(full.format, 'WEBP')
+            self.assertEqual(full.size, (800, 1600))
+
+    def test_async_mode_submits_to_executor(self):
+        executor = mock.Mock()
+        with mock.patch.object(images, '_get_executor', return_value=executor):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.upload()
+        executor.submit.assert_called_once_with(images._generate_in_thread, response.data['id'], None)
+
+    def test_stored_original_has_no_exif(self):
+        with self.captureOnCommitCallbacks():
+            response = self.upload()
+        post = Post.objects.get(pk=response.data['id'])
+        with Image.open(os.path.join(settings.MEDIA_ROOT, post.image.name)) as original:
+            # 公開される元画像にも位置情報は残さない（向きは画素に反映済み）
+            self.assertEqual(original.format, 'JPEG')
+            self.assertEqual(original.size, (1000, 2000))
+            self.assertEqual(len(original.getexif()), 0)
+
+    @override_settings(IMAGE_VARIANTS={**settings.IMAGE_VARIANTS, 'ASYNC': False})
+    def test_replacing_image_deletes_old_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload()
+        post = Post.objects.get(pk=response.data['id'])
+        old_files = [name for files in post.image_variants.values() for name in files.values()]
+        self.assertTrue(all(default_storage.exists(name) for name in old_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('post-detail', args=[post.pk]), {'latitude': 35.6, 'longitude': 139.7, 'image': jpeg_with_exif()}, format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        post.refresh_from_db()
+        new_files = [name for files in post.image_variants.values() for name in files.values()]
+        self.assertEqual(len(new_files), 6)
+        self.assertTrue(all(default_storage.exists(name) for name in new_files))
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+    def test_command_generates_missing_variants(self):
+        with self.captureOnCommitCallbacks():
+            response = self.upload()
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1 件生成しました', out.getvalue())
+        self.assertEqual(set(Post.objects.get(pk=response.data['id']).image_variants), {'thumb', 'card', 'full'})
+
+
+class ResponseCacheTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.post = cls.create_post(cls.user)
+        cls.other_post = cls.create_post(cls.user, title='別の投稿')
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.user, text='コメント')
+        Comment.objects.create(post=cls.other_post, user=cls.user, text='別のコメント')
+
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def get_posts(self):
+        return self.anonymous.get(reverse('post-list'))
+
+    def get_comments(self, post):
+        return self.anonymous.get(reverse('comment-list', args=[post.id]))
+
+    def test_repeated_anonymous_reads_skip_database(self):
+        self.assertEqual(self.get_posts()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get_posts()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertEqual(response_cache.stats()['misses'], 1)
+
+    def test_write_in_another_worker_invalidates(self):
+        self.assertEqual(self.get_posts()['X-Cache'], 'MISS')
+        self.assertEqual(self.get_posts()['X-Cache'], 'HIT')
+        # 別のワーカー（同じディレクトリを使う別のキャッシュのインスタンス）で書き込む
+        other_worker = FileBasedCache(settings.CACHES['default']['LOCATION'], {})
+        with mock.patch.object(response_cache, 'cache', other_worker):
+            self.client.post(reverse('post-like-toggle', args=[self.post.id]))
+        response = self.get_posts()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual({post['id']: post['like_count'] for post in response.data['results']}[self.post.id], 1)
+
+    def test_query_string_is_part_of_key(self):
+        self.get_posts()
+        response = self.anonymous.get(reverse('post-list'), {'page_size': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_authenticated_requests_bypass_cache(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(response_cache.stats()['bypasses'], 1)
+
+    def test_like_invalidates_post_list(self):
+        self.get_posts()
+        self.client.post(reverse('post-like-toggle', args=[self.post.id]))
+        response = self.get_posts()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        liked = next(p for p in response.data['results'] if p['id'] == self.post.id)
+        self.assertEqual(liked['like_count'], 1)
+
+    def test_comment_invalidates_only_its_post(self):
+        self.get_posts()
+        self.get_comments(self.post)
+        self.get_comments(self.other_post)
+        self.client.post(reverse('comment-create', args=[self.post.id]), {'text': '追加'})
+
+        self.assertEqual(len(self.get_comments(self.post).data['results']), 2)
+        self.assertEqual(self.get_comments(self.other_post)['X-Cache'], 'HIT')
+        self.assertEqual(self.get_posts()['X-Cache'], 'MISS')
+
+    def test_comment_like_invalidates_comment_list(self):
+        self.get_comments(self.post)
+        self.client.post(reverse('comment-like-toggle', args=[self.comment.id]))
+        response = self.get_comments(self.post)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+    def test_post_delete_invalidates(self):
+        self.get_posts()
+        self.client.delete(reverse('post-detail', args=[self.other_post.id]))
+        self.assertEqual(len(self.get_posts().data['results']), 1)
+
+    def test_versions_are_bumped_again_after_commit(self):
+        before = response_cache.get_version('posts')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like-toggle', args=[self.post.id]))
+        self.assertEqual(response_cache.get_version('posts'), before + 2)
+
+
+class ConditionalGetTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako')
+        cls.old_post = cls.create_post(cls.other, title='古い投稿')
+        cls.post = cls.create_post(cls.user)
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.user, text='コメント')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def assertNotModified(self, url, etag, client=None, budget=2):
+        with self.assertMaxQueries(budget):
+            response = (client or self.client).get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_post_list_not_modified(self):
+        url = reverse('post-list')
+        response = self.client.get(url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotModified(url, response['ETag'])
+
+    def test_like_and_delete_change_list_etag(self):
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('post-like-toggle', args=[self.post.id]))
+        liked_etag = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(liked_etag.status_code, 200)
+        self.assertNotEqual(liked_etag['ETag'], etag)
+
+        # 最新でない投稿の削除（最大更新日時は変わらない）は件数の変化で検知する
+        Post.objects.filter(pk=self.old_post.pk).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=liked_etag['ETag']).status_code, 200)
+
+    def test_list_validators_do_not_count_posts(self):
+        url = reverse('post-list')
+        with CaptureQueriesContext(connection) as ctx:
+            etag = self.client.get(url)['ETag']
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+        # 作成でも ETag が変わる
+        self.create_post(self.other, title='新しい投稿')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('post-list')
+        other = APIClient()
+        self.authenticate(other, self.other)
+        self.assertNotEqual(self.client.get(url)['ETag'], other.get(url)['ETag'])
+
+    def test_post_detail(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        with mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            self.client.patch(url, {'title': '更新', 'latitude': 35.6, 'longitude': 139.7}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], '更新')
+
+    def test_missing_post_is_404(self):
+        self.assertEqual(self.client.get(reverse('post-detail', args=[0])).status_code, 404)
+
+    def test_comment_list(self):
+        url = reverse('comment-list', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        self.client.post(reverse('comment-like-toggle', args=[self.comment.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_not_modified_from_cache(self):
+        url = reverse('post-list')
+        anonymous = APIClient()
+        etag = anonymous.get(url)['ETag']
+        self.assertNotModified(url, etag, client=anonymous, budget=0)
+
+
+@override_settings(LIKE_BUFFER={**settings.LIKE_BUFFER, 'ENABLED': True})
+class LikeBufferTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako')
+        cls.post = cls.create_post(cls.other)
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.other, text='コメント')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def like(self, liked=None):
+        data = {} if liked is None else {'liked': liked}
+        return self.client.post(reverse('post-like-toggle', args=[self.post.id]), data, format='json')
+
+    def detail(self, client=None):
+        return (client or self.client).get(reverse('post-detail', args=[self.post.id])).data
+
+    def flush(self):
+        call_command('flush_like_buffer', stdout=StringIO())
+
+    def test_explicit_intent_is_a_single_insert(self):
+        with self.assertMaxQueries(2):
+            response = self.like(True)
+        self.assertEqual(response.data['status'], 'liked')
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_pending_intents_are_visible_to_self_only(self):
+        self.like(True)
+        mine = self.detail()
+        self.assertTrue(mine['is_liked'])
+        self.assertEqual(mine['like_count'], 1)
+
+        other = APIClient()
+        self.authenticate(other, self.other)
+        self.assertEqual(self.detail(other)['like_count'], 0)
+
+    def test_flush_applies_and_clears_buffer(self):
+        self.like(True)
+        self.flush()
+        self.assertFalse(LikeIntent.objects.exists())
+        self.assertTrue(PostLike.objects.filter(post=self.post, user=self.user).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.detail()['like_count'], 1)
+
+        self.like(False)
+        self.assertEqual(self.detail()['like_count'], 0)
+        self.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_double_tap_is_idempotent(self):
+        self.like(True)
+        self.like(True)
+        self.flush()
+        self.flush()
+        self.assertEqual(PostLike.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_toggle_without_body_uses_pending_state(self):
+        self.assertEqual(self.like().data['status'], 'liked')
+        self.assertEqual(self.like().data['status'], 'unliked')
+        self.flush()
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_comment_likes(self):
+        self.client.post(reverse('comment-like-toggle', args=[self.comment.id]), {'liked': True}, format='json')
+        comments = self.client.get(reverse('comment-list', args=[self.post.id])).data['results']
+        self.assertTrue(comments[0]['is_liked'])
+        self.flush()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 1)
+
+    def test_flush_of_a_full_batch_of_unlikes(self):
+        # 250 投稿 x 4 ユーザー = 1000 件の取り消し（BATCH_SIZE の既定値と同じ）
+        users = [self.user, self.other, self.create_user('jiro'), self.create_user('saburo')]
+        posts = Post.objects.bulk_create([Post(user=self.other, title=f'投稿{i}', body='本文') for i in range(250)])
+        PostLike.objects.bulk_create([PostLike(post=post, user=user) for post in posts for user in users])
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(like_count=len(users))
+        LikeIntent.objects.bulk_create([
+            LikeIntent(kind='post', object_id=post.pk, user=user, liked=False) for post in posts for user in users
+        ])
+        # 行ごとのシグナル・キャッシュの無効化は無い
+        with self.assertMaxQueries(20):
+            self.assertEqual(like_buffer.flush(batch_size=1000), 1000)
+        self.assertFalse(LikeIntent.objects.exists())
+        self.assertFalse(PostLike.objects.exists())
+        self.assertFalse(Post.objects.filter(like_count__gt=0).exists())
+
+    def test_intents_for_deleted_posts_are_dropped(self):
+        self.like(True)
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.flush()
+        self.assertFalse(LikeIntent.objects.exists())
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_pending_intent_changes_etag(self):
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+        self.like(True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_liked'])
+
+
+class AsyncStubGeocoder(StubGeocoder):
+    async def areverse(self, latitude, longitude):
+        return self.reverse(latitude, longitude)
+
+
+@override_settings(ASYNC_REVERSE_GEOCODER='posts.tests.AsyncStubGeocoder', MUNICIPALITY_BOUNDARIES_PATH='')
+@mock.patch.dict('os.environ', {'DEBUG': 'false', 'GOOGLE_GEOCODING_API_KEY': 'test-key'})
+class AsyncViewTests(PostTestMixin, TestCase):
+    """ASGI 用の非同期ビュー（URL の差し替えは起動時なので、ビューを直接呼ぶ）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako')
+        cls.posts = [cls.create_post(cls.other, title=f'投稿{i}') for i in range(3)]
+        PostLike.objects.create(post=cls.posts[0], user=cls.user)
+        Comment.objects.create(post=cls.posts[0], user=cls.other, text='コメント')
+
+    def setUp(self):
+        cache.clear()
+        StubGeocoder.calls = []
+        geocoding._cache = None
+        self.addCleanup(setattr, geocoding, '_cache', None)
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+        self.auth = {'Authorization': self.client._credentials['HTTP_AUTHORIZATION']}
+
+    async def call(self, view, url, method='get', auth=True, headers=None, **kwargs):
+        headers = {**(self.auth if auth else {}), **(headers or {})}
+        request = getattr(self.factory, method)(url, headers=headers, **kwargs)
+        return await view.as_view()(request, **resolve(url).kwargs)
+
+    async def test_lists_match_sync_views(self):
+        for view, url in (
+            (AsyncPostListView, reverse('post-list')),
+            (AsyncCommentListView, reverse('comment-list', args=[self.posts[0].id])),
+        ):
+            for auth in (True, False):
+                response = await self.call(view, url, auth=auth)
+                self.assertEqual(response.status_code, 200)
+                expected = await sync_to_async(self.client.get if auth else APIClient().get)(url)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_search_follows_next_cursor(self):
+        response = await self.call(AsyncPostListView, reverse('post-list'), data={'q': '投稿', 'page_size': 2})
+        page = json.loads(response.content)
+        self.assertEqual(len(page['results']), 2)
+        query = dict(parse_qsl(urlsplit(page['next']).query))
+        response = await self.call(AsyncPostListView, reverse('post-list'), data=query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 1)
+
+    async def test_anonymous_list_is_cached(self):
+        url = reverse('post-list')
+        self.assertEqual((await self.call(AsyncPostListView, url, auth=False))['X-Cache'], 'MISS')
+        self.assertEqual((await self.call(AsyncPostListView, url, auth=False))['X-Cache'], 'HIT')
+
+    async def test_not_modified(self):
+        for view, url in (
+            (AsyncPostListView, reverse('post-list')),
+            (AsyncPostDetailView, reverse('post-detail', args=[self.posts[0].id])),
+        ):
+            etag = (await self.call(view, url))['ETag']
+            response = await self.call(view, url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+
+    async def test_detail_errors(self):
+        url = reverse('post-detail', args=[self.posts[0].id])
+        self.assertEqual((await self.call(AsyncPostDetailView, url, auth=False)).status_code, 401)
+        missing = reverse('post-detail', args=[0])
+        self.assertEqual((await self.call(AsyncPostDetailView, missing)).status_code, 404)
+
+    async def test_detail_writes_use_sync_view(self):
+        url = reverse('post-detail', args=[self.posts[0].id])
+        response = await self.call(AsyncPostDetailView, url, method='patch', data={'title': '編集'},
+                                   content_type='application/json')
+        # 他人の投稿なので同期ビューの perform_update で拒否される
+        self.assertEqual(response.status_code, 400)
+
+    async def test_create_awaits_async_geocoder(self):
+        url = reverse('post-create')
+        data = {'title': '新規', 'body': '本文', 'latitude': 35.6581, 'longitude': 139.6980}
+        response = await self.call(AsyncPostCreateView, url, method='post', data=data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['city'], '渋谷区')
+        self.assertEqual(StubGeocoder.calls, [(35.6581, 139.6980)])
+
+        data['longitude'] = 139.7000
+        response = await self.call(AsyncPostCreateView, url, method='post', data=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('新宿区', json.loads(response.content)['non_field_errors'][0])
+
+    async def test_create_rejects_invalid_coordinates(self):
+        for latitude in ('nan', 'inf', '95'):
+            data = {'title': '新規', 'body': '本文', 'latitude': latitude, 'longitude': 139.6980}
+            response = await self.call(AsyncPostCreateView, reverse('post-create'), method='post', data=data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('latitude', json.loads(response.content))
+        self.assertEqual(StubGeocoder.calls, [])
+
+    async def test_create_reports_geocoder_errors(self):
+        data = {'title': '新規', 'body': '本文', 'latitude': -1.0, 'longitude': 139.0}
+        response = await self.call(AsyncPostCreateView, reverse('post-create'), method='post', data=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', json.loads(response.content))
+
+
+@override_settings(HEALTH_CHECK={'INTERVAL': 15, 'STALE_AFTER': 60, 'BACKGROUND': False})
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        health_check.probes.clear()
+        self.addCleanup(health_check.probes.clear)
+
+    def test_probes_are_answered_from_cached_results(self):
+        self.assertEqual(self.client.get('/api/health').json()['database'], 'connected')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/health')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            ready = self.client.get('/api/health/ready')
+        self.assertEqual(ready.json()['ready'], True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/health/simple').status_code, 200)
+
+    def test_deep_mode_checks_on_demand(self):
+        self.client.get('/api/health')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/health/ready?deep=1')
+        self.assertTrue(response.json()['deep'])
+        self.assertGreater(len(ctx.captured_queries), 0)
+
+    def test_database_failure_keeps_health_but_not_ready(self):
+        with mock.patch.dict(health_check.CHECKS, {'database': mock.Mock(side_effect=RuntimeError('down'))}):
+            health = self.client.get('/api/health')
+            ready = self.client.get('/api/health/ready')
+        self.assertEqual(health.status_code, 200)
+        self.assertEqual(health.json()['database'], 'disconnected')
+        self.assertEqual(ready.status_code, 503)
+
+    def test_stale_results_are_not_ready(self):
+        self.client.get('/api/health')
+        with override_settings(HEALTH_CHECK={'INTERVAL': 3600, 'STALE_AFTER': 0, 'BACKGROUND': False}):
+            self.assertEqual(self.client.get('/api/health/ready').status_code, 503)
+
+
+class MetricsTests(PostTestMixin, TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        conf = {**settings.METRICS, 'DIR': directory}
+        override = override_settings(METRICS=conf)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.directory = directory
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+        response_cache.reset_stats()
+
+    def scrape(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def write_worker(self, pid, values):
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+            json.dump(values, f)
+
+    def test_request_metrics_per_route(self):
+        self.create_post(self.create_user())
+        self.client.get(reverse('post-list'))
+        body = self.scrape()
+        labels = 'method="GET",route="/api/posts/list/",status="200"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn('http_response_size_bytes_count{route="/api/posts/list/"} 1', body)
+        self.assertIn('db_queries_per_request_count{route="/api/posts/list/"} 1', body)
+        self.assertIn('response_cache_requests_total{result="misses"} 1', body)
+        self.assertIn('# TYPE response_cache_hit_ratio gauge', body)
+
+    def test_values_are_aggregated_across_workers(self):
+        metrics.registry.inc('geocoding_errors_total', client='sync', reason='request')
+        # 動いている別のワーカー（親プロセスの PID を借りる）と、終了したワーカー
+        key = metrics._label_key({'client': 'sync', 'reason': 'request'})
+        self.write_worker(os.getppid(), {'geocoding_errors_total': {key: 2}})
+        self.write_worker(999999999, {'geocoding_errors_total': {key: 4}})
+        line = 'geocoding_errors_total{client="sync",reason="request"} 7'
+        self.assertIn(line, self.scrape())
+        # 終了したワーカーの値は archive.json に移しても数え続ける
+        self.assertFalse(os.path.exists(os.path.join(self.directory, '999999999.json')))
+        self.assertIn(line, self.scrape())
+
+    def test_geocoding_errors_and_latency(self):
+        geocoder = geocoding.GoogleGeocoder(api_key='test-key')
+        with mock.patch.object(geocoder.session, 'get', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(geocoding.GeocodingError):
+                geocoder.reverse(35.0, 139.0)
+        body = self.scrape()
+        self.assertIn('geocoding_errors_total{client="sync",reason="request"} 1', body)
+        self.assertIn('geocoding_request_duration_seconds_count{client="sync"} 1', body)
+
+    def test_db_connections_and_pool_stats(self):
+        # テストの中では接続し直さないので、接続時のシグナルを直接送る
+        connection_created.send(sender=type(connection), connection=connection)
+        self.assertIn('db_connections_total{alias="default"} 1', self.scrape())
+
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            'pool_size': 3, 'pool_available': 2, 'pool_max': 4, 'requests_num': 10, 'requests_wait_ms': 1500,
+        }
+        with mock.patch.object(type(connections['default']), '_connection_pools', {'default': pool}, create=True):
+            body = self.scrape()
+        self.assertIn('# TYPE db_pool_connections gauge', body)
+        self.assertIn('db_pool_connections{alias="default",state="available"} 2', body)
+        self.assertIn('db_pool_requests_total{alias="default"} 10', body)
+        self.assertIn('db_pool_request_wait_seconds_total{alias="default"} 1.5', body)
+
+    def test_gauges_of_exited_workers_are_not_archived(self):
+        gauge = metrics._label_key({'alias': 'default', 'state': 'size'})
+        counter = metrics._label_key({'alias': 'default'})
+        self.write_worker(999999999, {'db_pool_connections': {gauge: 4}, 'db_pool_requests_total': {counter: 7}})
+        self.scrape()
+        body = self.scrape()
+        self.assertNotIn('db_pool_connections{', body)
+        self.assertIn('db_pool_requests_total{alias="default"} 7', body)
+
+    @override_settings(METRICS={**settings.METRICS, 'TOKEN': 'secret'})
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(QUERY_PROFILER={**settings.QUERY_PROFILER, 'ENABLED': True, 'N_PLUS_ONE': 3})
+class QueryProfilerTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        for i in range(4):
+            cls.create_post(cls.user, title=f'投稿{i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.authenticate(self.client, self.user)
+
+    def test_summary_headers_are_opt_in(self):
+        self.assertNotIn('X-Query-Count', self.client.get(reverse('post-list')))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('post-list'), HTTP_X_QUERY_PROFILE='1')
+        self.assertEqual(response['X-Query-Count'], str(len(ctx.captured_queries)))
+        self.assertTrue(response['X-DB-Time'].endswith('ms'))
+        # 一覧は with_like_info() で annotate 済みなので N+1 は無い
+        self.assertEqual(response['X-N-Plus-One'], '0')
+
+    def test_serializer_n_plus_one_is_detected(self):
+        # annotate・select_related していない投稿をシリアライズすると、投稿ごとに user と is_liked を引く
+        def unoptimized_view(request):
+            request.user = self.user
+            PostSerializer(Post.objects.all(), many=True, context={'request': request}).data
+            return HttpResponse()
+
+        middleware = QueryProfilerMiddleware(unoptimized_view)
+        with self.assertLogs('backend.profiling', level='WARNING') as logs:
+            response = middleware(RequestFactory().get('/', HTTP_X_QUERY_PROFILE='1'))
+        self.assertEqual(response['X-N-Plus-One'], '2')
+        self.assertIn('posts/serializers/post.py', logs.output[0])
+        self.assertIn('get_is_liked', logs.output[0])
+
+    def test_normalize_groups_literals_and_in_lists(self):
+        self.assertEqual(
+            profiling.normalize("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a''b' LIMIT 21"),
+            profiling.normalize("SELECT * FROM t WHERE id IN (%s) AND name = 'c' LIMIT 5"),
+        )
+
+    def test_cprofile_dump(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(QUERY_PROFILER={**settings.QUERY_PROFILER, 'PROFILE_DIR': directory}):
+            response = self.client.get(reverse('post-list'), HTTP_X_QUERY_PROFILE='cprofile')
+        path = response['X-Profile-File']
+        self.assertTrue(path.startswith(directory))
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PostRowSerializerTests(PostTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+        cls.other = cls.create_user('hanako')
+        cls.create_post(cls.other, title='画像あり', image='post_images/a.jpg',
+                        image_variants={'thumb': {'jpeg': 'post_images/variants/a-thumb.jpg'}},
+                        latitude=35.6595, longitude=139.7005)
+        post = cls.create_post(cls.user, title='いいね済み\u2028改行')
+        PostLike.objects.create(post=post, user=cls.other)
+        Post.objects.filter(pk=post.pk).update(like_count=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.authenticate(self.client, self.other)
+
+    def current(self, **params):
+        request = Request(RequestFactory().get('/api/posts/list/', params))
+        request.user = self.other
+        posts = Post.objects.with_like_info(self.other).order_by('-created_at', '-id')
+        return JSONRenderer().render(PostSerializer(posts, many=True, context={'request': request}).data)
+
+    def test_same_bytes_as_post_serializer(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertIn(b'"results":' + self.current(), response.content)
+        self.assertTrue(response.data['results'][0]['is_liked'])
+
+    @override_settings(LIKE_BUFFER={**settings.LIKE_BUFFER, 'ENABLED': True})
+    def test_same_bytes_with_pending_likes(self):
+        post = Post.objects.get(title='画像あり')
+        self.client.post(reverse('post-like-toggle', args=[post.id]), {'liked': True}, format='json')
+        results = self.client.get(reverse('post-list')).data['results']
+        self.assertEqual(JSONRenderer().render(results), self.current())
+        self.assertEqual(results[1]['like_count'], 1)
+
+    def test_sparse_fieldsets(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('post-list'), {'fields': 'title,user.username,id'})
+        self.assertEqual(response.data['results'][0], {'id': mock.ANY, 'title': 'いいね済み\u2028改行', 'user': {'username': 'taro'}})
+        # 本文は読まない
+        self.assertNotIn('"body"', ctx.captured_queries[-1]['sql'])
+        results = self.client.get(reverse('post-city-timeline'), {'city': '渋谷区', 'fields': 'user'}).data['results']
+        self.assertEqual(list(results[0]), ['user'])
+        self.assertEqual(list(results[0]['user']), list(UserSerializer.Meta.fields))
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('post-list'), {'fields': 'title,password,user.password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password, user.password', str(response.data['fields']))
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'text': '改行\u2028と\u2029', 'at': timezone.now(), 'day': timezone.now().date(),
+            'amount': Decimal('1.50'), 'nested': [{'a': None, 'b': 1.5, 'c': True}], 'error': ErrorDetail('エラー'),
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # orjson で変換できないものは DRF の実装で書き出す
+        self.assertEqual(FastJSONRenderer().render({1: 'a'}), JSONRenderer().render({1: 'a'}))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_benchmark_reports_rows_per_second(self):
+        out = StringIO()
+        call_command('benchmark_list_serializer', '--rows', '2', '--repeat', '2', stdout=out)
+        self.assertIn('PostRowSerializer ?fields=', out.getvalue())
+
+
+class DatasetTests(TestCase):
+    def test_generated_counters_match_rows(self):
+        totals = dataset.generate(20, 50, likes_per_post=3, comments_per_post=2, chunk_size=16)
+        self.assertEqual(totals['posts'], 50)
+        self.assertEqual(CustomUser.objects.filter(username__startswith=dataset.USERNAME_PREFIX).count(), 20)
+        self.assertEqual(PostLike.objects.count(), totals['likes'])
+        self.assertEqual(Comment.objects.count(), totals['comments'])
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('0 件のずれを検出しました', out.getvalue())
+        # bulk_create で省略される save() の値（geohash・検索用ドキュメント）とクラスタ集計
+        post = Post.objects.select_related('user').first()
+        self.assertTrue(post.geohash)
+        self.assertIn(post.user.username[-1], post.search_document)
+        self.assertEqual(sum(PostClusterCell.objects.filter(tier=clusters.CLUSTER_ZOOM_TIERS[0]).values_list('count', flat=True)), 50)
+
+    def test_generation_is_refused_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', '--users', '1', '--posts', '1', stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_benchmark_records_results(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'results.jsonl')
+        args = ['--sizes', '10,30', '--users', '5', '--repeat', '2', '--output', output, '--force']
+        call_command('benchmark_api', *args, stdout=StringIO())
+        with open(output) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['posts'] for record in records], [10, 30])
+        self.assertEqual(
+            set(records[0]['results']),
+            {'list_anonymous', 'list', 'search', 'city_timeline', 'trending', 'detail', 'comment_list', 'like_toggle', 'login'},
+        )
+        # いいねは押す回数を偶数にして元に戻している
+        self.assertEqual(PostLike.objects.count(), sum(Post.objects.values_list('like_count', flat=True)))
+
+        out = StringIO()
+        call_command('benchmark_api', *args, stdout=out)
+        self.assertIn('%', out.getvalue())
+
+
+class DatabaseConnectionSettingsTests(TestCase):
+    POSTGRES = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'app', 'OPTIONS': {'sslmode': 'require'}}
+
+    def test_persistent_connections_by_default(self):
+        database = backend_settings._with_connection_settings(self.POSTGRES)
+        self.assertEqual(database['CONN_MAX_AGE'], backend_settings.DATABASE_CONNECTIONS['CONN_MAX_AGE'])
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_pool_replaces_persistent_connections_on_postgres(self):
+        with mock.patch.dict(backend_settings.DATABASE_CONNECTIONS, {'POOL': True, 'POOL_MAX_SIZE': 8}):
+            database = backend_settings._with_connection_settings(self.POSTGRES)
+            sqlite = backend_settings._with_connection_settings({'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db'})
+        # Django はプールと持続接続の併用を許さない
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 8)
+        self.assertEqual(database['OPTIONS']['sslmode'], 'require')
+        self.assertNotIn('OPTIONS', sqlite)
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'],
+    DATABASE_REPLICATION={'STICKY_SECONDS': 5, 'MAX_LAG': 10, 'LAG_CHECK_INTERVAL': 5},
+)
+class ReplicaRoutingTests(PostTestMixin, TestCase):
+    def setUp(self):
+        # 書き込んだユーザーの固定はワーカー間で共有されるキャッシュに記録する
+        cache_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+        }))
+        cache.clear()
+        db_routing.lag_monitor.clear()
+        self.addCleanup(db_routing.lag_monitor.clear)
+        patcher = mock.patch.object(db_routing.lag_monitor, 'measure', return_value=0.0)
+        self.measure = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = self.create_user()
+        self.other = self.create_user('hanako')
+        self.status = 200
+        # ビューの代わりに、読み取り・書き込みの振り分け先を返す（クエリは実行しない）
+        self.middleware = ReplicaRoutingMiddleware(
+            lambda request: HttpResponse(f'{Post.objects.all().db},{router.db_for_write(Post)}', status=self.status)
+        )
+
+    def request(self, method='get', user=None):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'
+        return self.middleware(getattr(RequestFactory(), method)('/api/posts/list/', **headers)).content.decode()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.request(), 'replica_1,default')
+        self.assertEqual(self.request(user=self.user), 'replica_1,default')
+        self.assertEqual(self.request('post', user=self.user), 'default,default')
+        # リクエストの外（管理コマンド・バックグラウンドのスレッド）はプライマリ
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_writer_reads_from_primary_for_a_while(self):
+        self.request('post', user=self.user)
+        self.assertEqual(self.request(user=self.user), 'default,default')
+        self.assertEqual(self.request(user=self.other), 'replica_1,default')
+        self.assertEqual(self.request(), 'replica_1,default')
+        cache.clear()  # STICKY_SECONDS の経過
+        self.assertEqual(self.request(user=self.user), 'replica_1,default')
+
+    def test_failed_write_does_not_stick(self):
+        self.status = 400
+        self.request('post', user=self.user)
+        self.status = 200
+        self.assertEqual(self.request(user=self.user), 'replica_1,default')
+
+    def test_lagging_or_unavailable_replica_is_skipped(self):
+        self.measure.return_value = 30.0
+        self.assertEqual(self.request(), 'default,default')
+        db_routing.lag_monitor.clear()
+        self.measure.reset_mock(return_value=True)
+        self.measure.return_value = None
+        self.assertEqual(self.request(), 'default,default')
+        # 測り直すまでは前回の結果を使う
+        self.assertEqual(self.request(), 'default,default')
+        self.assertEqual(self.measure.call_count, 1)
+
+    def test_sticky_window_covers_replica_lag(self):
+        self.measure.return_value = 8.0
+        self.request(user=self.user)
+        with mock.patch.object(db_routing.cache, 'set') as cache_set:
+            self.request('post', user=self.user)
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 8)
+
+    def test_process_local_cache_is_rejected(self):
+        for backend in ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache'):
+            with self.subTest(backend=backend), override_settings(CACHES={'default': {'BACKEND': backend}}):
+                with self.assertRaises(ImproperlyConfigured):
+                    ReplicaRoutingMiddleware(lambda request: HttpResponse())
+        # レプリカが無ければ固定もしないので、プロセス内のキャッシュでよい
+        with override_settings(DATABASE_REPLICAS=[], CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica_1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
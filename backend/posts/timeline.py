@@ -0,0 +1,65 @@
+# posts/timeline.py
+
+"""
+市区町村ごとの新着タイムライン（「自分の街で何が起きているか」の一覧）
+- 投稿作成時に CityTimelineEntry を1行書き込み（書き込み時ファンアウト）、市区町村ごとに直近 LENGTH 件だけ残す
+- 投稿の削除は CASCADE でタイムラインからも消える
+- 一覧はタイムラインの (city, created_at, id) インデックスの範囲読み1回と、主キーでの投稿取得で返す
+- タイムラインより古い投稿は Post の (city, created_at, id) インデックスで直接読む（views.CityTimelineView）
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+
+from .models import CityTimelineEntry, Post
+
+
+def entries(city):
+    """市区町村のタイムライン（新しい順）"""
+    return (
+        CityTimelineEntry.objects.filter(city=city)
+        .only('id', 'post_id', 'created_at')
+        .order_by('-created_at', '-id')
+    )
+
+
+def add(post):
+    """投稿をその市区町村のタイムラインに追加し、古いものを刈り込む"""
+    if not post.city:
+        return
+    with transaction.atomic(savepoint=False):
+        CityTimelineEntry.objects.create(city=post.city, post=post, created_at=post.created_at)
+        _prune(post.city)
+
+
+def remove(post):
+    """投稿をタイムラインから外す（市区町村が変わった場合。削除は CASCADE で消える）"""
+    CityTimelineEntry.objects.filter(post=post).delete()
+
+
+def _prune(city):
+    # 新しい方から LENGTH 件より後ろを1文の DELETE で消す（インデックスの範囲読みだけで済む）
+    stale = entries(city).values('id')[settings.CITY_TIMELINE['LENGTH']:]
+    CityTimelineEntry.objects.filter(id__in=Subquery(stale)).delete()
+
+
+def rebuild(batch_size=5000):
+    """全投稿から作り直す（bulk_create で投稿を入れた後・ずれの補正用）"""
+    length = settings.CITY_TIMELINE['LENGTH']
+    cities = Post.objects.exclude(city='').order_by().values_list('city', flat=True).distinct()
+    with transaction.atomic():
+        CityTimelineEntry.objects.all().delete()
+        total = 0
+        for city in list(cities):
+            # 古い順に追加して、タイムライン内の id の順と created_at の順をそろえる
+            recent = list(
+                Post.objects.filter(city=city).order_by('-created_at', '-id').values_list('id', 'created_at')[:length]
+            )
+            CityTimelineEntry.objects.bulk_create(
+                [CityTimelineEntry(city=city, post_id=post_id, created_at=created_at)
+                 for post_id, created_at in reversed(recent)],
+                batch_size=batch_size,
+            )
+            total += len(recent)
+    return total
@@ -0,0 +1,108 @@
+# posts/trending.py
+
+"""
+市区町村ごとの「話題の投稿」ランキング（時間で減衰するスコア）
+- スコアは、いいね・コメントそれぞれの重みを、半減期 TRENDING['HALF_LIFE_HOURS'] で指数的に減衰させた合計
+- いいね・コメントの追加や取り消しのたびに、カウンタと同じ UPDATE で投稿の行だけを更新する
+  （一覧の表示時に PostLike / Comment は集計しない）
+- hot_score は hot_score_at（UNIX 時刻）時点の値。更新時は現在まで減衰させてから加減算する
+- decay_trending_scores（定期実行）が全行を現在まで減衰させてそろえる（実行間隔の分だけ減衰が遅れる行がある）
+  MIN_SCORE 未満になったものは 0 にしてランキングから外す
+- ランキングは (city, hot_score, id) のインデックスの範囲読み1回で上位を返す
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Exp, Greatest
+from django.db.models.lookups import LessThan
+
+from .models import Post
+
+
+def _tau():
+    # 半減期から指数減衰の時定数（秒）
+    return settings.TRENDING['HALF_LIFE_HOURS'] * 3600 / math.log(2)
+
+
+# 減衰の指数の下限（exp(-700) ≒ 1e-304。PostgreSQL の exp() は結果が 0 に丸まるとアンダーフローのエラーになる）
+MIN_EXPONENT = -700.0
+
+
+def _exponent(now):
+    return Greatest((F('hot_score_at') - now) / _tau(), Value(MIN_EXPONENT), output_field=FloatField())
+
+
+def _decayed(now):
+    return F('hot_score') * Exp(_exponent(now))
+
+
+def _weight(kind, at, now):
+    # at の時点の重みを now まで減衰させた値
+    weight = settings.TRENDING[f'{kind.upper()}_WEIGHT']
+    return weight * math.exp(min(0.0, at - now) / _tau())
+
+
+def change(kind, amount=1, at=None):
+    """
+    いいね・コメントの増減を反映する .update() 用の値（kind: 'like' / 'comment'）
+    取り消し（amount < 0）は、元の時刻 at が分かればその時点の重みを、分からなければ現在の重みを引く（0 未満にはしない）
+    例: Post.objects.filter(pk=pk).update(like_count=F('like_count') + 1, **trending.change('like'))
+    """
+    now = time.time()
+    delta = amount * _weight(kind, now if at is None else at.timestamp(), now)
+    return {
+        'hot_score': Greatest(_decayed(now) + delta, Value(0.0), output_field=FloatField()),
+        'hot_score_at': now,
+    }
+
+
+def initial_score(like_count, comment_count, created_at, now=None):
+    """カウンタだけから求めるスコア（いいね・コメントは投稿時刻に付いたものとみなす。再計算・移行用）"""
+    now = time.time() if now is None else now
+    at = created_at.timestamp()
+    return like_count * _weight('like', at, now) + comment_count * _weight('comment', at, now)
+
+
+def decay():
+    """全行を現在まで減衰させる（戻り値: 更新した行数）"""
+    now = time.time()
+    decayed = _decayed(now)
+    return Post.objects.filter(hot_score__gt=0).update(
+        hot_score=Case(
+            When(LessThan(decayed, settings.TRENDING['MIN_SCORE']), then=Value(0.0)),
+            default=decayed,
+            output_field=FloatField(),
+        ),
+        hot_score_at=now,
+    )
+
+
+def rebuild(batch_size=5000):
+    """カウンタから全行を計算し直す（bulk_create で投稿を入れた後・ずれの補正用）"""
+    now = time.time()
+    posts = []
+    total = 0
+    queryset = Post.objects.only('id', 'created_at', 'like_count', 'comment_count')
+    for post in queryset.iterator(chunk_size=batch_size):
+        score = initial_score(post.like_count, post.comment_count, post.created_at, now)
+        post.hot_score = score if score >= settings.TRENDING['MIN_SCORE'] else 0.0
+        post.hot_score_at = now
+        posts.append(post)
+        if len(posts) >= batch_size:
+            total += Post.objects.bulk_update(posts, ['hot_score', 'hot_score_at'])
+            posts = []
+    if posts:
+        total += Post.objects.bulk_update(posts, ['hot_score', 'hot_score_at'])
+    return total
+
+
+def top(city, user, limit):
+    """市区町村の上位 limit 件（スコアの高い順）"""
+    return (
+        Post.objects.filter(city=city, hot_score__gt=0)
+        .with_like_info(user)
+        .order_by('-hot_score', '-id')[:limit]
+    )
@@ -1,10 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from .views import PostCreateView, PostListView, MyPostListView, PostDetailView, CommentListView, CommentCreateView, CommentDetailView, TogglePostLikeView, ToggleCommentLikeView
+from .views import PostCreateView, PostListView, MyPostListView, PostDetailView, CommentListView, CommentCreateView, CommentDetailView, TogglePostLikeView, ToggleCommentLikeView, NearbyPostListView, PostClusterView, CityTimelineView, TrendingPostListView
+
+if settings.ASYNC_VIEWS:
+    from .async_views import AsyncCommentListView, AsyncPostCreateView, AsyncPostDetailView, AsyncPostListView
+
+    PostCreateView, PostListView, PostDetailView, CommentListView = (
+        AsyncPostCreateView, AsyncPostListView, AsyncPostDetailView, AsyncCommentListView,
+    )
 
 urlpatterns = [
     path('', PostCreateView.as_view(), name='post-create'),
     path('list/', PostListView.as_view(), name='post-list'),
     path('myposts/', MyPostListView.as_view(), name='my-post-list'),
+    path('nearby/', NearbyPostListView.as_view(), name='post-nearby'),
+    path('city/', CityTimelineView.as_view(), name='post-city-timeline'),
+    path('trending/', TrendingPostListView.as_view(), name='post-trending'),
+    path('clusters/', PostClusterView.as_view(), name='post-clusters'),
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),  # 編集/削除
     path('<int:post_id>/comments/', CommentListView.as_view(), name='comment-list'),
     path('<int:post_id>/comments/add/', CommentCreateView.as_view(), name='comment-create'),
@@ -1,14 +1,41 @@
 from django.shortcuts import render
 # posts/views.py
 
+import math
+
 from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import Now
 from .models import Post, Comment, PostLike, CommentLike
 from .serializers.post import PostSerializer
 from .serializers.comment import CommentSerializer
+from .serializers.rows import NearbyPostRowSerializer, PostRowSerializer
+from .pagination import CreatedAtCursorPagination, SearchRankCursorPagination
+from .search import search_posts
+from .geo import haversine_km
+from . import clusters, images, like_buffer, response_cache, timeline, trending
+from .response_cache import AnonymousResponseCacheMixin
+from .conditional import ConditionalGetMixin
+from users.authentication import load_full_user
+
+
+class PostRowsMixin:
+    """
+    一覧を PostRowSerializer で返す（?fields= で項目を絞れる）
+    filter_queryset() で .values() の行にするので、ページネーション・非同期ビューもそのまま使える
+    """
+    serializer_class = PostRowSerializer
+
+    def filter_queryset(self, queryset):
+        # カーソルの位置に使う列（検索なら search_rank）も読む
+        ordering = self.paginator.ordering if self.paginator is not None else ()
+        return self.get_serializer_class().rows(super().filter_queryset(queryset), self.request, ordering)
+
 
 class PostCreateView(generics.CreateAPIView):
     queryset = Post.objects.all()
@@ -17,62 +44,256 @@ class PostCreateView(generics.CreateAPIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            # レスポンスに投稿者の全項目を含めるので、トークンから組み立てたユーザーはここで読み込む
+            post = serializer.save(user=load_full_user(self.request.user))
+            post.is_liked = False  # 作成直後はいいねされていない
+            clusters.add_post(post.latitude, post.longitude)
+            timeline.add(post)
+            # 縮小版はコミット後にバックグラウンドで作る（レスポンスは待たない）
+            images.schedule_variants(post)
 
 # 投稿一覧取得API（誰でも見れる）
-class PostListView(generics.ListAPIView):
-    serializer_class = PostSerializer
+class PostListView(AnonymousResponseCacheMixin, ConditionalGetMixin, PostRowsMixin, generics.ListAPIView):
     permission_classes = [permissions.AllowAny]  # 認証不要
+    pagination_class = CreatedAtCursorPagination
+
+    def response_cache_scope(self):
+        return 'posts'
+
+    def conditional_state(self, request, *args, **kwargs):
+        # 作成・更新・削除（いいね・コメントを含む）で上がるレスポンスキャッシュのバージョンで検知する
+        # （全件の COUNT はしない。最大更新日時は updated_at のインデックスの端を読むだけ）
+        last = Post.objects.aggregate(last=Max('updated_at'))['last']
+        return (response_cache.get_version('posts'), last, like_buffer.pending_version(request.user)), last
     
     def get_queryset(self):
-        queryset = Post.objects.all().order_by('-created_at')  # 最新順
+        queryset = Post.objects.with_like_info(self.request.user).order_by('-created_at', '-id')  # 最新順
         
         # 検索クエリパラメータを取得
         search_query = self.request.query_params.get('q', None)
         
         if search_query:
-            # タイトル、本文、市区町村、ユーザー名で検索
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(body__icontains=search_query) |
-                Q(city__icontains=search_query) |
-                Q(user__username__icontains=search_query)
-            )
+            # タイトル、本文、市区町村、ユーザー名を n-gram 索引で検索（関連度順）
+            queryset = search_posts(queryset, search_query)
         
         return queryset
 
+    @property
+    def paginator(self):
+        # 検索時は関連度順、それ以外は新着順のカーソルで返す
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('q'):
+                self._paginator = SearchRankCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
 # 自分の投稿一覧API（認証必須）
-class MyPostListView(generics.ListAPIView):
-    serializer_class = PostSerializer
+class MyPostListView(PostRowsMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]  # ログイン必須
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        return Post.objects.filter(user=self.request.user).order_by('-created_at')
+        return (
+            Post.objects.filter(user=self.request.user)
+            .with_like_info(self.request.user)
+            .order_by('-created_at', '-id')
+        )
     
+# 近くの投稿API（誰でも見れる）: /api/posts/nearby/?lat=&lng=&radius=
+class NearbyPostListView(PostRowsMixin, generics.ListAPIView):
+    serializer_class = NearbyPostRowSerializer
+    permission_classes = [permissions.AllowAny]
+    default_radius_km = 1.0
+    max_radius_km = 50.0
+    default_limit = 50
+    max_limit = 200
+    # 正確な距離を計算する候補の上限（密集地で半径を大きくしても、読む行数が増えすぎない）
+    max_candidates = 2000
+
+    def _float_param(self, name, default=None):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            if default is None:
+                raise serializers.ValidationError({name: "このパラメータは必須です。"})
+            return default
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+        # nan・inf は geohash のセル計算（math.floor）で例外になる
+        if not math.isfinite(number):
+            raise serializers.ValidationError({name: "数値を指定してください。"})
+        return number
+
+    def list(self, request, *args, **kwargs):
+        lat = self._float_param('lat')
+        lng = self._float_param('lng')
+        radius = self._float_param('radius', self.default_radius_km)
+        try:
+            limit = int(request.query_params.get('limit') or self.default_limit)
+        except ValueError:
+            raise serializers.ValidationError({'limit': "整数を指定してください。"})
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise serializers.ValidationError("緯度・経度の範囲が正しくありません。")
+        if not (0 < radius <= self.max_radius_km):
+            raise serializers.ValidationError({'radius': f"0より大きく{self.max_radius_km:g}km以下で指定してください。"})
+        limit = max(1, min(limit, self.max_limit))
+
+        # 1. geohash のセルと外接矩形で候補を絞り、近い順に最大 max_candidates 件の座標だけ取得して正確な距離を計算
+        candidates = (
+            Post.objects.near(lat, lng, radius)
+            .nearest_first(lat, lng)
+            .values_list('id', 'latitude', 'longitude')[:self.max_candidates]
+        )
+        distances = {}
+        for post_id, post_lat, post_lng in candidates:
+            distance = haversine_km(lat, lng, post_lat, post_lng)
+            if distance <= radius:
+                distances[post_id] = distance
+        nearest = sorted(distances, key=lambda post_id: (distances[post_id], -post_id))[:limit]
+
+        # 2. 近い順の上位だけ本体を取得
+        rows = self.filter_queryset(Post.objects.filter(id__in=nearest).with_like_info(request.user))
+        posts = {row['id']: row for row in rows}
+        results = [{**posts[post_id], 'distance_km': round(distances[post_id], 3)} for post_id in nearest]
+        serializer = self.get_serializer(results, many=True)
+        return Response({'results': serializer.data})
+    
+# 地図用の投稿クラスタAPI（誰でも見れる）: /api/posts/clusters/?bbox=min_lng,min_lat,max_lng,max_lat&zoom=
+class PostClusterView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in request.query_params.get('bbox', '').split(','))
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            raise serializers.ValidationError("bbox（min_lng,min_lat,max_lng,max_lat）と zoom を指定してください。")
+        # nan・inf・範囲外はセル番号（math.floor）の計算で例外になるので弾く
+        if not (all(map(math.isfinite, (min_lng, min_lat, max_lng, max_lat)))
+                and -90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+            raise serializers.ValidationError("bbox の範囲が正しくありません。")
+
+        tier, cells = clusters.clusters_in_bbox(min_lat, min_lng, max_lat, max_lng, zoom)
+        return Response({'zoom': zoom, 'tier': tier, 'clusters': cells})
+
+def requested_city(request):
+    """?city=（省略時はログインユーザーの居住市区町村）"""
+    city = request.query_params.get('city') or getattr(request.user, 'residence_city', '')
+    if not city:
+        raise serializers.ValidationError({'city': "このパラメータは必須です。"})
+    return city
+
+# 市区町村の新着投稿（誰でも見れる）: /api/posts/city/?city=（省略時はログインユーザーの居住市区町村）
+class CityTimelineView(AnonymousResponseCacheMixin, PostRowsMixin, generics.ListAPIView):
+    permission_classes = [permissions.AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def response_cache_scope(self):
+        return 'posts'
+
+    def get_city(self):
+        return requested_city(self.request)
+
+    def get_queryset(self):
+        # タイムラインに無い（刈り込まれた）古い投稿は (city, created_at, id) のインデックスで投稿から読む
+        return (
+            Post.objects.filter(city=self.get_city())
+            .with_like_info(self.request.user)
+            .order_by('-created_at', '-id')
+        )
+
+    def paginate_queryset(self, queryset):
+        paginator = self.paginator
+        entries = paginator.paginate_queryset(timeline.entries(self.get_city()), self.request, view=self)
+        # タイムラインの末尾にかかるページ（この先に刈り込まれた投稿があり得る）と、
+        # 古い側から戻るページは投稿から読む（カーソルは created_at の位置なので、どちらで読んでも続きになる）
+        if not paginator.has_next or (paginator.cursor and paginator.cursor.reverse):
+            return super().paginate_queryset(queryset)
+        post_ids = [entry.post_id for entry in entries]
+        posts = {row['id']: row for row in queryset.filter(id__in=post_ids)}
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+# 市区町村の話題の投稿（誰でも見れる）: /api/posts/trending/?city=&limit=
+class TrendingPostListView(PostRowsMixin, generics.ListAPIView):
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise serializers.ValidationError({'limit': "整数を指定してください。"})
+        limit = max(1, min(limit, settings.TRENDING['TOP_K']))
+        # スコアは書き込み時に更新済みなので、(city, hot_score, id) のインデックスを上から読むだけ
+        posts = self.filter_queryset(trending.top(requested_city(request), request.user, limit))
+        return Response({'results': self.get_serializer(posts, many=True).data})
+
 # 投稿編集・削除API（本人のみ）
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return Post.objects.with_like_info(self.request.user)
+
+    def conditional_state(self, request, *args, **kwargs):
+        updated_at = Post.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return (updated_at, like_buffer.pending_version(request.user)), updated_at
+
     def perform_update(self, serializer):
-        if self.request.user != self.get_object().user:
+        if self.request.user != serializer.instance.user:
             raise serializers.ValidationError("あなた自身の投稿だけ編集できます。")
-        serializer.save()
+        old_position = (serializer.instance.latitude, serializer.instance.longitude)
+        old_city = serializer.instance.city
+        image_changed = 'image' in serializer.validated_data
+        old_variants = serializer.instance.image_variants
+        with transaction.atomic():
+            # 画像を差し替えた場合、古い縮小版は使わない（ファイルはコミット後のジョブで消す）
+            post = serializer.save(image_variants={}) if image_changed else serializer.save()
+            if image_changed:
+                images.schedule_variants(post, stale_variants=old_variants)
+            # 位置が変わった場合は地図クラスタを移し替える
+            if (post.latitude, post.longitude) != old_position:
+                clusters.remove_post(*old_position)
+                clusters.add_post(post.latitude, post.longitude)
+            # 市区町村が変わった場合はタイムラインを移し替える
+            if post.city != old_city:
+                timeline.remove(post)
+                timeline.add(post)
 
     def perform_destroy(self, instance):
         if self.request.user != instance.user:
             raise serializers.ValidationError("あなた自身の投稿だけ削除できます。")
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            clusters.remove_post(instance.latitude, instance.longitude)
 
 # 特定投稿に対するコメント一覧取得
-class CommentListView(generics.ListAPIView):
+class CommentListView(AnonymousResponseCacheMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = CreatedAtCursorPagination
+
+    def response_cache_scope(self):
+        return response_cache.comments_scope(self.kwargs['post_id'])
+
+    def conditional_state(self, request, *args, **kwargs):
+        state = Comment.objects.filter(post_id=self.kwargs['post_id']).aggregate(
+            last=Max('updated_at'), count=Count('id'),
+        )
+        return (state['last'], state['count'], like_buffer.pending_version(request.user)), state['last']
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id).order_by('-created_at')
+        return (
+            Comment.objects.filter(post_id=post_id)
+            .with_like_info(self.request.user)
+            .order_by('-created_at', '-id')
+        )
 
 # コメント作成（認証必須）
 class CommentCreateView(generics.CreateAPIView):
@@ -81,16 +302,22 @@ class CommentCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         post_id = self.kwargs['post_id']
-        serializer.save(user=self.request.user, post_id=post_id)
+        with transaction.atomic():
+            serializer.save(user=self.request.user, post_id=post_id)
+            Post.objects.filter(pk=post_id).update(
+                comment_count=F('comment_count') + 1, updated_at=Now(), **trending.change('comment'),
+            )
 
 # コメント詳細（編集・削除）ビュー
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return Comment.objects.with_like_info(self.request.user)
+
     def perform_update(self, serializer):
-        comment = self.get_object()
+        comment = serializer.instance
         if comment.user != self.request.user:
             raise serializers.ValidationError("自分のコメントのみ編集できます。")
         serializer.save()
@@ -98,29 +325,66 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     def perform_destroy(self, instance):
         if instance.user != self.request.user:
             raise serializers.ValidationError("自分のコメントのみ削除できます。")
-        instance.delete()
+        with transaction.atomic():
+            deleted, _ = Comment.objects.filter(pk=instance.pk).delete()
+            if deleted:
+                Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+                    comment_count=F('comment_count') - 1, updated_at=Now(),
+                    **trending.change('comment', -1, at=instance.created_at),
+                )
 
 # いいね機能の実装
+def buffered_toggle(request, kind, object_id):
+    """
+    バッファ有効時: 意図を1行追加するだけで返す（反映は flush_like_buffer）
+    クライアントが {"liked": true/false} を送れば、連打しても結果が変わらない（現在の状態も読まない）
+    """
+    liked = request.data.get('liked')
+    if liked is None:
+        liked = not like_buffer.current_state(kind, object_id, request.user)
+    elif isinstance(liked, str):
+        liked = liked.lower() == 'true'
+    like_buffer.record(kind, object_id, request.user, bool(liked))
+    return Response({"status": "liked" if liked else "unliked"})
+
 class TogglePostLikeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, post_id):
+        if like_buffer.is_enabled():
+            return buffered_toggle(request, 'post', post_id)
         post = Post.objects.get(id=post_id)
         user = request.user
-        like, created = PostLike.objects.get_or_create(post=post, user=user)
-        if not created:
-            like.delete()
-            return Response({"status": "unliked"})
+        with transaction.atomic():
+            like, created = PostLike.objects.get_or_create(post=post, user=user)
+            if not created:
+                # 同時に取り消された場合は二重に減算しない
+                deleted, _ = like.delete()
+                if deleted:
+                    Post.objects.filter(pk=post.pk, like_count__gt=0).update(
+                        like_count=F('like_count') - 1, updated_at=Now(), **trending.change('like', -1),
+                    )
+                return Response({"status": "unliked"})
+            Post.objects.filter(pk=post.pk).update(
+                like_count=F('like_count') + 1, updated_at=Now(), **trending.change('like'),
+            )
         return Response({"status": "liked"})
 
 class ToggleCommentLikeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, comment_id):
+        if like_buffer.is_enabled():
+            return buffered_toggle(request, 'comment', comment_id)
         comment = Comment.objects.get(id=comment_id)
         user = request.user
-        like, created = CommentLike.objects.get_or_create(comment=comment, user=user)
-        if not created:
-            like.delete()
-            return Response({"status": "unliked"})
+        with transaction.atomic():
+            like, created = CommentLike.objects.get_or_create(comment=comment, user=user)
+            if not created:
+                # 同時に取り消された場合は二重に減算しない
+                deleted, _ = like.delete()
+                if deleted:
+                    Comment.objects.filter(pk=comment.pk, like_count__gt=0).update(like_count=F('like_count') - 1, updated_at=Now())
+                return Response({"status": "unliked"})
+            Comment.objects.filter(pk=comment.pk).update(like_count=F('like_count') + 1, updated_at=Now())
         return Response({"status": "liked"})
@@ -34,6 +34,9 @@ CORS_ALLOWED_ORIGINS=http://localhost:3000
 
 # Use a placeholder for local development
 GOOGLE_GEOCODING_API_KEY=your-google-api-key-here
+
+# リクエストごとの SQL プロファイラ（N+1・遅いクエリをログに出す）
+QUERY_PROFILER_ENABLED=True
 EOF
 fi
 
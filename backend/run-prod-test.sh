@@ -36,4 +36,4 @@ echo ""
 echo "⏹️ 停止するには Ctrl+C を押してください"
 
 # Start Gunicorn with production-like settings
-gunicorn --bind 0.0.0.0:8000 --workers 3 --timeout 120 --access-logfile - --error-logfile - backend.wsgi:application
\ No newline at end of file
+gunicorn -c gunicorn.conf.py
\ No newline at end of file
@@ -0,0 +1,118 @@
+# users/address_registry.py
+
+"""
+都道府県・市区町村の登録済み一覧（プロセス内に常駐）
+- 都道府県は固定の47件
+- 市区町村は ADDRESS_REGISTRY_PATH の CSV（prefecture,city）から起動時に1回だけ読み込む
+  CSV は users/data/municipalities.csv に同梱している（政令指定都市は区ではなく市、東京23区は区ごと）
+  行政区域が変わったら build_address_registry コマンドで行政区域データ（N03 GeoJSON）から作り直す
+市区町村の CSV が無い場合、市区町村の存在確認は従来どおり Geocoding API で行う
+"""
+
+import csv
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PREFECTURES = (
+    '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県',
+    '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県',
+    '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県',
+    '静岡県', '愛知県', '三重県', '滋賀県', '京都府', '大阪府', '兵庫県',
+    '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県',
+    '徳島県', '香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県',
+    '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県',
+)
+
+
+def normalize(value):
+    return unicodedata.normalize('NFKC', value or '').strip()
+
+
+def city_name(properties):
+    """
+    国土数値情報 行政区域データ（N03）の属性から市区町村名を決める
+    政令指定都市は区（N03_004）ではなく市（N03_003）を使う（Geocoding API の locality・会員登録の市区町村に合わせる）
+    """
+    county_or_city = normalize(properties.get('N03_003'))
+    ward_or_town = normalize(properties.get('N03_004'))
+    if county_or_city.endswith('市') and (not ward_or_town or ward_or_town.endswith('区')):
+        return county_or_city
+    return ward_or_town
+
+
+def _prefix_range(sorted_keys, prefix):
+    """ソート済みリストのうち prefix で始まる範囲 [start, end)"""
+    start = bisect_left(sorted_keys, prefix)
+    end = bisect_left(sorted_keys, prefix + '\U0010ffff')
+    return start, end
+
+
+class AddressRegistry:
+    def __init__(self, pairs=()):
+        cities = {}
+        for prefecture, city in pairs:
+            prefecture, city = normalize(prefecture), normalize(city)
+            if prefecture and city:
+                cities.setdefault(prefecture, set()).add(city)
+        # 都道府県ごとの市区町村（前方一致検索用にソート済み）
+        self.cities = {prefecture: sorted(names) for prefecture, names in cities.items()}
+        self.pairs = {(p, c) for p, names in self.cities.items() for c in names}
+        # 都道府県をまたいだ前方一致検索用
+        self._all = sorted((c, p) for p, c in self.pairs)
+        self._all_keys = [c for c, _ in self._all]
+        self._prefectures = sorted(PREFECTURES)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, encoding='utf-8', newline='') as f:
+            return cls((row['prefecture'], row['city']) for row in csv.DictReader(f))
+
+    @property
+    def has_cities(self):
+        return bool(self.pairs)
+
+    def is_valid(self, prefecture, city):
+        return (normalize(prefecture), normalize(city)) in self.pairs
+
+    def autocomplete_prefectures(self, prefix):
+        # 47件しかないので件数制限はしない
+        start, end = _prefix_range(self._prefectures, normalize(prefix))
+        matched = set(self._prefectures[start:end])
+        # 表示は北から順に
+        return [p for p in PREFECTURES if p in matched]
+
+    def autocomplete_cities(self, prefix, prefecture=None, limit=20):
+        prefix = normalize(prefix)
+        if prefecture:
+            names = self.cities.get(normalize(prefecture), [])
+            start, end = _prefix_range(names, prefix)
+            return [(normalize(prefecture), c) for c in names[start:min(end, start + limit)]]
+        start, end = _prefix_range(self._all_keys, prefix)
+        return [(p, c) for c, p in self._all[start:min(end, start + limit)]]
+
+
+_registry = None
+_registry_path = None  # 読み込み済みのパス（設定が変わったら読み直す）
+_registry_lock = threading.Lock()
+
+
+def get_address_registry():
+    global _registry, _registry_path
+    path = settings.ADDRESS_REGISTRY_PATH
+    if _registry is None or _registry_path != path:
+        with _registry_lock:
+            if _registry is None or _registry_path != path:
+                if path and Path(path).exists():
+                    registry = AddressRegistry.from_csv(path)
+                    logger.info("市区町村一覧を読み込みました: %s (%d 件)", path, len(registry.pairs))
+                else:
+                    registry = AddressRegistry()
+                _registry, _registry_path = registry, path
+    return _registry
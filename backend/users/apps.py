@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .authentication import update_user_status
+
+        user_model = self.get_model('CustomUser')
+        post_save.connect(update_user_status, sender=user_model)
+        post_delete.connect(update_user_status, sender=user_model)
+
+        # 市区町村一覧は起動時に1回だけ読み込んでおく
+        from .address_registry import get_address_registry
+        get_address_registry()
@@ -0,0 +1,109 @@
+# users/authentication.py
+
+"""
+DB を引かない JWT 認証
+- ログイン時にアクセストークンへ username / residence_city を載せる（ClaimsRefreshToken）
+- 認証時はトークンの内容から CustomUser を組み立てる（その他のフィールドは遅延読み込み）
+- 退会・無効化の確認だけはプロセス内の TTL キャッシュ経由で行う（TTL ごとに1クエリ）
+トークンに情報が無い古いトークンは、従来どおり DB からユーザーを読み込む
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser
+
+# トークンに載せるユーザー情報
+USER_CLAIMS = ('username', 'residence_city')
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """ユーザー情報を載せたリフレッシュトークン（アクセストークン・再発行時にも引き継がれる）"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class UserStatusCache:
+    """user_id -> is_active（存在しなければ None）のプロセス内 LRU キャッシュ（最大 max_size 件）"""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (is_active, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+        is_active = CustomUser.objects.filter(pk=user_id).values_list('is_active', flat=True).first()
+        self.set(user_id, is_active)
+        return is_active
+
+    def set(self, user_id, is_active):
+        with self._lock:
+            self._entries[user_id] = (is_active, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_status_cache = UserStatusCache(ttl=settings.AUTH_USER_STATUS_TTL, max_size=settings.AUTH_USER_STATUS_CACHE_SIZE)
+
+
+def update_user_status(sender, instance, **kwargs):
+    # post_save / post_delete: このプロセスのキャッシュはすぐ更新する（他のプロセスは TTL 後に反映）
+    user_status_cache.set(instance.pk, None if kwargs['signal'] is post_delete else instance.is_active)
+
+
+def user_from_claims(user_id, claims):
+    """
+    トークンの内容から CustomUser を組み立てる
+    載っていないフィールド（email など）は、参照されたときに DB から読み込まれる
+    """
+    known = {'id': user_id, 'is_active': True, **{c: claims[c] for c in USER_CLAIMS}}
+    # from_db() には値をモデルのフィールド順で渡す
+    field_names = [f.attname for f in CustomUser._meta.concrete_fields if f.attname in known]
+    return CustomUser.from_db('default', field_names, [known[name] for name in field_names])
+
+
+def load_full_user(user):
+    """全フィールドが必要なビュー用（遅延読み込みのフィールドを1クエリでまとめて読む）"""
+    deferred = user.get_deferred_fields()
+    if deferred:
+        user.refresh_from_db(fields=list(deferred))
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        is_active = user_status_cache.get(user_id)
+        if is_active is None:
+            raise AuthenticationFailed("User not found", code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        return user_from_claims(user_id, validated_token)
@@ -0,0 +1,42 @@
+# users/management/commands/build_address_registry.py
+
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.address_registry import PREFECTURES, city_name, normalize
+
+
+class Command(BaseCommand):
+    help = "行政区域データ（国土数値情報 N03 の GeoJSON）から都道府県・市区町村一覧の CSV を作る"
+
+    def add_arguments(self, parser):
+        parser.add_argument('geojson', help='N03 の GeoJSON ファイル')
+        parser.add_argument('--output', default=settings.ADDRESS_REGISTRY_PATH, help='出力する CSV')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['geojson'], encoding='utf-8') as f:
+                features = json.load(f).get('features', [])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"GeoJSON を読み込めません: {e}")
+
+        pairs = set()
+        for feature in features:
+            properties = feature.get('properties') or {}
+            prefecture = normalize(properties.get('N03_001'))
+            city = city_name(properties)
+            if prefecture in PREFECTURES and city:
+                pairs.add((prefecture, city))
+
+        order = {p: i for i, p in enumerate(PREFECTURES)}
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['prefecture', 'city'])
+            writer.writerows(sorted(pairs, key=lambda pair: (order[pair[0]], pair[1])))
+
+        self.stdout.write(self.style.SUCCESS(f"{len(pairs)} 件を {options['output']} に書き出しました"))
@@ -4,6 +4,7 @@ from django.db import models
 class CustomUser(AbstractUser):
     residence_prefecture = models.CharField(max_length=50)
     residence_city = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)  # 条件付き GET（/me の Last-Modified）用
 
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -3,8 +3,12 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
 from rest_framework import serializers
+from ..authentication import ClaimsRefreshToken
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # トークンに username / residence_city を載せる（認証時に DB を引かないため）
+    token_class = ClaimsRefreshToken
+
     def validate(self, attrs): #attrsはリクエストのデータ(validate()に渡される「検証前の」生データ)
         username_or_email = attrs.get('email') or attrs.get('username')
         password = attrs.get('password')
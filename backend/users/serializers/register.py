@@ -1,10 +1,12 @@
 import os
 import requests
+from django.conf import settings
 from rest_framework import serializers
+from ..address_registry import get_address_registry, normalize
 from ..models import CustomUser
-from dotenv import load_dotenv
 
-load_dotenv()
+# コネクションを使い回す（リクエストごとに TLS 接続を張り直さない）
+_session = requests.Session()
 
 class RegisterSerializer(serializers.ModelSerializer):
     residence_prefecture = serializers.CharField()
@@ -17,6 +19,16 @@ class RegisterSerializer(serializers.ModelSerializer):
     def validate(self, data):
         prefecture = data.get('residence_prefecture')
         city = data.get('residence_city')
+
+        # 市区町村一覧があれば辞書引きだけで確認する
+        registry = get_address_registry()
+        if registry.has_cities:
+            if not registry.is_valid(prefecture, city):
+                raise serializers.ValidationError("住所が見つかりませんでした。")
+            data['residence_prefecture'] = normalize(prefecture)
+            data['residence_city'] = normalize(city)
+            return data
+
         api_key = os.getenv('GOOGLE_GEOCODING_API_KEY')
         
         # 開発環境では住所バリデーションをスキップ
@@ -28,10 +40,9 @@ class RegisterSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("本番環境では有効なGoogle Geocoding API keyが必要です。")
             
         address = f"{prefecture}{city}"
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
-        
+
         try:
-            response = requests.get(url, timeout=10)
+            response = _session.get(settings.GOOGLE_GEOCODING_URL, params={'address': address, 'key': api_key}, timeout=10)
             result = response.json()
 
             if result['status'] != 'OK':
@@ -1,3 +1,243 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .address_registry import AddressRegistry, get_address_registry
+from .authentication import ClaimsRefreshToken, UserStatusCache, user_status_cache
+from .models import CustomUser
+
+# 住所の検証を開発モードでスキップさせる
+DEV_GEOCODING_ENV = {'DEBUG': 'true', 'GOOGLE_GEOCODING_API_KEY': 'your-google-api-key-here'}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    users/urls.py の各エンドポイントのクエリ数上限
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='taro',
+            email='taro@example.com',
+            password='password123',
+            residence_prefecture='東京都',
+            residence_city='渋谷区',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with CaptureQueriesContext(connection) as ctx:
+            yield ctx
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            '\n'.join(q['sql'] for q in ctx.captured_queries),
+        )
+
+    def test_register(self):
+        with self.assertMaxQueries(3), mock.patch.dict('os.environ', DEV_GEOCODING_ENV):
+            response = self.client.post(reverse('register'), {
+                'username': 'hanako',
+                'email': 'hanako@example.com',
+                'password': 'password123',
+                'residence_prefecture': '東京都',
+                'residence_city': '新宿区',
+            })
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        with self.assertMaxQueries(2):
+            response = self.client.post(reverse('login'), {'username': 'taro@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'taro')
+
+    def test_me(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('me'))
+        self.assertEqual(response.data['residence_city'], '渋谷区')
+
+    def test_me_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        etag = self.client.get(reverse('me'))['ETag']
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('me'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.user.residence_city = '新宿区'
+        self.user.save()
+        response = self.client.get(reverse('me'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['residence_city'], '新宿区')
+
+    def test_token_refresh(self):
+        with self.assertMaxQueries(1):
+            response = self.client.post(reverse('token_refresh'), {'refresh': str(RefreshToken.for_user(self.user))})
+        self.assertEqual(response.status_code, 200)
+
+    def test_address_autocomplete(self):
+        # 市区町村一覧はプロセス内に常駐しているので DB は引かない（同梱の CSV を使う）
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse('address-autocomplete'), {'q': '渋', 'prefecture': '東京都'})
+        self.assertEqual(response.data['results'], [{'prefecture': '東京都', 'city': '渋谷区'}])
+        with self.assertMaxQueries(0):
+            response = self.client.get(reverse('address-autocomplete'), {'field': 'prefecture', 'q': '東'})
+        self.assertEqual(response.data['results'], [{'prefecture': '東京都'}])
+
+
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='taro',
+            email='taro@example.com',
+            password='password123',
+            residence_prefecture='東京都',
+            residence_city='渋谷区',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_login_token_carries_user_claims(self):
+        response = self.client.post(reverse('login'), {'username': 'taro@example.com', 'password': 'password123'})
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access['username'], 'taro')
+        self.assertEqual(access['residence_city'], '渋谷区')
+
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': response.data['refresh']})
+        self.assertEqual(AccessToken(refreshed.data['access'])['residence_city'], '渋谷区')
+
+    def test_authentication_skips_user_query(self):
+        user_status_cache.set(self.user.pk, True)
+        self.bearer(ClaimsRefreshToken.for_user(self.user).access_token)
+        # 全項目が必要な /me でも読み込みは1回だけ
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('me'))
+        self.assertEqual(response.data['email'], 'taro@example.com')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_deactivated_user_is_rejected(self):
+        self.bearer(ClaimsRefreshToken.for_user(self.user).access_token)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('me')).status_code, 401)
+
+    def test_status_is_reloaded_after_ttl(self):
+        self.bearer(ClaimsRefreshToken.for_user(self.user).access_token)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)  # シグナルを通らない変更
+        with mock.patch.object(user_status_cache, 'ttl', 0):
+            self.assertEqual(self.client.get(reverse('me')).status_code, 401)
+
+    def test_status_cache_is_bounded(self):
+        status_cache = UserStatusCache(ttl=60, max_size=2)
+        status_cache.set(1, True)
+        status_cache.set(2, True)
+        status_cache.get(1)  # 1 を最近使ったことにする
+        status_cache.set(3, False)
+        self.assertEqual(list(status_cache._entries), [1, 3])
+        with self.assertNumQueries(0):
+            self.assertTrue(status_cache.get(1))
+            self.assertFalse(status_cache.get(3))
+
+    def test_deleted_user_is_rejected(self):
+        self.bearer(ClaimsRefreshToken.for_user(self.user).access_token)
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('me')).status_code, 401)
+
+    def test_tokens_without_claims_still_work(self):
+        self.bearer(AccessToken.for_user(self.user))
+        self.assertEqual(self.client.get(reverse('me')).data['username'], 'taro')
+
+
+N03_FEATURES = [
+    {'properties': {'N03_001': '東京都', 'N03_003': None, 'N03_004': '渋谷区'}},
+    {'properties': {'N03_001': '東京都', 'N03_003': None, 'N03_004': '新宿区'}},
+    {'properties': {'N03_001': '神奈川県', 'N03_003': '横浜市', 'N03_004': '中区'}},
+    {'properties': {'N03_001': '神奈川県', 'N03_003': '横浜市', 'N03_004': '西区'}},
+    {'properties': {'N03_001': '神奈川県', 'N03_003': '足柄下郡', 'N03_004': '箱根町'}},
+]
+
+
+class AddressRegistryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tmpdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmpdir.cleanup)
+        geojson = os.path.join(tmpdir.name, 'n03.geojson')
+        with open(geojson, 'w', encoding='utf-8') as f:
+            json.dump({'type': 'FeatureCollection', 'features': N03_FEATURES}, f)
+        cls.csv_path = os.path.join(tmpdir.name, 'data', 'municipalities.csv')
+        call_command('build_address_registry', geojson, '--output', cls.csv_path, stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.enterContext(override_settings(ADDRESS_REGISTRY_PATH=self.csv_path))
+
+    def test_registry_built_from_n03(self):
+        registry = AddressRegistry.from_csv(self.csv_path)
+        self.assertTrue(registry.is_valid('東京都', '渋谷区'))
+        self.assertTrue(registry.is_valid('神奈川県', '横浜市'))
+        self.assertTrue(registry.is_valid('神奈川県', '箱根町'))
+        self.assertFalse(registry.is_valid('神奈川県', '中区'))
+        self.assertFalse(registry.is_valid('東京都', '横浜市'))
+
+    def register(self, prefecture, city):
+        return self.client.post(reverse('register'), {
+            'username': 'hanako',
+            'email': 'hanako@example.com',
+            'password': 'password123',
+            'residence_prefecture': prefecture,
+            'residence_city': city,
+        })
+
+    @mock.patch('users.serializers.register._session.get')
+    def test_register_validates_with_registry_without_api(self, requests_get):
+        with mock.patch.dict('os.environ', {'GOOGLE_GEOCODING_API_KEY': ''}):
+            self.assertEqual(self.register('東京都', '渋谷区').status_code, 201)
+            response = self.register('東京都', '存在しない市')
+        self.assertEqual(response.status_code, 400)
+        requests_get.assert_not_called()
+
+    def test_autocomplete_cities(self):
+        response = self.client.get(reverse('address-autocomplete'), {'q': '新', 'prefecture': '東京都'})
+        self.assertEqual(response.data['results'], [{'prefecture': '東京都', 'city': '新宿区'}])
+        response = self.client.get(reverse('address-autocomplete'), {'q': '横'})
+        self.assertEqual(response.data['results'], [{'prefecture': '神奈川県', 'city': '横浜市'}])
+
+    def test_autocomplete_prefectures(self):
+        response = self.client.get(reverse('address-autocomplete'), {'field': 'prefecture', 'q': '神'})
+        self.assertEqual(response.data['results'], [{'prefecture': '神奈川県'}])
+        response = self.client.get(reverse('address-autocomplete'), {'field': 'prefecture'})
+        self.assertEqual(len(response.data['results']), 47)
+
+
+class BundledAddressRegistryTests(TestCase):
+    def test_bundled_registry_is_loaded_by_default(self):
+        registry = get_address_registry()
+        self.assertGreater(len(registry.pairs), 1700)
+        self.assertTrue(registry.is_valid('東京都', '千代田区'))
+        self.assertTrue(registry.is_valid('東京都', '奥多摩町'))
+        self.assertTrue(registry.is_valid('神奈川県', '横浜市'))
+        self.assertTrue(registry.is_valid('北海道', '札幌市'))
+        self.assertFalse(registry.is_valid('神奈川県', '中区'))
+        self.assertFalse(registry.is_valid('北海道', '横浜市'))
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterView, LoginView, MeView
+from .views import RegisterView, LoginView, MeView, AddressAutocompleteView
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
@@ -7,6 +7,7 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),  # ログイン
     path('me/', MeView.as_view(), name='me'), # ユーザー情報取得
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # トークン更新
+    path('address/autocomplete/', AddressAutocompleteView.as_view(), name='address-autocomplete'),  # 住所の候補
 ]
 
 #/api/token/ に username と password をPOSTするとaccess_token と refresh_token が返ってくる
\ No newline at end of file
@@ -5,7 +5,10 @@ from .serializers.register import RegisterSerializer
 from .serializers.login import CustomTokenObtainPairSerializer
 from .serializers.user import UserSerializer
 from .models import CustomUser
-from rest_framework.permissions import IsAuthenticated
+from .address_registry import get_address_registry
+from .authentication import load_full_user
+from posts.conditional import ConditionalGetMixin
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
@@ -16,9 +19,40 @@ class RegisterView(generics.CreateAPIView):
 class LoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
-class MeView(APIView):
+class MeView(ConditionalGetMixin, generics.RetrieveAPIView):
+    serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_object(self):
+        return load_full_user(self.request.user)
+
+    def conditional_state(self, request, *args, **kwargs):
+        # 認証はトークンの内容だけで済ませているので、全フィールドはここで1回だけ読む
+        user = load_full_user(request.user)
+        return (user.updated_at,), user.updated_at
+
+
+# 住所（都道府県・市区町村）の前方一致候補（会員登録フォーム用）
+class AddressAutocompleteView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    max_limit = 50
+
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        q = request.query_params.get('q', '')
+        field = request.query_params.get('field', 'city')
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_limit)
+        except ValueError:
+            limit = 20
+
+        registry = get_address_registry()
+        if field == 'prefecture':
+            results = [{'prefecture': p} for p in registry.autocomplete_prefectures(q)]
+        else:
+            prefecture = request.query_params.get('prefecture') or None
+            results = [
+                {'prefecture': p, 'city': c}
+                for p, c in registry.autocomplete_cities(q, prefecture=prefecture, limit=limit)
+            ]
+        return Response({'results': results})
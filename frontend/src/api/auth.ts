@@ -14,6 +14,19 @@ export const signup = async (formData: {
   return response.data;
 };
 
+// 住所の前方一致候補（field=prefecture で都道府県、それ以外は市区町村）
+export const autocompleteAddress = async (params: {
+  q: string;
+  field?: 'prefecture' | 'city';
+  prefecture?: string;
+}) => {
+  const response = await axios.get<{ results: { prefecture: string; city?: string }[] }>(
+    `${API_BASE_URL}/users/address/autocomplete/`,
+    { params }
+  );
+  return response.data.results;
+};
+
 export const login = async (formData: {
     email: string;
     password: string;
@@ -16,18 +16,36 @@ export const createPost = async (
   return await axios.post(`${API_BASE_URL}/posts/`, data, { headers });
 };
 
-export const getPosts = async (token?: string, searchQuery?: string) => {
+// 一覧系APIのレスポンス（カーソルページネーション）
+// next / previous はそのまま次のリクエストに使える完全なURL（最終ページでは null）
+export interface PaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+// nextCursor に前回レスポンスの next を渡すと続きのページを取得する
+export const getPosts = async <T = unknown>(
+  token?: string,
+  searchQuery?: string,
+  nextCursor?: string | null
+): Promise<PaginatedResponse<T>> => {
   const headers: Record<string, string> = {};
   if (token) {
     headers['Authorization'] = `Bearer ${token}`;
   }
+
+  if (nextCursor) {
+    const response = await axios.get<PaginatedResponse<T>>(nextCursor, { headers });
+    return response.data;
+  }
   
   const params: Record<string, string> = {};
   if (searchQuery) {
     params.q = searchQuery;
   }
   
-  const response = await axios.get(`${API_BASE_URL}/posts/list/`, {
+  const response = await axios.get<PaginatedResponse<T>>(`${API_BASE_URL}/posts/list/`, {
     headers,
     params
   });
@@ -40,15 +58,17 @@ export const getMyPosts = async (token: string | null) => {
   });
 };
 
-export const togglePostLike = async (postId: number, token: string | null) => {
-  return await axios.post(`${API_BASE_URL}/posts/${postId}/like/`, {}, {
+// liked を渡すと「いいねする / 取り消す」を明示する（連打しても結果が変わらない）
+export const togglePostLike = async (postId: number, token: string | null, liked?: boolean) => {
+  return await axios.post(`${API_BASE_URL}/posts/${postId}/like/`, liked === undefined ? {} : { liked }, {
     headers: { Authorization: `Bearer ${token}` },
   });
 };
 
 // コメント関連API
-export const getComments = async (postId: number) => {
-  return await axios.get(`${API_BASE_URL}/posts/${postId}/comments/`);
+// nextCursor に前回レスポンスの next を渡すと続きのページを取得する
+export const getComments = async <T = unknown>(postId: number, nextCursor?: string | null) => {
+  return await axios.get<PaginatedResponse<T>>(nextCursor || `${API_BASE_URL}/posts/${postId}/comments/`);
 };
 
 export const createComment = async (postId: number, body: string, token: string | null) => {
@@ -66,8 +86,8 @@ export const deleteComment = async (commentId: number, token: string | null) =>
   });
 };
 
-export const toggleCommentLike = async (commentId: number, token: string | null) => {
-  return await axios.post(`${API_BASE_URL}/posts/comments/${commentId}/like/`, {}, {
+export const toggleCommentLike = async (commentId: number, token: string | null, liked?: boolean) => {
+  return await axios.post(`${API_BASE_URL}/posts/comments/${commentId}/like/`, liked === undefined ? {} : { liked }, {
     headers: { Authorization: `Bearer ${token}` },
   });
 };
@@ -10,6 +10,8 @@ interface Post {
   title: string;
   body: string;
   image?: string;
+  // 縮小版 {thumb|card|full: {webp, jpeg}}（アップロード直後は未生成で空）
+  image_variants?: Record<string, Record<string, string>>;
   city: string;
   user: {
     id: number;
@@ -27,6 +29,8 @@ export default function HomePage() {
   const [posts, setPosts] = useState<Post[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchPosts();
@@ -35,8 +39,9 @@ export default function HomePage() {
   const fetchPosts = async () => {
     try {
       const token = localStorage.getItem('accessToken');
-      const data = await getPosts(token || undefined);
-      setPosts(data);
+      const data = await getPosts<Post>(token || undefined);
+      setPosts(data.results);
+      setNextCursor(data.next);
     } catch (err) {
       setError('投稿の取得に失敗しました');
       console.error(err);
@@ -45,6 +50,23 @@ export default function HomePage() {
     }
   };
 
+  // 次のページを取得して末尾に追加
+  const fetchMorePosts = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('accessToken');
+      const data = await getPosts<Post>(token || undefined, undefined, nextCursor);
+      setPosts((prev) => [...prev, ...data.results]);
+      setNextCursor(data.next);
+    } catch (err) {
+      setError('投稿の取得に失敗しました');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="flex min-h-screen bg-gray-50">
       <Sidebar />
@@ -74,6 +96,18 @@ export default function HomePage() {
             <PostCard key={post.id} post={post} />
           ))}
         </div>
+
+        {!loading && nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={fetchMorePosts}
+              disabled={loadingMore}
+              className="px-6 py-2 bg-gray-900 text-white rounded-lg hover:bg-gray-700 disabled:opacity-50"
+            >
+              {loadingMore ? '読み込み中...' : 'もっと見る'}
+            </button>
+          </div>
+        )}
       </main>
     </div>
   );
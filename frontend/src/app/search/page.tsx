@@ -11,6 +11,8 @@ interface Post {
   title: string;
   body: string;
   image?: string;
+  // 縮小版 {thumb|card|full: {webp, jpeg}}（アップロード直後は未生成で空）
+  image_variants?: Record<string, Record<string, string>>;
   city: string;
   user: {
     id: number;
@@ -28,6 +30,8 @@ export default function SearchPage() {
   const [searchQuery, setSearchQuery] = useState('');
   const [posts, setPosts] = useState<Post[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // 初回ロード時に全ての投稿を取得
   useEffect(() => {
@@ -35,8 +39,9 @@ export default function SearchPage() {
       try {
         setIsLoading(true);
         const token = localStorage.getItem('accessToken');
-        const data = await getPosts(token || undefined);
-        setPosts(data);
+        const data = await getPosts<Post>(token || undefined);
+        setPosts(data.results);
+        setNextCursor(data.next);
       } catch (error) {
         console.error('Failed to fetch posts:', error);
       } finally {
@@ -53,8 +58,9 @@ export default function SearchPage() {
       try {
         setIsLoading(true);
         const token = localStorage.getItem('accessToken');
-        const data = await getPosts(token || undefined);
-        setPosts(data);
+        const data = await getPosts<Post>(token || undefined);
+        setPosts(data.results);
+        setNextCursor(data.next);
       } catch (error) {
         console.error('Failed to fetch posts:', error);
       } finally {
@@ -65,8 +71,9 @@ export default function SearchPage() {
       try {
         setIsLoading(true);
         const token = localStorage.getItem('accessToken');
-        const data = await getPosts(token || undefined, searchQuery);
-        setPosts(data);
+        const data = await getPosts<Post>(token || undefined, searchQuery);
+        setPosts(data.results);
+        setNextCursor(data.next);
       } catch (error) {
         console.error('Failed to search posts:', error);
       } finally {
@@ -75,6 +82,22 @@ export default function SearchPage() {
     }
   };
 
+  // 次のページを取得して末尾に追加（next の URL に検索クエリも含まれる）
+  const fetchMorePosts = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('accessToken');
+      const data = await getPosts<Post>(token || undefined, undefined, nextCursor);
+      setPosts((prev) => [...prev, ...data.results]);
+      setNextCursor(data.next);
+    } catch (error) {
+      console.error('Failed to fetch more posts:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Enterキーで検索実行
   const handleKeyPress = (e: React.KeyboardEvent<HTMLInputElement>) => {
     if (e.key === 'Enter') {
@@ -121,7 +144,9 @@ export default function SearchPage() {
           ) : (
             <>
               <p className="text-gray-600 mb-4">
-                {searchQuery ? `"${searchQuery}" の検索結果: ${posts.length}件` : `全ての投稿: ${posts.length}件`}
+                {searchQuery
+                  ? `"${searchQuery}" の検索結果: ${posts.length}件${nextCursor ? '以上' : ''}`
+                  : `全ての投稿: ${posts.length}件${nextCursor ? '以上' : ''}`}
               </p>
               
               {posts.length === 0 ? (
@@ -137,6 +162,18 @@ export default function SearchPage() {
                   ))}
                 </div>
               )}
+
+              {nextCursor && (
+                <div className="flex justify-center mt-8">
+                  <button
+                    onClick={fetchMorePosts}
+                    disabled={loadingMore}
+                    className="px-6 py-2 bg-gray-900 text-white rounded-lg hover:bg-gray-700 disabled:opacity-50"
+                  >
+                    {loadingMore ? '読み込み中...' : 'もっと見る'}
+                  </button>
+                </div>
+              )}
             </>
           )}
         </div>
@@ -26,6 +26,8 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
   const [comments, setComments] = useState<Comment[]>([]);
   const [newComment, setNewComment] = useState('');
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [submitting, setSubmitting] = useState(false);
   const [currentUserId, setCurrentUserId] = useState<number | null>(null);
 
@@ -33,8 +35,9 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
     const fetchComments = async () => {
       setLoading(true);
       try {
-        const response = await getComments(postId);
-        setComments(response.data);
+        const response = await getComments<Comment>(postId);
+        setComments(response.data.results);
+        setNextCursor(response.data.next);
       } catch (error) {
         console.error('コメントの取得に失敗しました:', error);
       } finally {
@@ -60,8 +63,9 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
   const fetchComments = async () => {
     setLoading(true);
     try {
-      const response = await getComments(postId);
-      setComments(response.data);
+      const response = await getComments<Comment>(postId);
+      setComments(response.data.results);
+      setNextCursor(response.data.next);
     } catch (error) {
       console.error('コメントの取得に失敗しました:', error);
     } finally {
@@ -69,6 +73,21 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
     }
   };
 
+  // 次のページを取得して末尾に追加
+  const fetchMoreComments = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await getComments<Comment>(postId, nextCursor);
+      setComments((prev) => [...prev, ...response.data.results]);
+      setNextCursor(response.data.next);
+    } catch (error) {
+      console.error('コメントの取得に失敗しました:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubmitComment = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!newComment.trim()) return;
@@ -112,8 +131,9 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
       return;
     }
 
+    const target = comments.find(comment => comment.id === commentId);
     try {
-      await toggleCommentLike(commentId, token);
+      await toggleCommentLike(commentId, token, target ? !target.is_liked : undefined);
       setComments(comments.map(comment => 
         comment.id === commentId 
           ? {
@@ -194,6 +214,18 @@ export default function CommentSection({ postId, isOpen, onClose }: CommentSecti
               </div>
             ))
           )}
+
+          {!loading && nextCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={fetchMoreComments}
+                disabled={loadingMore}
+                className="px-4 py-1 text-sm text-gray-600 border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50"
+              >
+                {loadingMore ? '読み込み中...' : 'もっと見る'}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* コメント投稿フォーム */}
@@ -11,6 +11,8 @@ interface Post {
   title: string;
   body: string;
   image?: string;
+  // 縮小版 {thumb|card|full: {webp, jpeg}}（アップロード直後は未生成で空）
+  image_variants?: Record<string, Record<string, string>>;
   city: string;
   user: {
     id: number;
@@ -36,6 +38,9 @@ export default function PostCard({ post }: PostCardProps) {
   
   // API URLから画像用のベースURLを取得
   const apiBaseUrl = process.env.NEXT_PUBLIC_API_URL?.replace('/api', '') || 'http://localhost:8000';
+  // カード表示用の縮小版があればそれを使う（未生成ならオリジナル）
+  const rawImage = post.image_variants?.card?.webp ?? post.image;
+  const imageSrc = rawImage && (rawImage.startsWith('http') ? rawImage : `${apiBaseUrl}${rawImage}`);
 
   const handleLike = async () => {
     const token = localStorage.getItem('accessToken');
@@ -54,7 +59,7 @@ export default function PostCard({ post }: PostCardProps) {
     setLikeCount(newLikeCount);
 
     try {
-      await togglePostLike(post.id, token);
+      await togglePostLike(post.id, token, newIsLiked);
     } catch (err) {
       // エラーが発生した場合、元の状態に戻す
       setIsLiked(!newIsLiked);
@@ -78,10 +83,10 @@ export default function PostCard({ post }: PostCardProps) {
   return (
     <div className="bg-white rounded-lg shadow-md overflow-hidden hover:shadow-lg transition-shadow">
       {/* 画像表示 */}
-      {post.image && (
+      {imageSrc && (
         <div className="relative aspect-w-16 aspect-h-9 bg-gray-200 h-48">
           <Image
-            src={post.image.startsWith('http') ? post.image : `${apiBaseUrl}${post.image}`}
+            src={imageSrc}
             alt={post.title}
             fill
             className="object-cover"
@@ -1,9 +1,9 @@
 'use client';
 
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
-import { signup } from '@/api/auth';
+import { autocompleteAddress, signup } from '@/api/auth';
 
 export default function SignupForm() {
     const router = useRouter();
@@ -19,6 +19,31 @@ export default function SignupForm() {
     });
 
     const [error, setError] = useState('');
+    const [prefectureOptions, setPrefectureOptions] = useState<string[]>([]);
+    const [cityOptions, setCityOptions] = useState<string[]>([]);
+
+    // 都道府県・市区町村の入力候補
+    useEffect(() => {
+        autocompleteAddress({ q: '', field: 'prefecture' })
+            .then((results) => setPrefectureOptions(results.map((r) => r.prefecture)))
+            .catch(() => setPrefectureOptions([]));
+    }, []);
+
+    useEffect(() => {
+        if (!formData.residence_city) {
+            setCityOptions([]);
+            return;
+        }
+        const timer = setTimeout(() => {
+            autocompleteAddress({
+                q: formData.residence_city,
+                prefecture: formData.residence_prefecture || undefined,
+            })
+                .then((results) => setCityOptions(results.map((r) => r.city ?? '')))
+                .catch(() => setCityOptions([]));
+        }, 200);
+        return () => clearTimeout(timer);
+    }, [formData.residence_prefecture, formData.residence_city]);
 
     const handleChange = (e: React.ChangeEvent<HTMLInputElement>) => {
         setFormData({ ...formData, [e.target.name]: e.target.value });
@@ -109,18 +134,30 @@ export default function SignupForm() {
                     type="text"
                     name="residence_prefecture"
                     placeholder="都道府県"
+                    list="prefecture-options"
                     value={formData.residence_prefecture}
                     onChange={handleChange}
                     className="w-full p-3 bg-gray-100 text-sm placeholder-gray-500"
                 />
+                <datalist id="prefecture-options">
+                    {prefectureOptions.map((prefecture) => (
+                        <option key={prefecture} value={prefecture} />
+                    ))}
+                </datalist>
                 <input
                     type="text"
                     name="residence_city"
                     placeholder="市区町村"
+                    list="city-options"
                     value={formData.residence_city}
                     onChange={handleChange}
                     className="w-full p-3 bg-gray-100 text-sm placeholder-gray-500"
                 />
+                <datalist id="city-options">
+                    {cityOptions.map((city) => (
+                        <option key={city} value={city} />
+                    ))}
+                </datalist>
                 <input
                     type="email"
                     name="email"